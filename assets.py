@@ -0,0 +1,86 @@
+"""Caches the images and rendered text shared by the views"""
+
+import collections
+import pygame
+
+class GlyphCache(object):
+    """Rendered text keyed by font, size, text and colours. Once maxSize
+    surfaces are held the least recently used one is dropped"""
+    def __init__(self, maxSize=2048):
+        self.maxSize = maxSize
+        self.fonts = {}
+        self.surfaces = collections.OrderedDict()
+    def font(self, size, fontName=None):
+        key = (fontName, size)
+        if key not in self.fonts:
+            self.fonts[key] = pygame.font.Font(fontName, size)
+        return self.fonts[key]
+    def render(self, text, size, color, background=None, fontName=None):
+        key = (fontName, size, text, color, background)
+        try:
+            surface = self.surfaces.pop(key)
+        except KeyError:
+            font = self.font(size, fontName)
+            if background is None:
+                surface = font.render(text, 0, color)
+            else:
+                surface = font.render(text, 0, color, background)
+            if len(self.surfaces) >= self.maxSize:
+                self.surfaces.popitem(last=False)
+        self.surfaces[key] = surface
+        return surface
+
+glyphs = GlyphCache()
+
+_images = {}
+
+def loadImage(fileName, size=None):
+    """Loads and converts an image once. Scaled copies are cached as well"""
+    key = (fileName, size)
+    if key not in _images:
+        if size is None:
+            _images[key] = pygame.image.load(fileName).convert_alpha()
+        else:
+            _images[key] = pygame.transform.scale(loadImage(fileName), size)
+    return _images[key]
+
+class StageLayers(object):
+    """The static parts of a stage drawing, composited once per structure
+    change: the stage image below the level circles and the fixture labels
+    above them. scale shrinks the structure, as in the previews"""
+    def __init__(self, structure, size, scale=1, fontSize=20,
+                 labelColor=(255, 0, 0), labelBackground=None):
+        self.structure = structure
+        self.size = size
+        self.scale = scale
+        self.fontSize = fontSize
+        self.labelColor = labelColor
+        self.labelBackground = labelBackground
+        self.version = None
+        self.layers = None
+    def get(self):
+        """Returns the background and label surfaces, rebuilt if the structure
+        has changed"""
+        if self.version != self.structure.version:
+            self.version = self.structure.version
+            self.layers = self._build()
+        return self.layers
+    def _build(self):
+        width, height = self.size
+        stageImage = loadImage('stage.png')
+        if self.scale != 1:
+            stageImage = loadImage('stage.png',
+                                   (stageImage.get_width() / self.scale,
+                                    stageImage.get_height() / self.scale))
+        background = pygame.Surface(self.size).convert()
+        background.fill((0, 0, 0))
+        background.blit(stageImage, (0, 0))
+        #Asked for at 32 bits, as an 8 bit display has no alpha to convert to
+        labels = pygame.Surface(self.size, pygame.SRCALPHA, 32)
+        labels.fill((0, 0, 0, 0))
+        for pos, radius, name in self.structure:
+            img = glyphs.render(name, self.fontSize, self.labelColor,
+                                self.labelBackground)
+            labels.blit(img, (pos[0] / self.scale - img.get_width() / 2,
+                              pos[1] / self.scale))
+        return background, labels
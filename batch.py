@@ -0,0 +1,194 @@
+"""Runs the show conversion tools over many files at once. Pages are streamed
+through the stages one at a time, so memory does not grow with the size of
+a show, and the files are shared out over a pool of processes.
+
+    python batch.py --clean archive/2011 old.shw
+"""
+
+import collections
+import itertools
+import json
+import multiprocessing
+import optparse
+import os
+import time
+
+import cleanupShow
+import deparse_old
+
+SHOW_EXTENSIONS = ('.lst', '.1st', '.json')
+
+def readJSONPages(fileName, chunkSize=1 << 16):
+    """Yields the pages of a JSON show one at a time, reading the file in
+    chunks"""
+    decoder = json.JSONDecoder()
+    with open(fileName) as fil:
+        buf = fil.read(chunkSize).lstrip()
+        if not buf.startswith('['):
+            raise ValueError('%s is not a list of pages' % fileName)
+        buf = buf[1:]
+        while True:
+            buf = buf.lstrip(' \t\r\n,')
+            if buf.startswith(']'):
+                return
+            try:
+                page, end = decoder.raw_decode(buf)
+            except ValueError:
+                more = fil.read(chunkSize)
+                if not more:
+                    raise
+                buf += more
+                continue
+            yield page
+            buf = buf[end:]
+
+def writeJSONPages(fil, pages):
+    """Writes the pages in the same layout as Show.save, one at a time"""
+    fil.write('[\n')
+    for i, page in enumerate(pages):
+        if i:
+            fil.write(', \n')
+        fil.write(json.dumps([page], indent=1)[2:-2])
+    fil.write('\n]')
+
+def shwToPages(entries):
+    """Turns the (number, lights) entries of deparse_old.readLights into
+    linked page dictionaries"""
+    previous = None
+    for num, lights in entries:
+        idno = str(num)
+        page = {'idno': idno, 'lights': collections.OrderedDict(lights),
+                'links': {'next': -1},
+                'time': -1, 'notes': ''}
+        if previous is not None:
+            previous['links']['next'] = idno
+            page['links']['previous'] = previous['idno']
+            yield previous
+        previous = page
+    if previous is not None:
+        yield previous
+
+def pagesToCLT(pages):
+    """The reverse of shwToPages, for deparse_old.writeCLT"""
+    for page in pages:
+        yield int(page['idno']), page['lights'].iteritems()
+
+def clean(pages):
+    return itertools.imap(cleanupShow.cleanup, pages)
+
+class Counter(object):
+    """A pass-through stage that counts the pages"""
+    def __init__(self):
+        self.count = 0
+    def __call__(self, pages):
+        for page in pages:
+            self.count += 1
+            yield page
+
+def outputName(fileName, extension, outputDir):
+    base = os.path.splitext(fileName)[0] + extension
+    if outputDir:
+        base = os.path.join(outputDir, os.path.basename(base))
+    return base
+
+def writeAtomically(fileName, write):
+    """Calls write with a temporary file, then moves it over fileName"""
+    tempName = fileName + '.tmp'
+    try:
+        with open(tempName, 'w') as fil:
+            write(fil)
+    except:
+        os.remove(tempName)
+        raise
+    if os.name == 'nt' and os.path.exists(fileName):
+        os.remove(fileName)
+    os.rename(tempName, fileName)
+
+def processFile(job):
+    """Runs one file through its stages, returns its throughput numbers, or
+    the error that stopped it"""
+    try:
+        return _processFile(*job)
+    except Exception as error:
+        return job[0], error
+
+def _processFile(fileName, options):
+    start = time.time()
+    counter = Counter()
+    if fileName.endswith('.shw'):
+        pages = shwToPages(deparse_old.readLights(fileName[:-len('.shw')]))
+    else:
+        pages = readJSONPages(fileName)
+    stages = [clean] if options['clean'] else []
+    stages.append(counter)
+    for stage in stages:
+        pages = stage(pages)
+    if fileName.endswith('.shw') and options['format'] == 'clt':
+        outName = outputName(fileName, '.clt', options['outputDir'])
+        writeAtomically(outName,
+                        lambda fil: deparse_old.writeCLT(fil,
+                                                         pagesToCLT(pages)))
+    else:
+        extension = '.lst' if fileName.endswith('.shw') else \
+                    os.path.splitext(fileName)[1]
+        outName = outputName(fileName, extension, options['outputDir'])
+        writeAtomically(outName, lambda fil: writeJSONPages(fil, pages))
+    return fileName, (outName, counter.count, os.path.getsize(fileName),
+                      time.time() - start)
+
+def isShow(fileName):
+    """Structures share the .lst extension, shows are JSON lists"""
+    if fileName.endswith('.shw'):
+        return True
+    if not fileName.endswith(SHOW_EXTENSIONS):
+        return False
+    with open(fileName) as fil:
+        return fil.read(64).lstrip().startswith('[')
+
+def findFiles(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if isShow(os.path.join(root, name)):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] file-or-dir...')
+    parser.add_option('--clean', action='store_true', default=False,
+                      help='merge the synonyms left by the old stage')
+    parser.add_option('--format', choices=('clt', 'json'), default='clt',
+                      help='what .shw files are converted to [default: %default]')
+    parser.add_option('--output-dir', dest='outputDir', default=None,
+                      help='where to write the results, by default next to '
+                      'the input; JSON shows are rewritten in place')
+    parser.add_option('--jobs', type='int', default=None,
+                      help='number of processes [default: one per CPU]')
+    options, paths = parser.parse_args()
+    if not paths:
+        parser.error('no files given')
+    settings = {'clean': options.clean, 'format': options.format,
+                'outputDir': options.outputDir}
+    pool = multiprocessing.Pool(options.jobs)
+    start = time.time()
+    totalPages = 0
+    for fileName, result in pool.imap_unordered(
+        processFile, [(fileName, settings) for fileName in findFiles(paths)]):
+        if isinstance(result, Exception):
+            print('%s: failed, %s' % (fileName, result))
+            continue
+        outName, pages, size, seconds = result
+        totalPages += pages
+        print('%s -> %s: %d pages, %.1f KB in %.3fs (%.0f pages/s)'
+              % (fileName, outName, pages, size / 1024.0, seconds,
+                 pages / max(seconds, 1e-6)))
+    pool.close()
+    pool.join()
+    seconds = time.time() - start
+    print('%d pages in %.3fs (%.0f pages/s)'
+          % (totalPages, seconds, totalPages / max(seconds, 1e-6)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+"""Times the hot paths of the console without a window. SDL is pointed at its
+dummy video driver and the output goes to a MockOutput, so this runs on a
+machine with no display and no DMX widget.
+
+    python benchmark.py --output today.json --compare yesterday.json
+"""
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import collections
+import gc
+import itertools
+import json
+import optparse
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from patch import Patch
+
+PAGE_COUNTS = (10, 100, 1000, 10000, 100000)
+FIXTURE_COUNTS = (10, 100, 1000, 10000)
+
+def rate(function, duration=1.0):
+    """Calls function repeatedly for duration seconds, returns calls/second"""
+    calls = 0
+    start = time.time()
+    end = start + duration
+    while time.time() < end:
+        for _ in xrange(100):
+            function()
+        calls += 100
+    return calls / (time.time() - start)
+
+def timeOnce(function):
+    start = time.time()
+    function()
+    return time.time() - start
+
+class Results(object):
+    """Collects the timings, and writes them out as JSON"""
+    def __init__(self):
+        self.entries = []
+    def add(self, name, size, seconds):
+        self.entries.append({'name': name, 'size': size, 'seconds': seconds})
+        print('%-28s %8s %12.3f ms' % (name, size, seconds * 1000))
+    def addBytes(self, name, size, count):
+        self.entries.append({'name': name, 'size': size, 'bytes': count})
+        print('%-28s %8s %12d bytes' % (name, size, count))
+    def addRate(self, name, size, function, duration=0.5):
+        self.add(name, size, 1.0 / rate(function, duration))
+    def save(self, fileName):
+        with open(fileName, 'w') as fil:
+            fil.write(json.dumps({'time': time.time(),
+                                  'python': platform.python_version(),
+                                  'machine': platform.machine(),
+                                  'results': self.entries}, indent=1))
+
+def compare(oldName, newName):
+    """Prints the change of every timing between two result files"""
+    def load(fileName):
+        with open(fileName) as fil:
+            return dict(((entry['name'], entry['size']),
+                         entry.get('seconds', entry.get('bytes')))
+                        for entry in json.loads(fil.read())['results'])
+    old, new = load(oldName), load(newName)
+    for key in sorted(new):
+        if key in old and old[key] > 0:
+            print('%-28s %8s %+7.1f%%' % (key[0], key[1],
+                                           100.0 * (new[key] / old[key] - 1)))
+
+def legacyMakeList(channelList, lights, size):
+    """Show.makeList before the patch was compiled"""
+    lst = [0] * size
+    for name, channel in channelList:
+        lst[channel] = max(lst[channel], lights[name])
+    lst = [light * 255 / 100 for light in lst]
+    return lst
+
+def benchPatch(results, size=512):
+    names = ['Light %d' % i for i in xrange(size)]
+    #Every fourth fixture is also doubled onto a second channel
+    channelList = ([(name, i) for i, name in enumerate(names)] +
+                   [(names[i], (i * 7 + 1) % size) for i in xrange(0, size, 4)])
+    lights = collections.defaultdict(lambda: 0)
+    for i, name in enumerate(names):
+        lights[name] = (i * 37) % 101
+    patch = Patch(channelList, size)
+    assert list(patch.frame(lights)) == legacyMakeList(channelList, lights,
+                                                       size)
+    results.addRate('legacy makeList', size,
+                    lambda: legacyMakeList(channelList, lights, size))
+    results.addRate('patch frame', size, lambda: patch.frame(lights))
+    #Half the channels on a square law curve
+    curved = Patch(channelList, size,
+                   dict((i, 'square') for i in xrange(0, size, 2)))
+    results.addRate('patch frame curves', size, lambda: curved.frame(lights))
+
+def legacyPointIndices(structure, point):
+    """LightStructure.getPointIndices before the grid, a scan of every light"""
+    return (i for i, (pos, radius) in
+            enumerate(zip(structure.pos, structure.radius))
+            if sum((pos[j] - point[j]) ** 2 for j in xrange(2)) < radius ** 2)
+
+def makeStructure(count, width=4000, height=4000):
+    """Writes a structure file of count randomly placed lights, returns the
+    loaded LightStructure"""
+    from lights import LightStructure
+    fd, fileName = tempfile.mkstemp(suffix='.lst')
+    with os.fdopen(fd, 'w') as fil:
+        for i in xrange(count):
+            fil.write('%d,%d,35,Light %d\n' % (random.randrange(width),
+                                               random.randrange(height), i))
+    structure = LightStructure(fileName)
+    os.remove(fileName)
+    return structure
+
+def benchStructure(results, counts=FIXTURE_COUNTS):
+    for count in counts:
+        random.seed(0)
+        #Keep the density of the stage about the same as the rig grows
+        side = max(480, int(60 * count ** 0.5))
+        structure = makeStructure(count, side, side)
+        points = [(random.randrange(side), random.randrange(side))
+                  for _ in xrange(100)]
+        for point in points:
+            assert (list(structure.getPointIndices(point)) ==
+                    list(legacyPointIndices(structure, point)))
+        clicks = itertools.cycle(points).next
+        results.addRate('legacy getPointIndices', count,
+                        lambda: list(legacyPointIndices(structure, clicks())),
+                        duration=0.2)
+        results.addRate('getPointIndices', count,
+                        lambda: list(structure.getPointIndices(clicks())))
+
+def benchEffects(results, counts=(1, 12, 36)):
+    """Merging running effects into a 512 channel frame, one tick's work"""
+    import effects
+    names = ['Light %d' % i for i in xrange(400)]
+    patch = Patch([(name, i) for i, name in enumerate(names)], 512)
+    kinds = (effects.Sine, effects.Ramp, effects.Chase)
+    for count in counts:
+        engine = effects.EffectEngine(patch, lambda: None)
+        for i in xrange(count):
+            engine.add(kinds[i % 3]('effect %d' % i,
+                                    names[i * 10:i * 10 + 60], 1 + i % 5))
+            engine.start('effect %d' % i)
+        frame = bytearray(512)
+        results.addRate('effects apply', count, lambda: engine.apply(frame))
+
+def benchLayers(results, size=512):
+    """Merging the playback stack over a cue frame: the cue changing every
+    tick, only the top layer changing, and nothing changing"""
+    import layers
+    random.seed(0)
+    stack = layers.Stack(size, layers.CONSOLE)
+    stack.set('effects', bytearray(random.randrange(256)
+                                   for _ in xrange(size)))
+    stack.set('interrupt', bytearray(size), xrange(0, size, 3))
+    stack.set('hals', bytearray(random.randrange(256) for _ in xrange(size)))
+    stack.setMaster(80)
+    frames = [bytearray(random.randrange(256) for _ in xrange(size))
+              for _ in xrange(2)]
+    ticks = itertools.cycle(frames)
+    results.addRate('layers cue changing', size,
+                    lambda: stack.frame(next(ticks)))
+    tops = itertools.cycle([bytearray([level]) * size for level in (10, 20)])
+    held = range(0, size, 8)
+    def top():
+        stack.set('override', next(tops), held)
+        return stack.frame(frames[0])
+    results.addRate('layers top changing', size, top)
+    results.addRate('layers unchanged', size, lambda: stack.frame(frames[0]))
+
+def channelListFor(names):
+    return tuple((name, i % 24) for i, name in enumerate(names))
+
+def makeShow(fileName, count, names):
+    """Writes a show of count linked pages to fileName"""
+    pages = [{'idno': str(i),
+              'lights': dict((name, random.choice((0, 50, 75, 100)))
+                             for name in names),
+              'links': {'next': str(i + 1) if i + 1 < count else -1,
+                        'previous': str(i - 1)},
+              'time': -1, 'notes': 'cue %d' % i}
+             for i in xrange(count)]
+    pages[0]['links'].pop('previous')
+    for special in ('blackout', 'hals', 'interrupt'):
+        pages.append({'idno': special, 'lights': {}, 'links': {'next': -1},
+                      'time': -1, 'notes': ''})
+    with open(fileName, 'w') as fil:
+        fil.write(json.dumps(pages, indent=1))
+
+def benchShow(results, counts=PAGE_COUNTS):
+    import controller
+    names = ['Light %d' % i for i in xrange(20)]
+    channelList = channelListFor(names)
+    directory = tempfile.mkdtemp()
+    try:
+        for count in counts:
+            random.seed(count)
+            fileName = os.path.join(directory, 'show%d.lst' % count)
+            makeShow(fileName, count, names)
+            results.add('Show load', count,
+                        timeOnce(lambda: controller.Show(fileName,
+                                                         channelList)))
+            show = controller.Show(fileName, channelList)
+            results.add('Show save', count, timeOnce(show.save))
+            results.addRate('makeList', count, show.makeList)
+            results.addRate('getLights', count, lambda: show.getLights(0.5))
+            model = controller.PreviewModel(show, lambda page:
+                                            page.links['next'])
+            model.adjustDepth(5)
+            model.getID()
+            results.addRate('PreviewModel.getID', count, model.getID)
+    finally:
+        shutil.rmtree(directory)
+
+class LegacyPage(object):
+    """Page before its levels were packed into a row"""
+    def __init__(self, idno=None, lights={}, links=None, time=-1,
+                 transition=None, notes=''):
+        self.idno = idno
+        self.links = links if links is not None else {'next': -1}
+        self.lights = collections.defaultdict(lambda : 0)
+        for key, value in lights.iteritems():
+            self.lights[str(key)] = value
+        self.time = time
+        self.fullTime = time
+        self.transition = transition
+        self.notes = notes
+
+def deepSize(obj, seen=None):
+    """The bytes held by obj and everything it refers to, counting shared
+    objects once"""
+    import sys
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deepSize(key, seen) + deepSize(value, seen)
+                    for key, value in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deepSize(item, seen) for item in obj)
+    elif hasattr(obj, '__dict__'):
+        size += deepSize(obj.__dict__, seen)
+    for name in getattr(type(obj), '__slots__', ()):
+        if hasattr(obj, name):
+            size += deepSize(getattr(obj, name), seen)
+    return size
+
+def benchMemory(results, fileName='folk.lst', scale=100):
+    """The memory and garbage collection cost of the pages of fileName,
+    repeated scale times, held the old way and as rows of levels"""
+    import controller
+    from levels import Fixtures
+    with open(fileName) as fil:
+        pages = json.loads(fil.read())
+    pages = [dict(page, idno='%s.%d' % (page['idno'], i))
+             for i in xrange(scale) for page in pages]
+    fixtures = Fixtures()
+    for name, makePage in (('legacy', LegacyPage),
+                           ('row', lambda **page: controller.Page(
+                               fixtures=fixtures, **page))):
+        built = [makePage(**controller.stringifyDict(page)) for page in pages]
+        #The fixture table is shared by the whole show, so it is left out
+        results.addBytes('%s bytes per page' % name, len(built),
+                         deepSize(built, set([id(fixtures)])) / len(built))
+        results.add('%s gc.collect' % name, len(built), timeOnce(gc.collect))
+        del built
+
+def benchFrames(results, counts=(10, 100, 1000)):
+    """A full redraw of every view, and replaying a macro"""
+    import controller
+    import display
+    import macro
+    from output import MockOutput
+    display.init()
+    directory = tempfile.mkdtemp()
+    try:
+        for count in counts:
+            random.seed(count)
+            structure = makeStructure(count, 480, 480)
+            channelList = channelListFor(structure.names)
+            fileName = os.path.join(directory, 'frames%d.lst' % count)
+            makeShow(fileName, 100, structure.names)
+            show = controller.Show(fileName, channelList)
+            macros = controller.MacroRecorder()
+            mainView = controller.MainView(structure, show)
+            main = controller.MainController(mainView, show, macros,
+                                             MockOutput())
+            main.setRunning(True)
+            macros.setRefreshOutput(main.refreshOutput)
+            nextModel = controller.PreviewModel(show, lambda page:
+                                                page.links['next'])
+            views = [('MainView', mainView),
+                     ('PreView', controller.PreView(nextModel, structure,
+                                                    (480, 0))),
+                     ('NoteView', controller.NoteView(show, (480, 320)))]
+            for name, view in views:
+                view.render()
+                results.addRate('%s frame' % name, count, view.render,
+                                duration=0.3)
+            macros.addTarget('show', show)
+            macros.macros['!'] = macro.compile(
+                [('show', 'toggleIntensity', (name,))
+                 for name in structure.names[:50] * 2])
+            results.addRate('macro replay', count, lambda: macros.play('!'),
+                            duration=0.3)
+    finally:
+        shutil.rmtree(directory)
+
+def benchStartup(results, modules=('show', 'lights', 'controller')):
+    """A cold import of each module in a new interpreter, best of three.
+    The interpreter starting on its own is timed first to set it against"""
+    for name, code in ([('interpreter start', 'pass')] +
+                       [('import ' + module, 'import ' + module)
+                        for module in modules]):
+        times = []
+        for _ in xrange(3):
+            start = time.time()
+            failed = subprocess.call([sys.executable, '-c', code],
+                                     cwd=os.path.dirname(
+                                         os.path.abspath(__file__)),
+                                     stderr=open(os.devnull, 'w'))
+            times.append(time.time() - start)
+        if failed:
+            print('%-28s %8s %15s' % (name, '', 'failed'))
+        else:
+            results.add(name, '', min(times))
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--output', default='benchmark.json',
+                      help='where to write the results [default: %default]')
+    parser.add_option('--compare', default=None,
+                      help='an earlier results file to compare against')
+    parser.add_option('--quick', action='store_true', default=False,
+                      help='leave out the largest shows and structures')
+    options, _ = parser.parse_args()
+    results = Results()
+    benchStartup(results)
+    pageCounts = PAGE_COUNTS[:-1] if options.quick else PAGE_COUNTS
+    fixtureCounts = FIXTURE_COUNTS[:-1] if options.quick else FIXTURE_COUNTS
+    benchPatch(results)
+    benchStructure(results, fixtureCounts)
+    benchShow(results, pageCounts)
+    benchMemory(results)
+    benchEffects(results)
+    benchLayers(results)
+    benchFrames(results)
+    results.save(options.output)
+    if options.compare:
+        compare(options.compare, options.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Edits and queries over all the pages of a show at once, like scaling FC
+by 80% across pages 40 to 200 or finding the pages with RAMP above 50.
+
+The levels are kept as a pages by fixtures matrix in one bytearray, so the
+column of a fixture is a strided slice. A test or an edit of a level only
+has 255 possible inputs, so it is worked out once into a translate table and
+put through the whole column in one call. The notes have an index of their
+words for finding a cue by its text.
+
+    python columns.py show.lst --pages 40:200 --scale FC=80 --above RAMP=50
+"""
+
+import bisect
+import collections
+import itertools
+import operator
+import re
+
+from levels import UNSET
+from patch import getter
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+def words(text):
+    return WORD.findall(text.lower())
+
+def testTable(test):
+    """The translate table taking a level to 1 when test passes, unset
+    levels never do"""
+    return ''.join('\x01' if level != UNSET and test(level) else '\x00'
+                   for level in xrange(256))
+
+def changeTable(function, unset=False):
+    """The translate table of an edit of a level. Results are rounded and
+    kept from 0 to 254. Unset levels stay unset, or are taken as 0"""
+    def change(level):
+        return chr(max(0, min(UNSET - 1, int(round(function(level))))))
+    return ''.join([change(level) for level in xrange(UNSET)] +
+                   [change(0) if unset else chr(UNSET)])
+
+class NoteIndex(object):
+    """The words of the notes, each with the pages it is in. Only the pages
+    whose notes changed are indexed again"""
+    def __init__(self):
+        self.pages = collections.defaultdict(set)
+        self.indexed = {}
+        self.vocabulary = None
+    def _remove(self, idno):
+        for word in set(words(self.indexed.pop(idno))):
+            self.pages[word].discard(idno)
+            if not self.pages[word]:
+                del self.pages[word]
+                self.vocabulary = None
+    def update(self, pages):
+        for idno in [idno for idno in self.indexed if idno not in pages]:
+            self._remove(idno)
+        for idno, page in pages.iteritems():
+            notes = self.indexed.get(idno)
+            if notes is page.notes or notes == page.notes:
+                continue
+            if notes is not None:
+                self._remove(idno)
+            self.indexed[idno] = page.notes
+            for word in words(page.notes):
+                if word not in self.pages:
+                    self.vocabulary = None
+                self.pages[word].add(idno)
+    def search(self, text):
+        """The pages with a word starting with each word of text"""
+        found = None
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.pages)
+        for query in words(text):
+            start = bisect.bisect_left(self.vocabulary, query)
+            matches = set()
+            for word in itertools.islice(self.vocabulary, start, None):
+                if not word.startswith(query):
+                    break
+                matches |= self.pages[word]
+            found = matches if found is None else found & matches
+            if not found:
+                break
+        return found or set()
+
+class Columns(object):
+    """The levels of a show as a matrix. Row r is the page ids[r], the cue
+    list in order and then the other pages, and the columns follow the
+    fixture table. The matrix is built again when the show has changed, but
+    its own edits are made to it in place. Where pages are picked, ids is a
+    list of page ids, by default all of them"""
+    def __init__(self, show):
+        self.show = show
+        self.version = None
+        self.width = 0
+        self.ids = []
+        self.rows = {}
+        self.matrix = bytearray()
+        self.notes = NoteIndex()
+    def refresh(self):
+        show = self.show
+        width = len(show.fixtures)
+        if self.version == show.version and self.width == width:
+            return
+        cues = list(show.cues())
+        listed = set(cues)
+        self.ids = cues + sorted(idno for idno in show.pages
+                                 if idno not in listed)
+        self.rows = dict((idno, i) for i, idno in enumerate(self.ids))
+        unset = bytearray([UNSET])
+        rows = []
+        for idno in self.ids:
+            row = show.pages[idno].row
+            rows.append(row + unset * (width - len(row))
+                        if len(row) < width else row)
+        self.matrix = bytearray().join(rows)
+        self.width = width
+        self.version = show.version
+    def between(self, first, last):
+        """The pages from first to last in the cue list"""
+        self.refresh()
+        start, end = sorted((self.rows[first], self.rows[last]))
+        return self.ids[start:end + 1]
+    def column(self, name, ids=None):
+        """The levels of name on the pages, UNSET where it is not set"""
+        self.refresh()
+        i = self.show.fixtures.index.get(name)
+        count = len(self.ids) if ids is None else len(ids)
+        if i is None or not count:
+            return bytearray([UNSET]) * count
+        column = self.matrix[i::self.width]
+        if ids is not None:
+            column = bytearray(getter([self.rows[idno] for idno in ids])(column))
+        return column
+    def where(self, name, test, ids=None):
+        """The pages name is set on with a level test passes"""
+        mask = self.column(name, ids).translate(testTable(test))
+        return list(itertools.compress(self.ids if ids is None else ids, mask))
+    def above(self, name, level, ids=None):
+        return self.where(name, lambda each: each > level, ids)
+    def change(self, name, function, ids=None, unset=False):
+        """Puts the levels of name through function, as one edit that can be
+        undone. Pages that leave name unset are left alone, unless unset is
+        true. Returns how many levels changed"""
+        old = self.column(name, ids)
+        new = old.translate(changeTable(function, unset))
+        ids = self.ids if ids is None else ids
+        changed = list(itertools.compress(xrange(len(old)),
+                                          map(operator.ne, old, new)))
+        if not changed:
+            return 0
+        version = self.show.version
+        self.show.setLevels([(ids[k], name, new[k]) for k in changed])
+        i = self.show.fixtures.index[name]
+        if self.version == version and i < self.width:
+            for k in changed:
+                self.matrix[self.rows[ids[k]] * self.width + i] = new[k]
+            self.version = self.show.version
+        return len(changed)
+    def scale(self, name, percent, ids=None):
+        return self.change(name, lambda level: level * percent / 100.0, ids)
+    def setLevel(self, name, level, ids=None):
+        return self.change(name, lambda _: level, ids, unset=True)
+    def find(self, text):
+        """The pages whose notes have every word of text, or words starting
+        with them, in cue list order"""
+        self.refresh()
+        self.notes.update(self.show.pages)
+        return sorted(self.notes.search(text), key=self.rows.get)
+
+def main():
+    import optparse
+    from show import Show
+    parser = optparse.OptionParser(usage='%prog [options] show')
+    parser.add_option('--pages', default=None, metavar='FIRST:LAST',
+                      help='only the pages from FIRST to LAST in the cue list')
+    parser.add_option('--scale', action='append', default=[],
+                      metavar='NAME=PERCENT', help='scale the levels of NAME')
+    parser.add_option('--level', action='append', default=[],
+                      metavar='NAME=LEVEL', help='set NAME to LEVEL')
+    parser.add_option('--above', action='append', default=[],
+                      metavar='NAME=LEVEL',
+                      help='list the pages with NAME above LEVEL')
+    parser.add_option('--find', default=None, metavar='TEXT',
+                      help='list the pages whose notes have TEXT')
+    options, argv = parser.parse_args()
+    if len(argv) != 1:
+        parser.error('give one show')
+    show = Show(argv[0], [])
+    columns = show.columns()
+    ids = columns.between(*options.pages.split(':', 1)) if options.pages \
+          else None
+    def pairs(values):
+        for value in values:
+            name, _, number = value.rpartition('=')
+            if not name:
+                parser.error('expected NAME=NUMBER, not %s' % value)
+            yield name, float(number)
+    changed = 0
+    for name, percent in pairs(options.scale):
+        changed += columns.scale(name, percent, ids)
+    for name, level in pairs(options.level):
+        changed += columns.setLevel(name, level, ids)
+    for name, level in pairs(options.above):
+        print('%s above %g: %s' % (name, level,
+                                   ' '.join(columns.above(name, level, ids))))
+    if options.find:
+        print('notes with %s: %s' % (options.find,
+                                     ' '.join(columns.find(options.find))))
+    if changed:
+        show.save()
+        print('%d levels changed' % changed)
+    show.close()
+
+if __name__ == '__main__':
+    main()
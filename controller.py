@@ -1,167 +1,39 @@
-"""Used to control the stage"""
+"""Used to control the stage. Needs Stackless Python 2.7 and pygame"""
 
 import stackless
 import pygame
-pygame.init()
-import json
 import collections
-import serial
-from structure import LightStructure, EventWrapper
-
-screen = pygame.display.set_mode((640, 480))
-
-def stringifyDict(dic):
-    stringified = {}
-    for key, value in dic.iteritems():
-        stringified[str(key)] = value
-    return stringified
-
-class Page(object):
-    """The class for a page of the show"""
-    def __init__(self, idno=None, lights={}, links=None, time=-1, transition=None, notes=''):
-        self.idno = idno
-        self.links = links if links is not None else {'next': -1}
-        self.lights = collections.defaultdict(lambda : 0)
-        for key, value in stringifyDict(lights).iteritems():
-            self.lights[key] = value
-        self.time = time
-        self.fullTime = time
-        self.notes = notes
-    def updateTime(self, time):
-        if self.time < 0:
-            return self.idno
-        else:
-            self.time -= time
-            if self.time < 0:
-                return self.links['timeout']
-
-class Show(object):
-    """The model for the show"""
-    def __init__(self, fileName, channelList):
-        self.loadFile(fileName)
-        self.channelList = channelList
-        self.currentPage = self.pages['0']
-    def makeList(self):
-        lst = [0] * 24
-        for name, channel in self.channelList:
-            lst[channel] = max(lst[channel], self.currentPage.lights[name])
-        lst = [light * 255 / 100 for light in lst]
-        return lst
-    def updateTime(self, time):
-        self.currentPage = self.pages[self.currentPage.updateTime(time)]
-    def _createPage(self, prefix=''):
-        i = 0
-        while prefix + str(i) in self.pages:
-            i += 1
-        i = prefix + str(i)
-        self.pages[i] = Page(i)
-        nextPage = self._interrupt(i)
-        self.currentPage.links['next'] = i
-        return nextPage
-    def moveForward(self):
-        try:
-            self.currentPage = self.pages[self.currentPage.links['next']]
-        except KeyError:
-            self.currentPage = self._createPage()
-        if self.currentPage.links['next'] == -1:
-            self._createPage()
-    def moveBack(self):
-        try:
-            self.currentPage = self.pages[self.currentPage.links['previous']]
-        except KeyError:
-            pass
-    def _interrupt(self, page):
-        self.pages[page].links['previous'] = self.currentPage.idno
-        self.pages[page].links['next'] = self.currentPage.links['next']
-        return self.pages[page]
-    def blackout(self):
-        self.currentPage = self._interrupt('blackout')
-    def hals(self):
-        self.currentPage = self._interrupt('hals')
-    def interrupt(self):
-        nextLink = self.currentPage.links['next']
-        nextPage = self._createPage('i')
-        for key, value in self.pages['interrupt'].lights.iteritems():
-            nextPage.lights[key] = value
-            self.pages['interrupt'].lights[key] = 0
-        self.currentPage = self._interrupt(nextPage.idno)
-        nextPage.links['next'] = nextLink
-        self.pages[nextLink].links['previous'] = nextPage.idno
-    def save(self):
-        pages = [{'idno': page.idno, 'lights': dict(page.lights),
-                  'links': page.links, 'time': page.time,
-                  'notes': page.notes}
-                 for page in self.pages.itervalues()]
-        fil = open(self.fileName, 'w')
-        fil.write(json.dumps(pages, indent=1))
-        fil.close()
-    def loadFile(self, fileName):
-        self.fileName = fileName
-        try:
-            fil = open(self.fileName)
-            self.pages = dict((page['idno'], Page(**stringifyDict(page)))
-                              for page in json.loads(fil.read()))
-            fil.close()
-        except IOError:
-            self.pages = {'0': Page('0'),
-                          'blackout': Page('blackout'),
-                          'hals': Page('hals', {'ONHALS': 100,
-                                                'OFFHALS': 100}),
-                          'interrupt': Page('interrupt')}
-    def getLights(self, transition=0):
-        lights = collections.defaultdict(lambda : 0)
-        currentLights = self.currentPage.lights
-        try:
-            nextLights = self.pages[self.currentPage.links['next']].lights
-        except KeyError:
-            nextLights = collections.defaultdict(lambda : 0)
-        for key in currentLights:
-            lights[key] = (currentLights[key] * (1 - transition) +
-                           nextLights[key] * transition)
-        for key in nextLights:
-            if key not in lights:
-                lights[key] = nextLights[key] * transition
-        return lights
-    def toggleIntensity(self, name, idno=None):
-        page = self._getPage(idno)
-        if page.lights[name] <= 50:
-            page.lights[name] = 100
-        elif page.lights[name] <= 75:
-            page.lights[name] = 50
-        else:
-            page.lights[name] = 75
-    def turnOff(self, name, idno=None):
-        page = self._getPage(idno)
-        page.lights[name] = 0
-    def _getPage(self, idno):
-        if idno is None:
-            page = self.currentPage
-        else:
-            try:
-                page = self.pages[idno]
-            except KeyError:
-                assert(idno == -1)
-                page = self._createPage()
-        return page
-    def getPreview(self, idno):
-        return self._getPage(idno).lights
-    def delete(self):
-         previousPage = self._getPage(self.currentPage.links['previous'])
-         nextPage = self._getPage(self.currentPage.links['next'])
-         previousPage.links['next'] = nextPage.idno
-         nextPage.links['previous'] = previousPage.idno
-         self.currentPage = nextPage
-    def setNext(self, nextId):
-        self.currentPage.links['next'] = nextId
+import fractions
+import os
+import Queue
+import sys
+import threading
+from structure import EventWrapper
+from lights import LightStructure
+from show import Page, Show, stringifyDict
+from output import MockOutput, OutputProcess
+import patch
+from assets import glyphs, StageLayers
+import display
+import instruments
+import layers
+import macro
+import replay
 
 class Action(object):
-    """For actions to be taken on an event"""
-    def __init__(self, test, function):
-        self.test = test
+    """For actions to be taken on a key. key is a pygame key, or the
+    character typed for keys like Ctrl-S"""
+    def __init__(self, key, function, *args):
+        self.key = key
         self.function = function
+        self.args = args
+    def test(self, event):
+        if isinstance(self.key, basestring):
+            return event.unicode == self.key
+        return event.key == self.key
     def __call__(self, event):
         if self.test(event):
-            self.function()
+            self.function(*self.args)
             return True
         return False
 
@@ -177,9 +49,14 @@ class MouseAction(object):
         return False
 
 class MacroRecorder(object):
-    """Records and executes macros"""
-    def __init__(self):
+    """Records and executes macros. The calls recorded are compiled into
+    their net effect as they come in, see macro.py, and the macros are kept
+    in fileName. Calls are recorded by the name of the object they were made
+    on, so every object whose methods can be recorded has to be added with
+    addTarget"""
+    def __init__(self, fileName=None):
         self.refreshOutput = None
+        self.fileName = fileName
         self.macros = {'!': [],
                        '@': [],
                        '#': [],
@@ -190,6 +67,8 @@ class MacroRecorder(object):
                        '*': [],
                        '(': [],
                        ')': []}
+        if fileName:
+            self.macros.update(macro.load(fileName))
         self.keyDic = {pygame.K_1: '!',
                        pygame.K_2: '@',
                        pygame.K_3: '#',
@@ -200,25 +79,58 @@ class MacroRecorder(object):
                        pygame.K_8: '*',
                        pygame.K_9: '(',
                        pygame.K_0: ')'}
+        #What the dispatcher hands to press
+        self.keys = self.keyDic.keys() + [pygame.K_RETURN]
+        self.characters = self.macros.keys()
+        self.targets = {}
+        self.targetNames = {}
         self.recording = False
+        self.playing = False
+    def addTarget(self, name, target):
+        self.targets[name] = target
+        self.targetNames[id(target)] = name
     def updateEvents(self, getEvents):
         for event in getEvents():
-            if event.type != pygame.KEYDOWN:
-                continue
-            if self.recording:
-                if event.key == pygame.K_RETURN:
-                    self.recording = False
-            else:
-                if event.unicode in self.macros:
-                    self.recording = event.unicode
-                    self.macros[self.recording] = []
-                elif event.key in self.keyDic:
-                    for function, args in self.macros[self.keyDic[event.key]]:
-                        function(*args)
-                    self.refreshOutput()
-    def record(self, function, *args):
+            if event.type == pygame.KEYDOWN:
+                self.press(event)
+    def press(self, event):
+        if self.recording and event.key == pygame.K_RETURN:
+            if self.fileName:
+                macro.save(self.fileName, self.macros)
+            self.recording = False
+        elif not self.recording and event.unicode in self.macros:
+            self.recording = event.unicode
+            self.macros[self.recording] = []
+        elif (event.key in self.keyDic and
+              event.unicode not in self.macros and
+              self.keyDic[event.key] != self.recording):
+            #Playing a macro while recording another records its steps
+            self.play(self.keyDic[event.key])
+    def play(self, name):
+        self.playing = True
+        try:
+            for step in self.macros[name]:
+                target = self.targets[step[1]]
+                if step[0] == 'levels':
+                    target.applyLevels(step[2])
+                else:
+                    getattr(target, step[2])(*step[3])
+        finally:
+            self.playing = False
         if self.recording:
-            self.macros[self.recording].append((function, args))
+            macro.extend(self.macros[self.recording], self.macros[name])
+        self.refreshOutput()
+    def record(self, function, *args):
+        if not self.recording or self.playing:
+            return
+        target = function.__self__
+        try:
+            name = self.targetNames[id(target)]
+        except KeyError:
+            raise ValueError('%s of %r cannot be recorded'
+                             % (function.__name__, target))
+        macro.addCall(self.macros[self.recording], name, function.__name__,
+                      args)
     def setRefreshOutput(self, refreshOutput):
         self.refreshOutput = refreshOutput
                     
@@ -228,31 +140,30 @@ class Controller(object):
         self.running =  False
         self.output = output
         self.view = view
-        self.mouseActions = (MouseAction(1, lambda name: show.toggleIntensity(name)),
-                             MouseAction(3, lambda name: show.turnOff(name)))
+        self.mouseActions = (MouseAction(1, show.toggleIntensity),
+                             MouseAction(3, show.turnOff))
         self.keyActions = ()
         self.macros = macros
         self.refreshOutput()
-    def updateEvents(self, getEvents):
-        """Converts events into actions"""
+    def click(self, event):
+        """Handles a click on the view, True if a light changed"""
+        name = self.view.getName(event.pos)
         changed = False
-        for event in getEvents():
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                name = self.view.getName(event.pos)
-                for action in self.mouseActions:
-                    if action(event, name):
-                        self.macros.record(action.function, name)
-                        changed = True
-            elif event.type == pygame.KEYDOWN:
-                for action in self.keyActions:
-                    if action(event):
-                        self.macros.record(action.function)
-                        changed = True
-        if changed:
-            self.refreshOutput()
+        for action in self.mouseActions:
+            if action(event, name):
+                self.macros.record(action.function, name)
+                changed = True
+        return changed
+    def run(self, action):
+        """Does a key action, and records it"""
+        action.function(*action.args)
+        self.macros.record(action.function, *action.args)
+        return True
     def refreshOutput(self):
-        if self.running and self.makeList():
-            self.output.write(self.makeList())
+        if self.running:
+            packet = self.makeList()
+            if packet:
+                self.output.write(packet)
     def makeList(self):
         return ''
     def setRunning(self, running):
@@ -261,45 +172,230 @@ class Controller(object):
 class MainController(Controller):
     """The controller for the stage itself"""
     def __init__(self, view, show, macros, output):
+        self.fades = None
+        self.effects = None
+        self.player = None
+        self.patchFile = None
+        self.stack = layers.Stack(show.patch.size, layers.CONSOLE)
+        #The grand master a blackout goes back to
+        self.master = 100
+        #Fixture name to level held on the override layer
+        self.overrides = {}
+        #The show version the interrupt and HALS layers were taken at
+        self.layerVersion = None
         Controller.__init__(self, view, show, macros, output)
         self.show = show
-        testKey = lambda key: (lambda event: event.key == key)
-        self.keyActions = (Action(testKey(pygame.K_PAGEDOWN),
-                                  show.moveForward),
-                           Action(testKey(pygame.K_PAGEUP), show.moveBack),
-                           Action(testKey(pygame.K_i), show.interrupt),
-                           Action(testKey(pygame.K_b), show.blackout),
-                           Action(testKey(pygame.K_SPACE), show.hals),
-                           Action(lambda event: event.unicode == u'', show.save),
-                           Action(testKey(pygame.K_d), show.delete),
-                           Action(testKey(pygame.K_r), self.refreshOutput),
-                           Action(testKey(pygame.K_s), show.moveForward))
+        self.keyActions = (Action(pygame.K_PAGEDOWN, self.go),
+                           Action(pygame.K_PAGEUP, self.moveBack),
+                           Action(pygame.K_i, self.interrupt),
+                           Action(pygame.K_b, self.blackout),
+                           Action(pygame.K_SPACE, self.hals),
+                           Action(u'', show.save),
+                           Action(u'\x1a', show.undo),
+                           Action(u'\x19', show.redo),
+                           Action(u'\x0c', self.reloadPatch),
+                           Action(pygame.K_d, show.delete),
+                           Action(pygame.K_r, self.refreshOutput),
+                           Action(pygame.K_s, self.go),
+                           Action(pygame.K_F11, self.togglePlayback))
     def load(self):
         pass
+    def setFadeEngine(self, fades):
+        self.fades = fades
+    def setEffectEngine(self, effects):
+        self.effects = effects
+    def setPatchFile(self, fileName):
+        self.patchFile = fileName
+    def reloadPatch(self):
+        """Reads the patch file again. The frame keeps its size, as the
+        output was opened for it, and a patch with a mistake in it is not
+        taken"""
+        if not self.patchFile:
+            return
+        try:
+            channels = patch.load(self.patchFile, self.show.patch.size)
+        except (IOError, ValueError) as error:
+            sys.stderr.write('The patch was not reloaded: %s\n' % error)
+            return
+        self.show.setPatch(channels)
+        if self.effects:
+            self.effects.setPatch(channels)
+        self.layerVersion = None
+        self._updateOverrides()
+    def setPlayer(self, player):
+        self.player = player
+    def playing(self):
+        return self.player is not None and self.player.playing
+    def togglePlayback(self):
+        """Plays the rendered timeline from the cue on stage, or goes back to
+        live"""
+        if not self.player:
+            return
+        if self.player.playing:
+            self.player.stop()
+        else:
+            self.player.play(self.show.currentPage.idno)
+    def go(self):
+        if self.playing():
+            self.player.seekOffset(1)
+        elif self.fades:
+            self.fades.go()
+        else:
+            self.show.moveForward()
+    def moveBack(self):
+        if self.playing():
+            self.player.seekOffset(-1)
+        else:
+            self.show.moveBack()
+    #Interrupts and blackouts always go back to live
+    def interrupt(self):
+        """Holds the channels of the interrupt page over the cue, or lets
+        them go"""
+        if self.player:
+            self.player.stop()
+        self._togglePage('interrupt')
+    def hals(self):
+        """Brings the house lights up over whatever is on stage, or takes
+        them out"""
+        self._togglePage('hals')
+    def blackout(self):
+        """Takes the grand master to 0, or back to where it was"""
+        if self.player:
+            self.player.stop()
+        if self.stack.master:
+            self.master = self.stack.master
+            self.stack.setMaster(0)
+        else:
+            self.stack.setMaster(self.master)
+    def setMaster(self, level):
+        self.stack.setMaster(level)
+        if self.stack.master:
+            self.master = self.stack.master
+    def hold(self, name, level):
+        """Holds the fixture name at level over everything under it"""
+        self.overrides[name] = max(0, min(100, int(level)))
+        self._updateOverrides()
+    def release(self, name=None):
+        """Lets go of the fixture name, or of every fixture held"""
+        if name is None:
+            self.overrides.clear()
+        else:
+            self.overrides.pop(name, None)
+        self._updateOverrides()
+    def _togglePage(self, name):
+        if self.stack.isOn(name):
+            self.stack.clear(name)
+        else:
+            self._takePage(name)
+    def _takePage(self, name):
+        """Puts the levels of the page name on its layer. An LTP layer takes
+        only the fixtures set on the page"""
+        page = self.show.pages[name]
+        patched = self.show.patch.channels()
+        self.stack.set(name, self.show.makeList(page),
+                       [channel for fixture in page.lights.iterkeys()
+                        for channel in patched.get(fixture, ())])
+    def _updateOverrides(self):
+        if not self.overrides:
+            self.stack.clear('override')
+            return
+        patched = self.show.patch.channels()
+        levels = collections.defaultdict(int, self.overrides)
+        self.stack.set('override', self.show.patch.frame(levels),
+                       [channel for fixture in self.overrides
+                        for channel in patched.get(fixture, ())])
+    def _updateLayers(self):
+        """Follows edits to the pages on the layers"""
+        if self.show.version == self.layerVersion:
+            return
+        self.layerVersion = self.show.version
+        for name in ('interrupt', 'hals'):
+            if self.stack.isOn(name):
+                self._takePage(name)
+    def find(self, text):
+        """Puts the next cue whose notes have text on stage, going round to
+        the start of the cue list. False if no cue has it"""
+        found = self.show.columns().find(text)
+        if not found:
+            return False
+        current = self.show.currentPage.idno
+        rows = self.show.columns().rows
+        following = [idno for idno in found
+                     if rows[idno] > rows.get(current, -1)]
+        if self.player:
+            self.player.stop()
+        self.show.jump((following or found)[0])
+        return True
     def makeList(self):
-        return ''.join(chr(val) for val in [126, 6, 25, 0, 0] + self.show.makeList() + [231])
+        """The output frame, the framing is left to the output"""
+        if self.playing():
+            frame = bytearray(self.player.frame())
+        elif self.fades:
+            frame = self.fades.frameNow()
+        else:
+            frame = self.show.makeList()
+        if not isinstance(frame, bytearray):
+            frame = bytearray(int(val + 0.5) for val in frame)
+        self._updateLayers()
+        effect = self.effects.frame() if self.effects else None
+        if effect is None:
+            self.stack.clear('effects')
+        else:
+            self.stack.set('effects', effect)
+        return str(self.stack.frame(frame))
 
-class MainView(object):
-    """The view for the stage itself"""
-    def __init__(self, structure, show):
+class View(object):
+    """The base for the view classes. A view only redraws when the state it
+    shows has changed since the last frame"""
+    def __init__(self, area):
+        self.area = pygame.Rect(area)
+        self.drawnState = None
+    def state(self):
+        """Returns a cheap snapshot of whatever the view depends on"""
+        return None
+    def isDirty(self):
+        return self.state() != self.drawnState
+    def render(self):
+        """Redraws the view and returns the rects that were touched"""
+        self.drawnState = self.state()
+        return list(self.draw())
+    def draw(self):
+        yield display.screen.fill((0, 0, 0), self.area)
+
+class MainView(View):
+    """The view for the stage itself. The layers of stack that are on are
+    named at the top"""
+    def __init__(self, structure, show, stack=None):
+        View.__init__(self, (0, 0, 480, 480))
         self.structure = structure
         self.show = show
-        self.stageImage = pygame.image.load('stage.png').convert_alpha()
-        self.font = pygame.font.Font(None, 20)
+        self.stack = stack
+        self.layers = StageLayers(structure, self.area.size)
+    def state(self):
+        return (self.show.version,
+                self.stack.state() if self.stack else None)
     def draw(self):
-        screen.blit(self.stageImage, (0, 0))
-        img = self.font.render(str(self.show.currentPage.idno),
-                               0, (255, 0, 0))
-        yield screen.blit(img, (3, 3))
-        lights = self.show.getLights()
+        background, labels = self.layers.get()
+        yield display.screen.blit(background, self.area)
+        img = glyphs.render(str(self.show.currentPage.idno), 20, (255, 0, 0))
+        display.screen.blit(img, (3, 3))
+        if self.stack:
+            names, master = self.stack.state()
+            words = [name.upper() for name in names if name != 'effects']
+            if master < 100:
+                words.append('BLACKOUT' if not master else 'GM %d' % master)
+            if words:
+                img = glyphs.render(' '.join(words), 20, (255, 0, 0))
+                display.screen.blit(img, (self.area.right - img.get_width()
+                                          - 3, 3))
+        lights = self.show.getLights(self.show.transition,
+                                     self.show.fadeTarget)
         for pos, radius, name in self.structure:
-            rect = pygame.draw.circle(screen, (255 * lights[name] / 100,
-                                               255 * lights[name] / 100,
-                                               0),
-                                      pos, radius)
-            img = self.font.render(name, 0, (255, 0, 0))
-            screen.blit(img, (pos[0] - img.get_width() / 2, pos[1]))
-            yield rect
+            pygame.draw.circle(display.screen, (255 * lights[name] / 100,
+                                        255 * lights[name] / 100,
+                                        0),
+                               pos, radius)
+        display.screen.blit(labels, self.area)
     getName = lambda self, pos: self.structure.getName(pos)
 
 class PreviewModel(object):
@@ -310,6 +406,11 @@ class PreviewModel(object):
         self.depth = 0
     def getID(self):
         retId = self.idFunction(self.show.currentPage)
+        if self.depth != 0:
+            newId = self.show.cueOffset(retId, self.depth)
+            if newId is not None:
+                return newId
+        #Pages off the cue list, like the interrupt page, walk their links
         link = 'previous' if (self.depth < 0) else 'next'
         depth = self.depth
         newId = retId
@@ -328,6 +429,8 @@ class PreviewModel(object):
         self.show.toggleIntensity(name, self.getID())
     def turnOff(self, name):
         self.show.turnOff(name, self.getID())
+    def applyLevels(self, ops):
+        self.show.applyLevels(ops, self.getID())
     def adjustDepth(self, diff):
         self.depth += diff
     def resetDepth(self):
@@ -335,33 +438,32 @@ class PreviewModel(object):
     def setNext(self):
         self.show.setNext(self.getID())
 
-class PreView(object):
+class PreView(View):
     """Shows a preview of a different page"""
     def __init__(self, model, structure, offset):
+        View.__init__(self, (offset, (160, 160)))
         self.structure = structure
         self.model = model
         self.offset = offset
-        self.stageImage = pygame.image.load('stage.png').convert_alpha()
-        self.stageImage = pygame.transform.scale(self.stageImage, (160, 120))
-        self.font = pygame.font.Font(None, 5)
-        self.largeFont = pygame.font.Font(None, 20)
+        self.layers = StageLayers(structure, self.area.size, 3, 5)
+    def state(self):
+        return self.model.show.version, self.model.depth
     def draw(self):
-        screen.blit(self.stageImage, self.offset)
-        img = self.largeFont.render(str(self.model.getID())[:2], 0, (255, 0, 0))
-        yield screen.blit(img, (self.offset[0] + 3,
-                                self.offset[1] + 3))
+        background, labels = self.layers.get()
+        yield display.screen.blit(background, self.area)
+        img = glyphs.render(str(self.model.getID())[:2], 20, (255, 0, 0))
+        display.screen.blit(img, (self.offset[0] + 3, self.offset[1] + 3))
         lights = self.model.getLights()
         for pos, radius, name in self.structure:
             pos = (self.offset[0] + pos[0] / 3,
                    self.offset[1] + pos[1] / 3)
-            rect = pygame.draw.circle(screen, (255 * lights[name] / 100,
-                                               255 * lights[name] / 100,
-                                               0),
-                                      pos, radius / 3)
-            img = self.font.render(name, 0, (255, 0, 0))
-            screen.blit(img, (pos[0] - img.get_width() / 2, pos[1]))
-            yield rect
-        yield screen.fill((100, 100, 100), pygame.Rect(self.offset, (160, 2)))
+            pygame.draw.circle(display.screen, (255 * lights[name] / 100,
+                                        255 * lights[name] / 100,
+                                        0),
+                               pos, radius / 3)
+        display.screen.blit(labels, self.area)
+        yield display.screen.fill((100, 100, 100),
+                                  pygame.Rect(self.offset, (160, 2)))
     def getName(self, pos):
         """Converts a mouse click into the corresponding light"""
         pos = tuple((pos[i] - self.offset[i]) * 3 for i in xrange(2))
@@ -371,29 +473,30 @@ class PreviewController(Controller):
     """Used to handle events relating to the preview page"""
     def __init__(self, view, show, macros, output):
         Controller.__init__(self, view, show, macros, output)
-        self.keyActions = (Action(lambda event: event.key == pygame.K_n,
-                                  lambda: show.adjustDepth(1)),
-                           Action(lambda event: event.key == pygame.K_p,
-                                  lambda: show.adjustDepth(-1)),
-                           Action(lambda event: event.key == pygame.K_PAGEUP,
-                                  show.resetDepth),
-                           Action(lambda event: event.key == pygame.K_PAGEDOWN,
-                                  show.resetDepth),
-                           Action(lambda event: event.key == pygame.K_s,
-                                  show.setNext))
-    
-font = pygame.font.Font(None, 20)
+        self.keyActions = (Action(pygame.K_n, show.adjustDepth, 1),
+                           Action(pygame.K_p, show.adjustDepth, -1),
+                           Action(pygame.K_PAGEUP, show.resetDepth),
+                           Action(pygame.K_PAGEDOWN, show.resetDepth),
+                           Action(pygame.K_s, show.setNext))
+
 
-class NoteView(object):
+class NoteView(View):
     """Used to deal with the notes of each cue"""
     def __init__(self, show, offset):
+        View.__init__(self, (offset, (160, 160)))
         self.offset = offset
         self.show = show
+    def state(self):
+        return self.show.currentPage.idno, self.show.currentPage.notes
     def draw(self):
-        yield screen.fill((100, 100, 100), pygame.Rect(self.offset, (160, 2)))
+        yield display.screen.fill((0, 0, 0), self.area)
+        yield display.screen.fill((100, 100, 100),
+                                  pygame.Rect(self.offset, (160, 2)))
         if self.show.currentPage.notes:
-            img = font.render(self.show.currentPage.notes, 0, (255, 255, 255))
-            yield screen.blit(img, (self.offset[0], self.offset[1] + 20))
+            img = glyphs.render(self.show.currentPage.notes, 20,
+                                (255, 255, 255))
+            yield display.screen.blit(img, (self.offset[0],
+                                            self.offset[1] + 20))
 
 class NoteController(object):
     """Used to deal with the notes"""
@@ -406,27 +509,308 @@ class NoteController(object):
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if all(self.offset[i] < event.pos[i] < self.offset[i] + 160
                        for i in xrange(2)):
-                    self.updating = True
-                    self.show.currentPage.notes = ''
+                    self.click(event)
                 else:
-                    self.updating = False
+                    self.release()
+            elif event.type == pygame.KEYDOWN and self.updating:
+                self.press(event)
+    def click(self, event):
+        """Starts a new note, the keyboard comes here until release. The
+        whole note is undone in one go"""
+        self.updating = True
+        self.show.history.seal()
+        self.show.setNotes('')
+    def release(self):
+        self.updating = False
+    def press(self, event):
+        if len(event.unicode) == 0:
+            return
+        if ord(event.unicode) == 8:
+            #backspace
+            self.show.setNotes(self.show.currentPage.notes[:-1])
+        else:
+            self.show.setNotes(self.show.currentPage.notes + event.unicode)
+
+
+class InstrumentView(View):
+    """The stage timings, drawn over the corner of the stage. Redrawn twice a
+    second while shown, and whenever the stage under it is"""
+    def __init__(self, instruments, under, interval=0.5):
+        View.__init__(self, (0, 24, 300, 200))
+        self.instruments = instruments
+        self.under = under
+        self.interval = interval
+        self.visible = False
+        self.lines = ()
+        self.updated = 0
+    def toggle(self):
+        self.visible = not self.visible
+        if not self.visible:
+            #Uncover the stage
+            self.under.drawnState = None
+    def state(self):
+        if not self.visible:
+            return None
+        now = pygame.time.get_ticks() / 1000.0
+        if now - self.updated >= self.interval:
+            self.updated = now
+            self.lines = tuple(self.instruments.lines())
+        return self.lines, self.under.drawnState
+    def draw(self):
+        if not self.visible:
+            return
+        yield display.screen.fill((0, 0, 0), self.area)
+        header = glyphs.render('%-16s %5s %5s %6s' % ('', 'p50', 'p95', 'max'),
+                               14, (255, 255, 0))
+        display.screen.blit(header, (self.area.left + 3, self.area.top + 3))
+        for i, line in enumerate(self.lines):
+            display.screen.blit(glyphs.render(line, 14, (255, 255, 255)),
+                        (self.area.left + 3, self.area.top + 17 + 14 * i))
+
+class InstrumentController(object):
+    """F12 shows and hides the timings"""
+    keys = [pygame.K_F12]
+    def __init__(self, view):
+        self.view = view
+    def updateEvents(self, getEvents):
+        for event in getEvents():
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F12:
+                self.press(event)
+    def press(self, event):
+        self.view.toggle()
+
+class EffectController(object):
+    """F1 to F10 start and stop the effects, in the order of the effects
+    file"""
+    keys = [pygame.K_F1, pygame.K_F2, pygame.K_F3, pygame.K_F4, pygame.K_F5,
+            pygame.K_F6, pygame.K_F7, pygame.K_F8, pygame.K_F9, pygame.K_F10]
+    def __init__(self, effects):
+        self.effects = effects
+    def updateEvents(self, getEvents):
+        for event in getEvents():
+            if event.type == pygame.KEYDOWN and event.key in self.keys:
+                self.press(event)
+    def press(self, event):
+        self.effects.toggleIndex(self.keys.index(event.key))
+
+class Dispatcher(object):
+    """Routes each event to the controllers that handle it, instead of
+    handing every event to every controller. A click goes to the controller
+    of the screen region it lands in, looked up in a grid of cells as large
+    as the regions allow. A key goes straight to the actions bound to it, in
+    tables built as the controllers are added. A region added with capture
+    takes the keyboard from a click in it until the next click elsewhere,
+    which does nothing more than end the capture"""
+    def __init__(self):
+        self.regions = []
+        self.cell = 1
+        self.grid = {}
+        #Key, or character typed, to (order added, controller, action)
+        self.keys = collections.defaultdict(list)
+        self.characters = collections.defaultdict(list)
+        self.added = 0
+        self.focus = None
+    def addRegion(self, rect, controller, capture=False):
+        """Clicks in rect go to controller.click. Where regions overlap the
+        one added first takes the click"""
+        self.regions.append((pygame.Rect(rect), controller, capture))
+        self.cell = reduce(fractions.gcd, (value for rect, _, _ in self.regions
+                                           for value in rect))
+        self.grid = {}
+        for rect, controller, capture in reversed(self.regions):
+            for x in xrange(rect.left // self.cell, rect.right // self.cell):
+                for y in xrange(rect.top // self.cell,
+                                rect.bottom // self.cell):
+                    self.grid[(x, y)] = (controller, capture)
+    def addKeys(self, controller):
+        """Binds the key actions of a Controller. Any other controller has
+        its press method bound to the keys and characters it lists.
+        Controllers added first are called first"""
+        if isinstance(controller, Controller):
+            for action in controller.keyActions:
+                table = (self.characters if isinstance(action.key, basestring)
+                         else self.keys)
+                table[action.key].append((self.added, controller, action))
+                self.added += 1
+            return
+        for key in getattr(controller, 'keys', ()):
+            self.keys[key].append((self.added, controller, None))
+        for character in getattr(controller, 'characters', ()):
+            self.characters[character].append((self.added, controller, None))
+        self.added += 1
+    def updateEvents(self, getEvents):
+        changed = set()
+        for event in getEvents():
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.click(event, changed)
             elif event.type == pygame.KEYDOWN:
-                if self.updating:
-                    if len(event.unicode) == 0:
-                        return
-                    if ord(event.unicode) == 8:
-                        #backspace
-                        self.show.currentPage.notes = self.show.currentPage.notes[:-1]
-                    else:
-                        self.show.currentPage.notes += event.unicode
+                self.press(event, changed)
+        for controller in changed:
+            controller.refreshOutput()
+    def click(self, event, changed):
+        controller, capture = self.grid.get(
+            (event.pos[0] // self.cell, event.pos[1] // self.cell),
+            (None, False))
+        if self.focus is not None and self.focus is not controller:
+            #A click away from the focus only lets go of it
+            self.focus.release()
+            self.focus = None
+            return
+        if controller is None:
+            return
+        if controller.click(event):
+            changed.add(controller)
+        if capture:
+            self.focus = controller
+    def press(self, event, changed):
+        if self.focus is not None:
+            self.focus.press(event)
+            return
+        bound = self.keys.get(event.key, ())
+        typed = self.characters.get(event.unicode, ())
+        if typed:
+            #A controller listening for both is only called once
+            bound = sorted(set(bound) | set(typed))
+        for _, controller, action in bound:
+            if action is None:
+                controller.press(event)
+            elif controller.run(action):
+                changed.add(controller)
 
+class CommandReader(object):
+    """Takes the commands of a console with no window from a file such as
+    stdin, one a line: a command name and its arguments. A thread does the
+    reading so the show never waits on it, and poll runs what has come in"""
+    def __init__(self, fil, commands, refreshOutput):
+        self.commands = commands
+        self.refreshOutput = refreshOutput
+        self.queue = Queue.Queue()
+        thread = threading.Thread(target=self._read, args=(fil,))
+        thread.daemon = True
+        thread.start()
+    def _read(self, fil):
+        for line in iter(fil.readline, ''):
+            self.queue.put(line)
+    def poll(self):
+        changed = False
+        while True:
+            try:
+                words = self.queue.get_nowait().split()
+            except Queue.Empty:
+                break
+            if not words:
+                continue
+            command = self.commands.get(words[0])
+            if command is None:
+                sys.stderr.write('Unknown command %s, try one of %s\n'
+                                 % (words[0], ' '.join(sorted(self.commands))))
+                continue
+            try:
+                command(*words[1:])
+                changed = True
+            except (KeyError, TypeError, ValueError) as error:
+                sys.stderr.write('%s: %s\n' % (words[0], error))
+        if changed:
+            self.refreshOutput()
 
-class MockOutput(object):
-    def write(self, _): pass
-    def isOpen(self): return ''
+class Renderer(object):
+    """Draws the views. In dirty mode only the views whose state changed are
+    redrawn and only their rects are pushed to the display"""
+    def __init__(self, views, dirtyRects=True):
+        self.views = views
+        self.dirtyRects = dirtyRects
+        self.divider = pygame.Rect(478, 0, 4, 480)
+    def render(self):
+        if not self.dirtyRects:
+            display.screen.fill((0, 0, 0))
+            for view in self.views:
+                view.render()
+            display.screen.fill((100, 100, 100), self.divider)
+            pygame.display.flip()
+            return [display.screen.get_rect()]
+        rects = []
+        for view in self.views:
+            if view.isDirty():
+                rects.extend(view.render())
+        if rects:
+            rects.append(display.screen.fill((100, 100, 100), self.divider))
+            pygame.display.update(rects)
+        return rects
 
 def main():
-    from sys import argv
+    import optparse
+    import scheduler
+    import fade
+    import effects
+    import timeline
+    parser = optparse.OptionParser(usage='%prog [show] [structure] [running]')
+    scheduler.addOptions(parser)
+    replay.addOptions(parser)
+    parser.add_option('--full-redraw', action='store_false', default=True,
+                      dest='dirtyRects',
+                      help='redraw and flip the whole window every frame')
+    parser.add_option('--fade-rate', type='float', default=44,
+                      dest='fadeRate',
+                      help='fade steps per second [default: %default]')
+    parser.add_option('--fade-time', type='float', default=0,
+                      dest='fadeTime',
+                      help='seconds a cue without its own transition takes '
+                      'to fade in [default: %default]')
+    parser.add_option('--no-autosave', action='store_false', default=True,
+                      dest='autosave',
+                      help='only save the show on Ctrl-S')
+    parser.add_option('--patch', default=None,
+                      help='the patch file, by default show.patch next to '
+                      'the show, or the built in patch if there is none; '
+                      'Ctrl-L reloads it')
+    parser.add_option('--undo-depth', type='int', default=100,
+                      dest='undoDepth',
+                      help='edits Ctrl-Z can take back [default: %default]')
+    parser.add_option('--port', default='COM26',
+                      help='where the universes go, a comma separated list of '
+                      'serial ports, file:name for a file or pseudo terminal, '
+                      'artnet[:host] or sacn[:host], each optionally '
+                      'starting universe= [default: %default]')
+    parser.add_option('--dmx-rate', type='float', default=44, dest='dmxRate',
+                      help='frames per second sent by the output process '
+                      '[default: %default]')
+    parser.add_option('--keep-alive', type='float', default=1.0,
+                      dest='keepAlive',
+                      help='seconds before an unchanged frame is sent again '
+                      '[default: %default]')
+    parser.add_option('--instrument', action='store_true', default=False,
+                      help='time the event handling, drawing and output, '
+                      'F12 shows the timings')
+    parser.add_option('--instrument-dump', default=None, dest='instrumentDump',
+                      help='file, or udp:host:port, the timings are written '
+                      'to as JSON lines; implies --instrument')
+    parser.add_option('--instrument-every', type='float', default=5,
+                      dest='instrumentEvery',
+                      help='seconds between dumps [default: %default]')
+    parser.add_option('--render', default=None, metavar='FILE',
+                      help='render the timed show from page 0 to FILE at the '
+                      'DMX rate and exit')
+    parser.add_option('--timeline', default=None, metavar='FILE',
+                      help='a rendered show F11 plays from the cue on stage')
+    parser.add_option('--headless', action='store_true', default=False,
+                      help='run the output with no window, taking commands '
+                      'from stdin; a --timeline starts playing at once')
+    parser.add_option('--capture', default=None, metavar='FILE',
+                      help='write the frames to FILE instead of the port, '
+                      'to compare replays')
+    parser.add_option('--max-length', type='float', default=None,
+                      dest='maxLength', metavar='SECONDS',
+                      help='cut a render short after SECONDS, with a warning')
+    parser.add_option('--hold', type='float', default=5.0,
+                      help='seconds an untimed page is held for when '
+                      'rendering [default: %default]')
+    options, argv = parser.parse_args()
+    if options.replayInput and options.headless:
+        parser.error('a replay needs the windowed console')
+    if options.replayInput:
+        #The session's edits are played back, not saved over the show
+        options.autosave = False
+    clock = replay.setUp(options)
     channelList = (('CC', 0),
                    ('CIR', 1),
                    ('CSL', 2),
@@ -452,26 +836,132 @@ def main():
                    ('FC', 22),
                    ('FIR', 23))
     try:
-        show = argv[1]
+        show = argv[0]
     except IndexError:
         show = 'noshow'
-    show = Show(show, channelList)
+    patchFile = options.patch or show + '.patch'
+    if options.patch or os.path.exists(patchFile):
+        channelList = patch.load(patchFile)
+    if options.render:
+        show = Show(show, channelList, False)
+        count, cues = timeline.render(show, options.render, options.dmxRate,
+                                      options.hold, options.fadeTime,
+                                      options.maxLength)
+        print('%d frames, %d cues, %.1f seconds' % (count, len(cues),
+                                                     count / options.dmxRate))
+        return
+    show = Show(show, channelList, options.autosave, options.undoDepth)
     
     try:
-        structure = argv[2]
+        structure = argv[1]
     except IndexError:
         structure = 'basicStructure.lst'
     try:
-        running = (argv[3].lower() != 'false')
+        running = (argv[2].lower() != 'false')
     except IndexError:
         running = True
-    port = serial.Serial('COM26') if running else MockOutput()
+    if options.capture:
+        port = MockOutput(options.capture)
+    elif running:
+        port = OutputProcess(options.port, show.patch.size,
+                             rate=options.dmxRate, keepAlive=options.keepAlive)
+    else:
+        port = MockOutput()
     structure = LightStructure(structure)
-    macros = MacroRecorder()
-    mainView = MainView(structure, show)
+    macros = MacroRecorder(show.fileName + '.macros')
     controller = MainController(structure, show, macros, port)
+    controller.setPatchFile(patchFile)
+    timings = None
+    if options.instrument or options.instrumentDump:
+        timings = instruments.Instruments()
+        #Wrapped before anything holds on to the bound methods
+        timings.wrapOutput(port)
+        timings.wrap(controller, 'refreshOutput', 'refreshOutput')
     macros.setRefreshOutput(controller.refreshOutput)
+    fades = fade.FadeEngine(show, controller.refreshOutput, options.fadeTime,
+                            clock)
+    controller.setFadeEngine(fades)
+    effectEngine = effects.EffectEngine(
+        show.patch, controller.refreshOutput, options.fadeRate,
+        effects.load(show.fileName + '.effects', structure), clock)
+    controller.setEffectEngine(effectEngine)
+    player = None
+    if options.timeline:
+        player = timeline.Player(timeline.Timeline(options.timeline),
+                                 controller.refreshOutput, show.jump, clock)
+        controller.setPlayer(player)
     controller.setRunning(running)
+    macros.addTarget('show', show)
+    macros.addTarget('main', controller)
+    if options.headless:
+        tasks = scheduler.Ticker(options.outputRate)
+        #Edits and queries over a range of cues, FIRST LAST, or every page
+        def scale(name, percent, *pages):
+            columns = show.columns()
+            print('%d levels changed' % columns.scale(
+                name, float(percent), columns.between(*pages) if pages
+                else None))
+        def above(name, level, *pages):
+            columns = show.columns()
+            print(' '.join(columns.above(name, float(level),
+                                         columns.between(*pages) if pages
+                                         else None)))
+        commands = {'go': controller.go,
+                    'back': controller.moveBack,
+                    'blackout': controller.blackout,
+                    'interrupt': controller.interrupt,
+                    'hals': controller.hals,
+                    'master': controller.setMaster,
+                    'hold': controller.hold,
+                    'release': controller.release,
+                    'find': lambda *text: controller.find(' '.join(text)),
+                    'scale': scale,
+                    'above': above,
+                    'undo': show.undo,
+                    'redo': show.redo,
+                    'save': show.save,
+                    'repatch': controller.reloadPatch,
+                    'macro': macros.play,
+                    'effect': lambda number: effectEngine.toggleIndex(
+                        int(number) - 1),
+                    'quit': tasks.stop}
+        if player:
+            commands['play'] = lambda idno=None: player.play(
+                idno or show.currentPage.idno)
+            commands['stop'] = player.stop
+            player.play(show.currentPage.idno)
+        reader = CommandReader(sys.stdin, commands, controller.refreshOutput)
+        tasks.every(options.fps, reader.poll)
+    else:
+        tasks = windowed(options, show, structure, controller, macros,
+                         effectEngine, timings, clock)
+    tasks.onOutput(controller.refreshOutput)
+    tasks.every(options.fadeRate, fades.tick)
+    tasks.every(options.fadeRate, effectEngine.tick)
+    if player:
+        tasks.every(options.dmxRate, player.tick)
+    dump = None
+    if timings:
+        tasks.every(2 * options.dmxRate, timings.poll)
+        if options.instrumentDump:
+            dump = instruments.Dump(timings, options.instrumentDump)
+            tasks.every(1.0 / options.instrumentEvery, dump)
+    try:
+        tasks.run()
+    finally:
+        if dump:
+            dump.close()
+        port.close()
+        if isinstance(port, OutputProcess):
+            sys.stderr.write('Output: %s\n' % port.report())
+        show.close()
+
+def windowed(options, show, structure, controller, macros, effectEngine,
+             timings, clock):
+    """Opens the window and sets up the views and the controllers that take
+    the keyboard and mouse, returns the scheduler that runs them"""
+    display.init()
+    mainView = MainView(structure, show, controller.stack)
     nextPageModel = PreviewModel(show,
                                  lambda currentPage : currentPage.links['next'])
     nextPageView = PreView(nextPageModel, structure, (480, 0))
@@ -481,23 +971,41 @@ def main():
     interruptPageView = PreView(interruptPageModel, structure, (480, 160))
     interruptController = Controller(interruptPageView, interruptPageModel,
                                      macros, MockOutput())
+    macros.addTarget('next', nextPageModel)
+    macros.addTarget('interrupt', interruptPageModel)
     noteView = NoteView(show, (480, 320))
     noteController = NoteController(show, (480, 320))
     wrapper = EventWrapper()
-    #Keep the main controller after the preview controllers.
-    #Keep the note controller last
+    dispatcher = Dispatcher()
+    for view, each in ((nextPageView, nextPageController),
+                       (interruptPageView, interruptController),
+                       (mainView, controller)):
+        dispatcher.addRegion(view.area, each)
+    #The note controller has the keyboard while a note is typed
+    dispatcher.addRegion(noteView.area, noteController, capture=True)
+    #Keep the main controller after the preview controllers
     controllers = [nextPageController, interruptController, controller,
-                   macros, noteController]
+                   macros, EffectController(effectEngine)]
     views = [mainView, nextPageView, interruptPageView, noteView]
-    while wrapper.keepRunning:
-        wrapper.refreshEvents()
-        for controller in [noteController] if noteController.updating else controllers:
-            controller.updateEvents(wrapper.getEvents)
-        screen.fill((0, 0, 0))
-        for view in views:
-            list(view.draw())
-        screen.fill((100, 100, 100), pygame.Rect(478, 0, 4, 480))
-        pygame.display.flip()
+    if timings:
+        instrumentView = InstrumentView(timings, mainView)
+        controllers.append(InstrumentController(instrumentView))
+        timings.wrapEvents(wrapper)
+        timings.wrap(dispatcher, 'updateEvents', 'input')
+        for name, view in zip(('stage', 'next', 'interrupt', 'notes'), views):
+            timings.wrap(view, 'render', 'draw ' + name)
+        views.append(instrumentView)
+    renderer = Renderer(views, options.dirtyRects)
+    if timings:
+        timings.wrap(renderer, 'render', 'frame')
+    for each in controllers:
+        dispatcher.addKeys(each)
+    def handleInput():
+        dispatcher.updateEvents(wrapper.getEvents)
+    tasks = replay.makeScheduler(options, wrapper, clock)
+    tasks.onInput(handleInput)
+    tasks.onRender(renderer.render)
+    return tasks
 
 if __name__ == '__main__':
     stackless.tasklet(main)()
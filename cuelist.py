@@ -0,0 +1,162 @@
+"""Keeps the order of the linked pages of a show in an implicit treap, so
+finding a page's position, the page n steps away, inserting and deleting
+are all O(log n)"""
+
+import json
+import random
+
+SPECIAL = ('blackout', 'hals', 'interrupt')
+
+class Node(object):
+    __slots__ = ('idno', 'priority', 'size', 'left', 'right', 'parent')
+    def __init__(self, idno):
+        self.idno = idno
+        self.priority = random.random()
+        self.size = 1
+        self.left = self.right = self.parent = None
+
+def _size(node):
+    return node.size if node else 0
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    for child in (node.left, node.right):
+        if child:
+            child.parent = node
+    return node
+
+def _merge(left, right):
+    if not left or not right:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+def _split(node, count):
+    """Splits into the first count nodes and the rest"""
+    if not node:
+        return None, None
+    if _size(node.left) >= count:
+        left, node.left = _split(node.left, count)
+        if left:
+            left.parent = None
+        return left, _update(node)
+    node.right, right = _split(node.right, count - _size(node.left) - 1)
+    if right:
+        right.parent = None
+    return _update(node), right
+
+class CueList(object):
+    """The pages reachable from start through their 'next' links, in order"""
+    def __init__(self, pages=None, start='0'):
+        self.root = None
+        self.nodes = {}
+        if pages is not None:
+            for idno in walk(pages, start):
+                self.insert(len(self), idno)
+    def __len__(self):
+        return _size(self.root)
+    def __contains__(self, idno):
+        return idno in self.nodes
+    def __iter__(self):
+        stack = []
+        node = self.root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.idno
+            node = node.right
+    def _setRoot(self, root):
+        self.root = root
+        if root:
+            root.parent = None
+    def insert(self, position, idno):
+        node = Node(idno)
+        self.nodes[idno] = node
+        left, right = _split(self.root, position)
+        self._setRoot(_merge(_merge(left, node), right))
+    def insertAfter(self, previous, idno):
+        self.insert(self.index(previous) + 1, idno)
+    def remove(self, idno):
+        position = self.index(idno)
+        left, rest = _split(self.root, position)
+        _, right = _split(rest, 1)
+        del self.nodes[idno]
+        self._setRoot(_merge(left, right))
+    def index(self, idno):
+        """The position of the page idno"""
+        node = self.nodes[idno]
+        position = _size(node.left)
+        while node.parent:
+            if node is node.parent.right:
+                position += _size(node.parent.left) + 1
+            node = node.parent
+        return position
+    def at(self, position):
+        node = self.root
+        while node:
+            leftSize = _size(node.left)
+            if position < leftSize:
+                node = node.left
+            elif position == leftSize:
+                return node.idno
+            else:
+                position -= leftSize + 1
+                node = node.right
+        raise IndexError(position)
+    def offset(self, idno, steps):
+        """The page steps pages after idno, stopping at either end"""
+        position = self.index(idno) + steps
+        return self.at(max(0, min(len(self) - 1, position)))
+
+def _linksOf(pages, idno):
+    page = pages[idno]
+    return page['links'] if isinstance(page, dict) else page.links
+
+def walk(pages, start='0'):
+    """Yields the pages from start along their 'next' links, stopping at the
+    end, at a missing page or where the chain loops back on itself"""
+    seen = set()
+    idno = start
+    while idno in pages and idno not in seen:
+        seen.add(idno)
+        yield idno
+        idno = _linksOf(pages, idno).get('next', -1)
+
+def check(pages, start='0', special=SPECIAL):
+    """Returns the problems in the links of a show: links to pages that do not
+    exist, a 'next' chain that loops, and pages nothing leads to"""
+    problems = []
+    reachable = set()
+    for idno in pages:
+        for kind, target in _linksOf(pages, idno).iteritems():
+            if target != -1 and target not in pages:
+                problems.append('%s: %s link to missing page %s'
+                                % (idno, kind, target))
+            elif kind in ('next', 'timeout'):
+                reachable.add(target)
+    chain = list(walk(pages, start))
+    if chain:
+        last = _linksOf(pages, chain[-1]).get('next', -1)
+        if last in pages:
+            problems.append('%s: next link loops back to %s'
+                            % (chain[-1], last))
+    reachable.update(chain)
+    for idno in pages:
+        if idno not in reachable and idno not in special:
+            problems.append('%s: orphan page' % idno)
+    return problems
+
+def main(fileName):
+    with open(fileName) as fil:
+        pages = dict((page['idno'], page) for page in json.loads(fil.read()))
+    for problem in check(pages):
+        print(problem)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1])
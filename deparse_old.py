@@ -15,16 +15,19 @@ def readLights(fileName):
                 except ValueError:
                     names = values
 
+def writeCLT(fil, pages):
+    for num, lights in pages:
+        if num == 0:
+            continue
+        fil.write('Page %s\n'%(num))
+        for name, value in lights:
+            if value is not 0:
+                fil.write('%s: %s\n'%(name, value))
+        fil.write('\n')
+
 def makeCLT(fileName, pages):
     with open(fileName + '.clt', 'w') as fil:
-        for num, lights in pages:
-            if num == 0:
-                continue
-            fil.write('Page %s\n'%(num))
-            for name, value in lights:
-                if value is not 0:
-                    fil.write('%s: %s\n'%(name, value))
-            fil.write('\n')
+        writeCLT(fil, pages)
 
 def main(fileName):
     makeCLT(fileName, readLights(fileName))
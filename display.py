@@ -0,0 +1,17 @@
+"""The console window. It is opened when something first needs it rather
+than when a module is imported, and only once however many modules draw on
+it. Everything drawn goes to display.screen"""
+
+import pygame
+
+SIZE = (640, 480)
+
+screen = None
+
+def init(size=SIZE):
+    """Starts pygame and opens the window, if that was not done already"""
+    global screen
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode(size)
+    return screen
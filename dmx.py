@@ -0,0 +1,178 @@
+"""Packs the output frame into DMX packets for several universes at once. A
+frame is the 0-255 levels of every channel, universe after universe, 512
+channels each. Every universe is packed straight into a packet buffer that
+is allocated once, and only universes whose channels changed are sent.
+
+A port list names where each universe goes, separated by commas:
+
+    COM26                       an Enttec DMX USB Pro on a serial port
+    file:name                   the Enttec packets written to a file or pty
+    artnet[:host[:port]]        Art-Net, broadcast unless a host is given
+    sacn[:host[:port]]          sACN (E1.31), to the universe's multicast
+                                group unless a host is given
+
+Each entry may start with the universe it sends, as in 0=COM26,1=artnet.
+Without one the entries take universes 0, 1, 2... in turn."""
+
+import socket
+import struct
+import uuid
+
+from output import openPort
+
+UNIVERSE = 512
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+
+class Packet(object):
+    """A preallocated packet. data is a view of the channel levels inside
+    it, slots long"""
+    def __init__(self, universe, header, slots, size, footer=''):
+        self.universe = universe
+        self.slots = slots
+        self.buffer = bytearray(header) + bytearray(size) + bytearray(footer)
+        self.data = memoryview(self.buffer)[len(header):len(header) + slots]
+        self.lastSend = None
+    def prepare(self):
+        """Called just before the packet goes out"""
+        pass
+
+class EnttecPacket(Packet):
+    """Output Only Send DMX Packet of the Enttec DMX USB Pro"""
+    def __init__(self, universe, slots, port):
+        #Label 6, then the length of the start code and levels
+        Packet.__init__(self, universe,
+                        bytearray([126, 6]) + struct.pack('<H', slots + 1) +
+                        '\0', slots, slots, bytearray([231]))
+        self.port = port
+    def send(self):
+        self.port.write(self.buffer)
+    def close(self):
+        self.port.close()
+
+class UDPPacket(Packet):
+    def __init__(self, universe, header, slots, address, sock):
+        Packet.__init__(self, universe, header, slots, UNIVERSE)
+        self.address = address
+        self.socket = sock
+        self.sequence = 0
+    def send(self):
+        self.prepare()
+        try:
+            self.socket.sendto(self.buffer, self.address)
+        except socket.error:
+            #A missing route must not stop the other universes
+            pass
+    def close(self):
+        pass
+
+class ArtNetPacket(UDPPacket):
+    """An ArtDmx packet, the universe is the 15 bit port address"""
+    def __init__(self, universe, slots, address, sock):
+        header = ('Art-Net\0' + struct.pack('<H', 0x5000) +
+                  struct.pack('>HBB', 14, 0, 0) +
+                  #SubUni then Net, the port address low byte first
+                  struct.pack('<H', universe) + struct.pack('>H', UNIVERSE))
+        UDPPacket.__init__(self, universe, header, slots, address, sock)
+    def prepare(self):
+        #Sequence 0 turns reordering off, so it counts 1 to 255
+        self.sequence = self.sequence % 255 + 1
+        self.buffer[12] = self.sequence
+
+class SACNPacket(UDPPacket):
+    """An E1.31 data packet. sACN counts universes from 1, so universe 0 of
+    the frame is sent as sACN universe 1"""
+    def __init__(self, universe, slots, address, sock, cid,
+                 sourceName='Lights Controller', priority=100):
+        number = universe + 1
+        length = 126 + UNIVERSE
+        header = (struct.pack('>HH12s', 16, 0, 'ASC-E1.17') +
+                  struct.pack('>HI16s', 0x7000 | (length - 16), 4, cid) +
+                  struct.pack('>HI64sBHBBH', 0x7000 | (length - 38), 2,
+                              sourceName, priority, 0, 0, 0, number) +
+                  struct.pack('>HBBHHH', 0x7000 | (length - 115), 2, 0xa1,
+                              0, 1, UNIVERSE + 1) +
+                  '\0')
+        UDPPacket.__init__(self, universe, header, slots, address, sock)
+    def prepare(self):
+        self.sequence = (self.sequence + 1) % 256
+        self.buffer[111] = self.sequence
+
+def multicastGroup(universe):
+    """The sACN multicast address of universe 0 of the frame"""
+    number = universe + 1
+    return '239.255.%d.%d' % (number >> 8, number & 255)
+
+def parsePorts(ports):
+    """Splits a port list into (universe, spec) pairs"""
+    entries = []
+    for i, entry in enumerate(ports.split(',')):
+        universe, _, spec = entry.rpartition('=')
+        entries.append((int(universe) if universe else i, spec))
+    return entries
+
+def _hostAndPort(spec, defaultPort):
+    parts = spec.split(':')[1:]
+    host = parts[0] if parts and parts[0] else None
+    port = int(parts[1]) if len(parts) > 1 else defaultPort
+    return host, port
+
+class Sender(object):
+    """Sends the universes of a frame to their ports. A universe is sent when
+    its levels change, or when keepAlive seconds have passed since it was
+    last sent"""
+    def __init__(self, ports, size, keepAlive=1.0):
+        self.keepAlive = keepAlive
+        self.socket = None
+        self.cid = uuid.uuid4().bytes
+        self.packets = []
+        for universe, spec in parsePorts(ports):
+            start = universe * UNIVERSE
+            slots = min(UNIVERSE, size - start)
+            if slots <= 0:
+                raise ValueError('Universe %d is past the end of a %d channel '
+                                 'frame' % (universe, size))
+            self.packets.append(self._packet(universe, slots, spec))
+    def _socket(self):
+        if self.socket is None:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                                   4)
+        return self.socket
+    def _packet(self, universe, slots, spec):
+        if spec.startswith('artnet'):
+            host, port = _hostAndPort(spec, ARTNET_PORT)
+            return ArtNetPacket(universe, slots,
+                                (host or '255.255.255.255', port),
+                                self._socket())
+        elif spec.startswith('sacn'):
+            host, port = _hostAndPort(spec, SACN_PORT)
+            return SACNPacket(universe, slots,
+                              (host or multicastGroup(universe), port),
+                              self._socket(), self.cid)
+        return EnttecPacket(universe, slots, openPort(spec or None))
+    def send(self, frame, now):
+        """Sends the universes of frame that need it, returns how many were
+        sent"""
+        view = memoryview(frame)
+        sent = 0
+        for packet in self.packets:
+            start = packet.universe * UNIVERSE
+            levels = view[start:start + packet.slots]
+            if len(levels) < packet.slots:
+                #A short frame leaves the rest of the universe dark
+                levels = memoryview(bytearray(levels.tobytes()) +
+                                    bytearray(packet.slots - len(levels)))
+            if (packet.data != levels or packet.lastSend is None or
+                now - packet.lastSend >= self.keepAlive):
+                packet.data[:] = levels
+                packet.send()
+                packet.lastSend = now
+                sent += 1
+        return sent
+    def close(self):
+        for packet in self.packets:
+            packet.close()
+        if self.socket:
+            self.socket.close()
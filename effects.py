@@ -0,0 +1,182 @@
+"""Looping effects laid over the cues: chases, dimmer waves and step loops.
+Every effect is rendered once, when it is loaded, into a table of output
+frames covering one period at the tick rate. Running an effect is then only
+picking the frame for the current moment, and a tick merges the cue frame
+with every running effect in one map(max, ...) pass, highest takes
+precedence.
+
+Effects are kept next to the show, in show.effects, as a JSON list:
+
+    [{"name": "sweep", "kind": "sine", "group": "x", "period": 4},
+     {"name": "chase", "kind": "chase", "fixtures": ["FC", "FIL", "FIR"],
+      "period": 1.5, "width": 1},
+     {"name": "flash", "kind": "steps", "period": 2,
+      "steps": [{"FC": 100}, {"BC": 100}, {}]}]
+
+kind is chase, sine, ramp or steps. The fixtures are listed, or taken from
+the structure with "group": "x" (left to right) or "y" (back to front)."""
+
+import json
+import math
+import time
+
+class Effect(object):
+    """A looping effect over a group of fixtures. level(i, phase) gives
+    the 0-100 level of the i-th fixture at phase 0-1 of the period"""
+    def __init__(self, name, fixtures, period=2.0, low=0, high=100,
+                 spread=1.0):
+        self.name = name
+        self.fixtures = list(fixtures)
+        self.period = period
+        self.low = low
+        self.high = high
+        #How much of a period the wave is spread over the group
+        self.spread = spread
+    def offset(self, i):
+        return self.spread * i / max(1, len(self.fixtures))
+    def level(self, i, phase):
+        return self.low
+    def table(self, channels, size, rate, curves=None):
+        """The output frames of one period, rate frames a second. channels
+        maps a fixture name to its output channels, and curves, if given,
+        holds the lookup table of the dimmer curve of each channel"""
+        count = max(1, int(round(self.period * rate)))
+        frames = []
+        for tick in xrange(count):
+            frame = bytearray(size)
+            phase = float(tick) / count
+            for i, name in enumerate(self.fixtures):
+                level = self.level(i, phase)
+                value = min(255, int(level * 255 / 100))
+                index = min(255, max(0, int(level + 0.5)))
+                for channel in channels.get(name, ()):
+                    frame[channel] = (curves[channel][index] if curves
+                                      else value)
+            frames.append(frame)
+        return frames
+
+class Chase(Effect):
+    """width fixtures at a time step along the group"""
+    def __init__(self, name, fixtures, period=2.0, low=0, high=100,
+                 spread=1.0, width=1):
+        Effect.__init__(self, name, fixtures, period, low, high, spread)
+        self.width = width
+    def level(self, i, phase):
+        step = int(phase * len(self.fixtures))
+        lit = (step - i) % len(self.fixtures) < self.width
+        return self.high if lit else self.low
+
+class Sine(Effect):
+    def level(self, i, phase):
+        wave = 0.5 + 0.5 * math.sin(2 * math.pi * (phase - self.offset(i)))
+        return self.low + (self.high - self.low) * wave
+
+class Ramp(Effect):
+    """A sawtooth, each fixture fading up then dropping"""
+    def level(self, i, phase):
+        return self.low + (self.high - self.low) * ((phase - self.offset(i))
+                                                     % 1.0)
+
+class Steps(Effect):
+    """Loops through a list of looks, each a name to level mapping"""
+    def __init__(self, name, steps, period=2.0):
+        fixtures = sorted(set(name for step in steps for name in step))
+        Effect.__init__(self, name, fixtures, period)
+        self.steps = steps
+    def level(self, i, phase):
+        step = self.steps[int(phase * len(self.steps)) % len(self.steps)]
+        return step.get(self.fixtures[i], 0)
+
+KINDS = {'chase': Chase, 'sine': Sine, 'ramp': Ramp}
+
+def fromDict(spec, structure=None):
+    """Builds an effect from its entry in an effects file"""
+    spec = dict((str(key), value) for key, value in spec.iteritems())
+    kind = spec.pop('kind')
+    name = spec.pop('name')
+    if kind == 'steps':
+        return Steps(name, [dict((str(key), value)
+                                 for key, value in step.iteritems())
+                            for step in spec['steps']],
+                     spec.get('period', 2.0))
+    group = spec.pop('group', None)
+    if group is not None:
+        fixtures = structure.group('xy'.index(group))
+    else:
+        fixtures = [str(fixture) for fixture in spec.pop('fixtures')]
+    return KINDS[kind](name, fixtures, **spec)
+
+def load(fileName, structure=None):
+    """The effects in fileName, none if there is no such file"""
+    try:
+        fil = open(fileName)
+    except IOError:
+        return []
+    with fil:
+        return [fromDict(spec, structure) for spec in json.loads(fil.read())]
+
+class EffectEngine(object):
+    """Runs effects over the output frames of a patch. start and stop work
+    by effect name, and tick pushes a frame out while any are running"""
+    def __init__(self, patch, refreshOutput, rate=44, effects=(),
+                 clock=time.time):
+        self.refreshOutput = refreshOutput
+        self.rate = rate
+        self.clock = clock
+        self.effects = []
+        self.tables = {}
+        #Effect name to start time
+        self.running = {}
+        self.setPatch(patch)
+        for effect in effects:
+            self.add(effect)
+    def setPatch(self, patch):
+        """Renders the effects again for a new patch"""
+        self.patch = patch
+        self.channels = patch.channels()
+        #Linear channels keep the full 0-255 resolution of the waves
+        self.curves = None if patch.isLinear() else patch.channelTables()
+        for effect in self.effects:
+            self._render(effect)
+    def add(self, effect):
+        self.effects.append(effect)
+        self._render(effect)
+    def _render(self, effect):
+        self.tables[effect.name] = effect.table(self.channels, self.patch.size,
+                                                self.rate, self.curves)
+    def start(self, name):
+        self.running[name] = self.clock()
+    def stop(self, name):
+        self.running.pop(name, None)
+        #The cue levels go back out as soon as the effect stops
+        self.refreshOutput()
+    def toggle(self, name):
+        if name in self.running:
+            self.stop(name)
+        else:
+            self.start(name)
+    def toggleIndex(self, i):
+        if i < len(self.effects):
+            self.toggle(self.effects[i].name)
+    def frame(self, now=None):
+        """The running effects merged highest takes precedence, None when
+        none are running"""
+        if not self.running:
+            return None
+        now = self.clock() if now is None else now
+        layers = []
+        for name, start in self.running.iteritems():
+            table = self.tables[name]
+            layers.append(table[int((now - start) * self.rate) % len(table)])
+        if len(layers) == 1:
+            return layers[0]
+        return bytearray(map(max, *layers))
+    def apply(self, frame, now=None):
+        """Merges the running effects into frame, highest takes precedence"""
+        layer = self.frame(now)
+        if layer is None:
+            return frame
+        return bytearray(map(max, frame, layer))
+    def tick(self):
+        if self.running:
+            self.refreshOutput()
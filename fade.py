@@ -0,0 +1,95 @@
+"""Crossfades between cues in real time"""
+
+import time
+
+class Fade(object):
+    """A crossfade between two output frames. The levels are precomputed as
+    arrays over the channels that change, so a step is one pass over them"""
+    def __init__(self, start, end, duration):
+        self.slots = [i for i in xrange(len(end)) if start[i] != end[i]]
+        self.start = [start[i] for i in self.slots]
+        self.delta = [end[i] - start[i] for i in self.slots]
+        self.duration = duration
+        self.elapsed = 0.0
+    def progress(self):
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, self.elapsed / self.duration)
+    def advance(self, time):
+        """Moves the fade on, returns True once it has finished"""
+        self.elapsed += time
+        return self.elapsed >= self.duration
+    def apply(self, frame):
+        """Writes the fade's current levels into frame"""
+        t = self.progress()
+        for slot, value in zip(self.slots,
+                               [s + d * t for s, d in
+                                zip(self.start, self.delta)]):
+            frame[slot] = value
+
+class FadeEngine(object):
+    """Runs the fades on a fixed clock and pushes every frame to the output.
+    The show's transition follows the most recent fade, so the views show
+    the crossfade as well"""
+    def __init__(self, show, refreshOutput, defaultTime=0, clock=time.time):
+        self.show = show
+        self.refreshOutput = refreshOutput
+        self.defaultTime = defaultTime
+        self.clock = clock
+        self.fades = []
+        self.frame = list(show.makeList())
+        self.lastTick = None
+    def frameNow(self):
+        """The frame that should be on stage right now"""
+        if self.fades and self.show.fadeTarget is not None:
+            return self.frame
+        return self.show.makeList()
+    def go(self, idno=None):
+        """Fades to the page idno, by default the next page. A fade that is
+        still running is cut short, and the new one starts from the levels
+        on stage"""
+        start = list(self.frameNow())
+        if self.show.fadeTarget is not None:
+            self.show.finishFade()
+        if idno is None:
+            idno = self.show.currentPage.links['next']
+        if idno not in self.show.pages:
+            self.show.moveForward()
+            self.refreshOutput()
+            return
+        page = self.show.pages[idno]
+        duration = (page.transition if page.transition is not None
+                    else self.defaultTime)
+        if duration <= 0:
+            self.fades = []
+            self.show.startFade(idno)
+            self.show.finishFade()
+            self.refreshOutput()
+            return
+        #The new fade covers every channel, older ones would pull against it
+        self.fades = [Fade(start, self.show.makeList(page), duration)]
+        self.frame = start
+        self.show.startFade(idno)
+        self.lastTick = None
+    def tick(self, now=None):
+        """Advances the fades and the timed pages by the time since the last
+        tick, and writes the frame if anything moved"""
+        now = self.clock() if now is None else now
+        elapsed = 0 if self.lastTick is None else now - self.lastTick
+        self.lastTick = now
+        if self.show.fadeTarget is None:
+            #A jump or an undo put a page on stage in the middle of a fade
+            self.fades = []
+            timeout = self.show.currentPage.updateTime(elapsed)
+            if timeout is not None and timeout != self.show.currentPage.idno:
+                self.go(timeout)
+            return
+        finished = [fade.advance(elapsed) for fade in self.fades]
+        for fade in self.fades:
+            fade.apply(self.frame)
+        self.show.setTransition(self.fades[-1].progress())
+        self.fades = [fade for fade, done in zip(self.fades, finished)
+                      if not done]
+        if not self.fades:
+            self.show.finishFade()
+        self.refreshOutput()
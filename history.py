@@ -0,0 +1,97 @@
+"""Undo and redo for the show. An edit keeps only what it is about to
+change: the old level of each light it sets, the old links or notes of each
+page it touches and the ids of the pages it adds. These are kept as journal
+records, so undoing an edit is replaying them, and the records that redo it
+are taken from the pages as they are put back."""
+
+import collections
+import functools
+
+class Step(object):
+    """The records that put the pages back as they were before one edit.
+    before and after are the pages on stage either side of it"""
+    __slots__ = ('records', 'seen', 'before', 'after', 'key')
+    def __init__(self, before):
+        self.records = []
+        self.seen = set()
+        self.before = before
+        self.after = before
+        #Steps with the same key run together, like the letters of a note
+        self.key = None
+
+class History(object):
+    """The undo and redo stacks, depth edits deep"""
+    def __init__(self, depth=100):
+        self.undoSteps = collections.deque(maxlen=depth)
+        self.redoSteps = []
+        self.step = None
+        self.nesting = 0
+        #The step the next one may run into
+        self.last = None
+    def begin(self, idno):
+        """Starts an edit made with the page idno on stage. Edits made
+        inside it become part of it"""
+        if not self.nesting:
+            self.step = Step(idno)
+        self.nesting += 1
+    def end(self, idno):
+        self.nesting -= 1
+        if self.nesting:
+            return
+        step, self.step = self.step, None
+        step.after = idno
+        if not step.records:
+            return
+        if (step.key is not None and self.last is not None and
+            self.last.key == step.key):
+            #The step already holds what was there first
+            self.last.after = idno
+            return
+        self.undoSteps.append(step)
+        del self.redoSteps[:]
+        self.last = step if step.key is not None else None
+    def seal(self):
+        """Stops the next edit running into the last one"""
+        self.last = None
+    def runTogether(self, key):
+        """Lets the edit being made run into the last one if it has the same
+        key"""
+        if self.step is not None:
+            self.step.key = key
+    def _keep(self, key, record):
+        step = self.step
+        if step is None or key in step.seen:
+            return
+        if key[0] != 'p' and ('p', key[1]) in step.seen:
+            #A page added in this step goes as a whole
+            return
+        step.seen.add(key)
+        step.records.append(record)
+    def level(self, page, name):
+        """Called before the level of name on page is set"""
+        self._keep(('l', page.idno, name),
+                   ('l', page.idno, name, page.lights.get(name)))
+    def links(self, page):
+        """Called before the links of page are changed"""
+        self._keep(('k', page.idno), ('k', page.idno, dict(page.links)))
+    def notes(self, page):
+        """Called before the notes of page are changed"""
+        self._keep(('n', page.idno), ('n', page.idno, page.notes))
+    def added(self, idno):
+        """Called when the page idno is added"""
+        self._keep(('p', idno), ('d', idno))
+    def canUndo(self):
+        return bool(self.undoSteps)
+    def canRedo(self):
+        return bool(self.redoSteps)
+
+def edit(method):
+    """Makes a method of the show one undoable edit"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self.history.begin(self.currentPage.idno)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.history.end(self.currentPage.idno)
+    return wrapper
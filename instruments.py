@@ -0,0 +1,188 @@
+"""Optional timing of the console's stages. Nothing in here is called unless
+the console is started with instrumentation on: the stages are timed by
+wrapping the methods of the objects involved when they are wired together,
+so a console without it runs exactly the code it always has.
+
+Each stage keeps its last samples in a ring buffer and all of them in a
+histogram. Input to output latency is taken from the moment an input event
+leaves the queue to the moment its frame is handed to the output, and, when
+the output process reports it, to the moment that frame was written to the
+port."""
+
+import array
+import bisect
+import collections
+import functools
+import json
+import socket
+import time
+
+#Histogram bucket edges in milliseconds
+BUCKETS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+class Ring(object):
+    """The last size samples, in a preallocated array"""
+    def __init__(self, size=1024):
+        self.samples = array.array('d', [0.0]) * size
+        self.size = size
+        self.count = 0
+    def add(self, value):
+        self.samples[self.count % self.size] = value
+        self.count += 1
+    def values(self):
+        return self.samples[:min(self.count, self.size)]
+
+class Histogram(object):
+    """Counts of samples, in milliseconds, falling between the BUCKETS edges.
+    The last bucket takes everything over the last edge"""
+    def __init__(self, edges=BUCKETS):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+    def add(self, milliseconds):
+        self.counts[bisect.bisect_left(self.edges, milliseconds)] += 1
+    def labels(self):
+        return (['<%g' % edge for edge in self.edges] +
+                ['>%g' % self.edges[-1]])
+
+class Stage(object):
+    """The timings of one stage, in seconds"""
+    def __init__(self, name, size=1024):
+        self.name = name
+        self.ring = Ring(size)
+        self.histogram = Histogram()
+        self.total = 0.0
+        self.worst = 0.0
+    def add(self, seconds):
+        self.ring.add(seconds)
+        self.histogram.add(seconds * 1000)
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+    def summary(self):
+        """The count, mean and worst of every sample, and percentiles of the
+        recent ones, in milliseconds"""
+        recent = sorted(self.ring.values())
+        percentile = lambda p: (recent[min(len(recent) - 1,
+                                           int(p * len(recent)))] * 1000
+                                if recent else 0.0)
+        count = self.ring.count
+        return {'count': count,
+                'mean': self.total / count * 1000 if count else 0.0,
+                'p50': percentile(0.5),
+                'p95': percentile(0.95),
+                'p99': percentile(0.99),
+                'max': self.worst * 1000,
+                'histogram': collections.OrderedDict(zip(
+                    self.histogram.labels(),
+                    self.histogram.counts))}
+
+class Instruments(object):
+    """The stages of the console, and the latency from input to output"""
+    def __init__(self, size=1024, clock=time.time):
+        self.size = size
+        self.clock = clock
+        self.stages = collections.OrderedDict()
+        #When the input not yet seen in the output arrived
+        self.inputTime = None
+        #(output sequence, input time) pairs waiting to reach the wire
+        self.pending = collections.deque()
+        self.port = None
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = Stage(name, self.size)
+        return self.stages[name]
+    def timed(self, name, function):
+        """Returns function, timed as the stage name"""
+        stage = self.stage(name)
+        clock = self.clock
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage.add(clock() - start)
+        return timedFunction
+    def wrap(self, obj, methodName, name):
+        """Times obj.methodName from now on, as the stage name"""
+        setattr(obj, methodName, self.timed(name, getattr(obj, methodName)))
+    def wrapEvents(self, wrapper):
+        """Times the sorting of the event queue and notes when input
+        arrives"""
+        import pygame
+        #Events a person caused, as opposed to timers and window events
+        inputTypes = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN)
+        sortEvents = self.timed('events', wrapper.sortEvents)
+        def noteInput(events, *args):
+            if self.inputTime is None and any(event.type in inputTypes
+                                              for event in events):
+                self.inputTime = self.clock()
+            return sortEvents(events, *args)
+        wrapper.sortEvents = noteInput
+    def wrapOutput(self, port):
+        """Times port.write, and takes the input latency when a frame is
+        handed over after an input"""
+        write = self.timed('write', port.write)
+        handoff = self.stage('input to write')
+        def noteOutput(data):
+            write(data)
+            if self.inputTime is not None:
+                handoff.add(self.clock() - self.inputTime)
+                if hasattr(port, 'lastSent'):
+                    self.pending.append((port.sequence.value, self.inputTime))
+                self.inputTime = None
+        port.write = noteOutput
+        self.port = port
+    def poll(self):
+        """Takes the input to wire latency of the frames the output process
+        has sent since the last poll"""
+        if not self.pending:
+            return
+        sequence, sentTime = self.port.lastSent()
+        wire = self.stage('input to wire')
+        while self.pending and self.pending[0][0] <= sequence:
+            wire.add(sentTime - self.pending.popleft()[1])
+    def summary(self):
+        return collections.OrderedDict((name, stage.summary())
+                                       for name, stage
+                                       in self.stages.iteritems())
+    def lines(self):
+        """A line of text per stage, for the overlay"""
+        lines = ['%-16s %5.1f %5.1f %6.1f ms' % (name, summary['p50'],
+                                                 summary['p95'], summary['max'])
+                 for name, summary in self.summary().iteritems()]
+        if hasattr(self.port, 'report'):
+            lines.append('output ' + self.port.report())
+        return lines
+
+class Dump(object):
+    """Writes the summary as a line of JSON to a file, or sends it to a UDP
+    socket given as udp:host:port"""
+    def __init__(self, instruments, target):
+        self.instruments = instruments
+        if target.startswith('udp:'):
+            host, port = target[len('udp:'):].rsplit(':', 1)
+            self.address = (host, int(port))
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.fil = None
+        else:
+            self.fil = open(target, 'a')
+            self.socket = None
+    def __call__(self):
+        record = {'time': time.time(), 'stages': self.instruments.summary()}
+        if hasattr(self.instruments.port, 'stats'):
+            record['output'] = self.instruments.port.stats()
+        line = json.dumps(record)
+        if self.fil:
+            self.fil.write(line + '\n')
+            self.fil.flush()
+        else:
+            try:
+                self.socket.sendto(line, self.address)
+            except socket.error:
+                #Nobody listening is no reason to stop the show
+                pass
+    def close(self):
+        if self.fil:
+            self.fil.close()
+        else:
+            self.socket.close()
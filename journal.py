@@ -0,0 +1,120 @@
+"""Autosaves a show by appending every edit to a journal next to the show
+file. A background thread does the writing and every so often folds the
+journal back into the show file"""
+
+import copy
+import json
+import os
+import Queue
+import threading
+
+CHECKPOINT = 'checkpoint'
+
+def applyRecord(pages, record):
+    """Applies one journal record to a dictionary of page dictionaries.
+    Records set state rather than change it, so replaying one twice is
+    harmless"""
+    kind = record[0]
+    if kind == 'l':
+        _, idno, name, value = record
+        if value is None:
+            #Undone back to unset
+            pages[idno]['lights'].pop(name, None)
+        else:
+            pages[idno]['lights'][name] = value
+    elif kind == 'k':
+        _, idno, links = record
+        pages[idno]['links'] = links
+    elif kind == 'n':
+        _, idno, notes = record
+        pages[idno]['notes'] = notes
+    elif kind == 'p':
+        pages[record[1]['idno']] = record[1]
+    elif kind == 'd':
+        pages.pop(record[1], None)
+    else:
+        raise ValueError('Unknown journal record %r' % (record,))
+
+def replay(pages, logName, apply=applyRecord):
+    """Applies the journal logName, if there is one, to pages. A record cut
+    short by a crash ends the replay"""
+    try:
+        fil = open(logName)
+    except IOError:
+        return pages
+    with fil:
+        for line in fil:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            apply(pages, record)
+    return pages
+
+def writeShow(fileName, pages):
+    """Writes the pages to fileName through a temporary file, so the show is
+    never left half written"""
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w') as fil:
+        fil.write(json.dumps(pages.values(), indent=1))
+        fil.flush()
+        os.fsync(fil.fileno())
+    if os.name == 'nt' and os.path.exists(fileName):
+        os.remove(fileName)
+    os.rename(tempName, fileName)
+
+class Journal(object):
+    """Appends the edits to fileName.journal. The writer thread keeps its own
+    copy of the pages so compacting never touches the show being edited.
+    Records must not share anything mutable with the show. Without pages,
+    the owner saves the show itself and a checkpoint only empties the
+    journal"""
+    def __init__(self, fileName, pages=None, compactEvery=500):
+        self.fileName = fileName
+        self.logName = fileName + '.journal'
+        self.compactEvery = compactEvery
+        self.pages = copy.deepcopy(pages)
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+    def append(self, *records):
+        self.queue.put(records)
+    def checkpoint(self):
+        """Folds the journal into the show file as soon as the writer is free"""
+        self.queue.put(CHECKPOINT)
+    def close(self):
+        self.checkpoint()
+        self.queue.put(None)
+        self.thread.join()
+    def _run(self):
+        log = open(self.logName, 'a')
+        count = 0
+        while True:
+            batch = [self.queue.get()]
+            #Take everything that is waiting, so a burst is one flush
+            while batch[-1] not in (None, CHECKPOINT):
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+            for records in batch:
+                if records is None or records == CHECKPOINT:
+                    continue
+                for record in records:
+                    log.write(json.dumps(record) + '\n')
+                    if self.pages is not None:
+                        applyRecord(self.pages, record)
+                    count += 1
+            log.flush()
+            os.fsync(log.fileno())
+            if (batch[-1] == CHECKPOINT or
+                (self.pages is not None and count >= self.compactEvery)):
+                log.close()
+                if self.pages is not None:
+                    writeShow(self.fileName, self.pages)
+                log = open(self.logName, 'w')
+                count = 0
+            if batch[-1] is None:
+                break
+        log.close()
@@ -0,0 +1,134 @@
+"""The playback stack. The frame on stage is the cue playing with layers
+merged over it in order of priority. An HTP layer merges highest takes
+precedence. An LTP layer replaces the channels it holds, whatever is under
+them. Last, a grand master scales the whole frame, at 0 it is a blackout.
+
+Every merge is one C level pass over the frames: map(max, ...) for HTP and
+a precomputed itemgetter over the two frames joined for LTP. The stack keeps
+the frame merged up to each layer, so when one layer changes only the
+layers from it up are merged again."""
+
+from patch import getter
+
+HTP = 'htp'
+LTP = 'ltp'
+
+#The layers of the console, lowest first
+CONSOLE = (('effects', 10, HTP),
+           ('interrupt', 20, LTP),
+           ('hals', 30, HTP),
+           ('override', 40, LTP))
+
+def masterTable(level):
+    """The bytearray.translate table scaling values to level percent"""
+    return ''.join(chr(value * level / 100) for value in xrange(256))
+
+class Layer(object):
+    """A layer of the stack, off while its frame is None. pick is the
+    gather of an LTP layer"""
+    __slots__ = ('name', 'priority', 'mode', 'frame', 'pick', 'channels')
+    def __init__(self, name, priority, mode=HTP):
+        if mode not in (HTP, LTP):
+            raise ValueError('A layer merges %s or %s, not %r'
+                             % (HTP, LTP, mode))
+        self.name = name
+        self.priority = priority
+        self.mode = mode
+        self.frame = None
+        self.pick = None
+        self.channels = None
+
+class Stack(object):
+    """Layers over the cue frame, size channels long. The frame returned is
+    kept by the stack, so it must not be changed"""
+    def __init__(self, size, layers=()):
+        self.size = size
+        self.layers = []
+        self.byName = {}
+        #The frame merged up to and including each layer
+        self.merged = []
+        #The cue frame as it was given, and padded to size
+        self.given = None
+        self.base = None
+        #The lowest layer whose merge is out of date
+        self.dirty = 0
+        self.master = 100
+        self.table = None
+        self.result = None
+        for name, priority, mode in layers:
+            self.add(name, priority, mode)
+    def add(self, name, priority, mode=HTP):
+        layer = Layer(name, priority, mode)
+        self.layers.append(layer)
+        #Layers of the same priority keep the order they were added in
+        self.layers.sort(key=lambda each: each.priority)
+        self.byName[name] = layer
+        self.merged = [None] * len(self.layers)
+        self.dirty = 0
+        self.result = None
+        return layer
+    def _touch(self, layer):
+        self.dirty = min(self.dirty, self.layers.index(layer))
+        self.result = None
+    def _pad(self, frame):
+        frame = bytearray(frame)
+        if len(frame) < self.size:
+            frame.extend(bytearray(self.size - len(frame)))
+        return frame
+    def set(self, name, frame, channels=None):
+        """Puts an output frame on the layer name. An LTP layer only takes
+        the channels listed, or all of them"""
+        layer = self.byName[name]
+        if layer.mode == LTP:
+            channels = (frozenset(channels) if channels is not None
+                        else frozenset(xrange(self.size)))
+            if channels != layer.channels:
+                layer.channels = channels
+                layer.pick = getter([self.size + i if i in channels else i
+                                     for i in xrange(self.size)])
+                layer.frame = None
+        if layer.frame is not None and layer.frame == frame:
+            return
+        layer.frame = self._pad(frame)
+        self._touch(layer)
+    def clear(self, name):
+        layer = self.byName[name]
+        if layer.frame is not None:
+            layer.frame = None
+            layer.channels = layer.pick = None
+            self._touch(layer)
+    def isOn(self, name):
+        return self.byName[name].frame is not None
+    def setMaster(self, level):
+        """Sets the grand master, 0 to 100"""
+        level = max(0, min(100, int(level)))
+        if level != self.master:
+            self.master = level
+            self.table = masterTable(level) if level < 100 else None
+            self.result = None
+    def state(self):
+        """The layers that are on and the grand master, for the views"""
+        return (tuple(layer.name for layer in self.layers
+                      if layer.frame is not None), self.master)
+    def frame(self, base):
+        """Merges the layers over the cue frame base"""
+        if self.given is None or base != self.given:
+            self.given = bytearray(base)
+            self.base = self._pad(base)
+            self.dirty = 0
+            self.result = None
+        if self.result is not None:
+            return self.result
+        merged = self.merged[self.dirty - 1] if self.dirty else self.base
+        for i in xrange(self.dirty, len(self.layers)):
+            layer = self.layers[i]
+            if layer.frame is None:
+                pass
+            elif layer.mode == HTP:
+                merged = bytearray(map(max, merged, layer.frame))
+            else:
+                merged = bytearray(layer.pick(merged + layer.frame))
+            self.merged[i] = merged
+        self.dirty = len(self.layers)
+        self.result = merged.translate(self.table) if self.table else merged
+        return self.result
@@ -0,0 +1,122 @@
+"""Compact storage for the levels of a page. A show keeps one table of
+fixture names, and every page keeps its levels as one byte per fixture in
+that table, instead of a dictionary of its own"""
+
+import operator
+
+#Marks a fixture the page leaves unset, as in the binary show format
+UNSET = 255
+#Turns unset levels into 0 with one bytearray.translate call
+CLEAR = ''.join(chr(i) for i in xrange(UNSET)) + '\0'
+
+class Fixtures(object):
+    """The fixture names of a show, each with a fixed position"""
+    def __init__(self):
+        self.names = []
+        self.index = {}
+    def __len__(self):
+        return len(self.names)
+    def add(self, name):
+        """The position of name, added to the end if it is new"""
+        try:
+            return self.index[name]
+        except KeyError:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            return self.index[name]
+    def getter(self, names):
+        """An itemgetter that picks names out of a padded row. Names not in
+        the table take the zero on the end"""
+        zero = len(self.names)
+        indices = [self.index.get(name, zero) for name in names]
+        if not indices:
+            return lambda row: ()
+        elif len(indices) == 1:
+            index = indices[0]
+            return lambda row: (row[index],)
+        return operator.itemgetter(*indices)
+
+class Levels(object):
+    """A dictionary view of a row of levels. Like the defaultdict it
+    replaces, reading a light that is not set gives 0, but it does not set
+    it. Levels are whole numbers from 0 to 254"""
+    __slots__ = ('row', 'fixtures')
+    def __init__(self, row, fixtures):
+        self.row = row
+        self.fixtures = fixtures
+    def _position(self, name):
+        i = self.fixtures.index.get(name)
+        if i is None or i >= len(self.row) or self.row[i] == UNSET:
+            return None
+        return i
+    def __getitem__(self, name):
+        i = self._position(name)
+        return 0 if i is None else self.row[i]
+    def __setitem__(self, name, value):
+        if value != int(value) or not 0 <= value < UNSET:
+            raise ValueError('Level %r of %s is not a whole number from 0 to '
+                             '%d' % (value, name, UNSET - 1))
+        i = self.fixtures.add(name)
+        if i >= len(self.row):
+            self.row.extend(bytearray([UNSET]) * (i + 1 - len(self.row)))
+        self.row[i] = int(value)
+    def update(self, lights):
+        """Sets many levels at once, checking them in one go"""
+        lights = lights.items()
+        try:
+            values = bytearray(value for _, value in lights)
+        except (TypeError, ValueError):
+            values = None
+        if values is None or chr(UNSET) in values:
+            #Let __setitem__ say which one is wrong
+            for name, value in lights:
+                self[str(name)] = value
+            return
+        positions = [self.fixtures.add(str(name)) for name, _ in lights]
+        if positions and max(positions) >= len(self.row):
+            self.row.extend(bytearray([UNSET]) *
+                            (max(positions) + 1 - len(self.row)))
+        row = self.row
+        for i, value in zip(positions, values):
+            row[i] = value
+    def __delitem__(self, name):
+        i = self._position(name)
+        if i is None:
+            raise KeyError(name)
+        self.row[i] = UNSET
+    def __contains__(self, name):
+        return self._position(name) is not None
+    def get(self, name, default=None):
+        i = self._position(name)
+        return default if i is None else self.row[i]
+    def iteritems(self):
+        names = self.fixtures.names
+        return ((names[i], level) for i, level in enumerate(self.row)
+                if level != UNSET)
+    def iterkeys(self):
+        return (name for name, _ in self.iteritems())
+    __iter__ = iterkeys
+    def itervalues(self):
+        return (level for level in self.row if level != UNSET)
+    def items(self):
+        return list(self.iteritems())
+    def keys(self):
+        return list(self.iterkeys())
+    def values(self):
+        return list(self.itervalues())
+    def __len__(self):
+        return len(self.row) - self.row.count(chr(UNSET))
+    def copy(self):
+        return dict(self.iteritems())
+    def __eq__(self, other):
+        return self.copy() == dict(other.iteritems())
+    def __ne__(self, other):
+        return not self == other
+    def __repr__(self):
+        return 'Levels(%r)' % self.copy()
+    def padded(self):
+        """The row with unset levels as 0, padded out to the whole table and
+        one zero more"""
+        row = self.row.translate(CLEAR)
+        row.extend(bytearray(len(self.fixtures) + 1 - len(row)))
+        return row
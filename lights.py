@@ -0,0 +1,106 @@
+"""The positions of the lights on the stage. Nothing in here needs pygame,
+so the console's model and its tools can load a structure without starting
+SDL"""
+
+import bisect
+import collections
+import csv
+
+#Side of the squares of the hit-testing grid, in pixels
+CELL = 64
+
+def chkCircle(center, radius, point):
+    dx = center[0] - point[0]
+    dy = center[1] - point[1]
+    return dx * dx + dy * dy < radius * radius
+
+class LightStructure(object):
+    """The class for the structure of lights"""
+    #SoA vs AoS. I think that it works better here. Too much JS programming.
+    def __init__(self, fileName):
+        self.pos = []
+        self.radius = []
+        self.names = []
+        #Grid cell to the sorted indices of the lights overlapping it
+        self.cells = collections.defaultdict(list)
+        self._fileName = fileName
+        try:
+            fil = open(fileName)
+            reader = csv.reader(fil)
+            for x, y, radius, name in reader:
+                self.pos.append((int(x), int(y)))
+                self.radius.append(int(radius))
+                self.names.append(name)
+        except IOError:
+            pass
+        for i in xrange(len(self.pos)):
+            self._index(i)
+        self.highlighted = -1
+        #Bumped on every change, so cached drawings know to rebuild
+        self.version = 0
+    def _cellsFor(self, i):
+        (x, y), radius = self.pos[i], self.radius[i]
+        return [(cx, cy)
+                for cx in xrange((x - radius) // CELL, (x + radius) // CELL + 1)
+                for cy in xrange((y - radius) // CELL, (y + radius) // CELL + 1)]
+    def _index(self, i):
+        for cell in self._cellsFor(i):
+            bisect.insort(self.cells[cell], i)
+    def _unindex(self, i):
+        for cell in self._cellsFor(i):
+            self.cells[cell].remove(i)
+            if not self.cells[cell]:
+                del self.cells[cell]
+    def getPointIndices(self, point):
+        """Yields the lights under point in index order. Only the lights in
+        point's grid cell are tested"""
+        cell = self.cells.get((point[0] // CELL, point[1] // CELL), ())
+        return (i for i in cell
+                if chkCircle(self.pos[i], self.radius[i], point))
+    def deleteIndices(self, indices):
+        """Removes a set of lights from the structure"""
+        indices = sorted(set(indices))
+        for i in indices:
+            self._unindex(i)
+        for i in indices[::-1]:
+            del self.pos[i]
+            del self.radius[i]
+            del self.names[i]
+        if indices:
+            for cell in self.cells.itervalues():
+                cell[:] = [i - bisect.bisect_left(indices, i) for i in cell]
+            self.version += 1
+    def save(self):
+        fil = open(self._fileName, 'w')
+        writer = csv.writer(fil)
+        writer.writerows((pos[0], pos[1], radius, name) for pos, radius, name
+                         in zip(self.pos, self.radius, self.names))
+        fil.close()
+    def getName(self, pos):
+        for i in self.getPointIndices(pos):
+            return self.names[i]
+        return False
+    def append(self, pos):
+        self.pos.append(pos)
+        self.radius.append(35)
+        nameIndex = len(self.names)
+        name = 'Light %d'%(nameIndex)
+        while name in self.names:
+            nameIndex += 1
+            name = 'Light %d'%(nameIndex)
+        self.names.append(name)
+        self.highlighted = len(self.pos) - 1
+        self._index(self.highlighted)
+        self.version += 1
+    def replaceName(self, name):
+        self.names[self.highlighted] = name
+        self.version += 1
+    def group(self, axis=0, names=None):
+        """The names of the lights, or of the given ones, in order along an
+        axis, 0 for left to right and 1 for back to front"""
+        names = self.names if names is None else set(names)
+        return [name for _, name in sorted((pos[axis], name) for pos, name
+                                           in zip(self.pos, self.names)
+                                           if name in names)]
+    def __iter__(self):
+        return zip(self.pos, self.radius, self.names).__iter__()
@@ -0,0 +1,100 @@
+"""Compiles recorded macros into their net effect. A macro is a list of
+steps, each one of
+
+    ('levels', target, {name: op})          level changes to one page
+    ('call', target, method, args)          anything else, like moving on
+
+where target names an object the recorder knows, such as the show or a
+preview. Runs of level changes to the same target are folded into a single
+step as they are recorded, so a replay changes each light once.
+
+An op is ('set', level) or ('toggle', count). Toggling goes 100, 75, 50 and
+round again, so any number of toggles is the same as one to three."""
+
+import json
+import os
+
+LEVEL_METHODS = ('toggleIntensity', 'turnOff')
+
+def toggleLevel(level):
+    """The level a light goes to when it is clicked"""
+    if level <= 50:
+        return 100
+    elif level <= 75:
+        return 50
+    return 75
+
+def compose(first, second):
+    """The op that does first and then second, first may be None"""
+    if first is None or second[0] == 'set':
+        return second
+    kind, value = first
+    if kind == 'set':
+        return ('set', applyOp(second, value))
+    return ('toggle', (value + second[1] - 1) % 3 + 1)
+
+def applyOp(op, level):
+    kind, value = op
+    if kind == 'set':
+        return value
+    for _ in xrange(value):
+        level = toggleLevel(level)
+    return level
+
+def addLevels(steps, target, ops):
+    """Appends level changes to the compiled steps"""
+    if not steps or steps[-1][0] != 'levels' or steps[-1][1] != target:
+        steps.append(('levels', target, {}))
+    merged = steps[-1][2]
+    for name, op in ops.iteritems():
+        merged[name] = compose(merged.get(name), op)
+
+def addCall(steps, target, method, args=()):
+    """Appends a recorded call to the compiled steps"""
+    if method in LEVEL_METHODS:
+        name, = args
+        addLevels(steps, target, {name: ('set', 0) if method == 'turnOff'
+                                  else ('toggle', 1)})
+    else:
+        steps.append(('call', target, method, tuple(args)))
+
+def extend(steps, played):
+    """Appends the steps of a macro played while recording another"""
+    for step in played:
+        if step[0] == 'levels':
+            addLevels(steps, step[1], step[2])
+        else:
+            steps.append(step)
+
+def compile(calls):
+    """Compiles a list of (target, method, args) calls"""
+    steps = []
+    for target, method, args in calls:
+        addCall(steps, target, method, args)
+    return steps
+
+def load(fileName):
+    """The macros saved in fileName, or none if there is no such file"""
+    try:
+        fil = open(fileName)
+    except IOError:
+        return {}
+    with fil:
+        saved = json.loads(fil.read())
+    macros = {}
+    for key, steps in saved.iteritems():
+        macros[key] = [('levels', step[1],
+                        dict((str(name), tuple(op))
+                             for name, op in step[2].iteritems()))
+                       if step[0] == 'levels' else
+                       ('call', step[1], str(step[2]), tuple(step[3]))
+                       for step in steps]
+    return macros
+
+def save(fileName, macros):
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w') as fil:
+        fil.write(json.dumps(macros, indent=1, sort_keys=True))
+    if os.name == 'nt' and os.path.exists(fileName):
+        os.remove(fileName)
+    os.rename(tempName, fileName)
@@ -0,0 +1,122 @@
+"""Sends the output frames to the lights from a separate process, so a slow
+frame in the console never stalls the lights and a blocking write never
+stalls the console"""
+
+import multiprocessing
+import os
+import time
+
+SENT, DROPPED, LATE = range(3)
+
+class MockOutput(object):
+    """Stands in for the serial port. Given a file name, a fifo or the slave
+    end of a pseudo terminal, it writes everything there"""
+    def __init__(self, fileName=None):
+        self.fil = open(fileName, 'wb') if fileName else None
+    def write(self, data):
+        if self.fil:
+            self.fil.write(data)
+            self.fil.flush()
+    def isOpen(self): return ''
+    def close(self):
+        if self.fil:
+            self.fil.close()
+
+def openPseudoTerminal():
+    """Opens a pseudo terminal, returns the master file descriptor to read the
+    output from and the name of the slave to give to openPort"""
+    import tty
+    master, slave = os.openpty()
+    #A cooked terminal would turn every 10 in a frame into 13 10
+    tty.setraw(slave)
+    return master, os.ttyname(slave)
+
+def openPort(port):
+    """Opens an output port. 'file:name' writes to a file or pseudo terminal,
+    None discards the output and anything else is a serial port"""
+    if port is None:
+        return MockOutput()
+    elif port.startswith('file:'):
+        return MockOutput(port[len('file:'):])
+    else:
+        import serial
+        return serial.Serial(port)
+
+def _sendFrames(ports, frame, length, sequence, stats, sent, stop, rate,
+                keepAlive):
+    """The output process. Rate times a second it hands the newest published
+    frame to a dmx.Sender, which sends the universes that changed and resends
+    the others every keepAlive seconds. sent holds the sequence number of the
+    last new frame and when it was sent"""
+    import dmx
+    sender = dmx.Sender(ports, len(frame), keepAlive)
+    interval = 1.0 / rate
+    lastSequence = 0
+    deadline = time.time()
+    while not stop.is_set():
+        with frame.get_lock():
+            newSequence = sequence.value
+            data = frame.raw[:length.value]
+        if newSequence - lastSequence > 1:
+            #Frames published between two sends were coalesced
+            stats[DROPPED] += newSequence - lastSequence - 1
+        if data:
+            stats[SENT] += sender.send(data, time.time())
+            if newSequence != lastSequence:
+                sent[0], sent[1] = newSequence, time.time()
+        lastSequence = newSequence
+        deadline += interval
+        delay = deadline - time.time()
+        if delay > 0:
+            stop.wait(delay)
+        else:
+            stats[LATE] += 1
+            deadline = time.time()
+    sender.close()
+
+class OutputProcess(object):
+    """Drop in for the serial port. write publishes the output frame, the
+    levels of every universe in turn, into shared memory and returns at once.
+    The worker process packs and sends it to ports, a port list as described
+    in dmx.py"""
+    def __init__(self, ports, size=512, rate=44, keepAlive=1.0):
+        self.size = size
+        self.frame = multiprocessing.Array('c', size)
+        self.length = multiprocessing.Value('i', 0, lock=False)
+        self.sequence = multiprocessing.Value('L', 0, lock=False)
+        self.counters = multiprocessing.Array('L', 3, lock=False)
+        self.sent = multiprocessing.Array('d', 2)
+        self.stop = multiprocessing.Event()
+        self.process = multiprocessing.Process(
+            target=_sendFrames,
+            args=(ports, self.frame, self.length, self.sequence,
+                  self.counters, self.sent, self.stop, rate, keepAlive))
+        self.process.daemon = True
+        self.process.start()
+    def write(self, data):
+        if len(data) > self.size:
+            raise ValueError('Frame of %d bytes does not fit in %d'
+                             % (len(data), self.size))
+        with self.frame.get_lock():
+            self.frame.raw = data
+            self.length.value = len(data)
+            self.sequence.value += 1
+    def stats(self):
+        """The sent packet, dropped frame and late tick counters"""
+        return {'sent': self.counters[SENT],
+                'dropped': self.counters[DROPPED],
+                'late': self.counters[LATE]}
+    def report(self):
+        """The counters as a line, for the overlay and the log"""
+        return ('%(sent)d sent %(dropped)d coalesced %(late)d late'
+                % self.stats())
+    def lastSent(self):
+        """The sequence number of the last new frame written to the port,
+        and the time it was written"""
+        with self.sent.get_lock():
+            return int(self.sent[0]), self.sent[1]
+    def isOpen(self):
+        return self.process.is_alive()
+    def close(self):
+        self.stop.set()
+        self.process.join()
@@ -0,0 +1,179 @@
+"""Compiles the channel list into index tables, so building an output frame is
+a few C level gathers instead of a Python loop over the patch.
+
+Every channel has a dimmer curve taking the 0-100 level to the 0-255 value
+sent. A curve is worked out once into a lookup table, so putting a frame
+through the curves is one bytearray.translate call when the channels all
+share a curve. Otherwise the frame is translated once per curve in use, and
+one gather picks each channel's value out of the results.
+
+A patch file has a line for each fixture and channel it feeds, with the
+channel's curve, linear if it is left out:
+
+    FC,4,square
+    FC,22,square
+    RS,14,gamma
+    TRACKS,11,switch
+"""
+
+import csv
+import operator
+
+def _power(exponent):
+    return lambda level: int(round(255 * (level / 100.0) ** exponent))
+
+#Level 0-100 to value 0-255. square suits incandescents, gamma LEDs, and
+#switch is for fixtures that must not be dimmed
+CURVES = {'linear': lambda level: level * 255 / 100,
+          'square': _power(2),
+          'gamma': _power(2.2),
+          'scurve': lambda level: int(round(
+              255 * (3 - 2 * level / 100.0) * (level / 100.0) ** 2)),
+          'switch': lambda level: 255 if level >= 50 else 0}
+
+def curveTable(curve):
+    """The bytearray.translate table of a curve. Levels over 100 are taken
+    as 100"""
+    return ''.join(chr(min(255, CURVES[curve](min(level, 100))))
+                   for level in xrange(256))
+
+TABLES = dict((curve, curveTable(curve)) for curve in CURVES)
+#Converts 0-100 levels into 0-255 values with one bytearray.translate call
+SCALE = TABLES['linear']
+#How many page frames Patch keeps before starting again
+MAX_ROW_FRAMES = 4096
+
+def getter(indices):
+    """Like operator.itemgetter, but always returns a tuple"""
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda seq: (seq[index],)
+    return operator.itemgetter(*indices)
+
+class Patch(object):
+    """The channel list compiled into a name table and slot maps. Channels
+    fed by several names (FC on 4 and 22, BSR and BSL on 9) are merged
+    highest takes precedence. The frame is size channels long, by default
+    long enough for the highest patched channel and never under 24. curves
+    maps a channel to the name of its curve, linear if it is not there"""
+    def __init__(self, channelList, size=None, curves=None):
+        highest = max([0] + [channel for _, channel in channelList])
+        if size is None:
+            size = max(23, highest) + 1
+        elif highest >= size:
+            raise ValueError('Channel %d is past the end of a %d channel '
+                             'frame' % (highest, size))
+        self.size = size
+        self.channelList = list(channelList)
+        curves = curves or {}
+        self.curves = [curves.get(channel, 'linear')
+                       for channel in xrange(size)]
+        used = sorted(set(self.curves))
+        self.tables = [TABLES[curve] for curve in used]
+        #Channel i of the frame translated by the k-th table is at k*size+i
+        self.pick = getter([used.index(curve) * size + channel
+                            for channel, curve in enumerate(self.curves)])
+        self.fixtures = self.fixtureCount = self.fromRow = None
+        self.rowFrames = {}
+        self.names = []
+        index = {}
+        sources = [[] for _ in xrange(size)]
+        for name, channel in channelList:
+            if name not in index:
+                index[name] = len(self.names)
+                self.names.append(name)
+            if index[name] not in sources[channel]:
+                sources[channel].append(index[name])
+        self.sources = sources
+        #The gathered levels get a trailing zero for the unpatched slots
+        zero = len(self.names)
+        self.gather = getter(self.names) if self.names else lambda _: ()
+        self.first = getter([slot[0] if slot else zero for slot in sources])
+        #Only the slots fed by several names need the max-reduce
+        self.merged = [i for i, slot in enumerate(sources) if len(slot) > 1]
+        depth = max([1] + [len(slot) for slot in sources])
+        self.layers = [getter([sources[i][min(j, len(sources[i]) - 1)]
+                               for i in self.merged])
+                       for j in xrange(depth)] if self.merged else []
+    def channelTables(self):
+        """The lookup table of every channel, each a bytearray"""
+        tables = dict((curve, bytearray(TABLES[curve]))
+                      for curve in set(self.curves))
+        return [tables[curve] for curve in self.curves]
+    def isLinear(self):
+        return self.tables == [SCALE]
+    def scale(self, frame):
+        """Puts a frame of 0-100 levels through the channel curves"""
+        if len(self.tables) == 1:
+            return frame.translate(self.tables[0])
+        return bytearray(self.pick(bytearray().join(
+            [frame.translate(table) for table in self.tables])))
+    def channels(self):
+        """Each patched name with the channels it feeds"""
+        channels = dict((name, []) for name in self.names)
+        for channel, sources in enumerate(self.sources):
+            for source in sources:
+                channels[self.names[source]].append(channel)
+        return channels
+    def rowGetter(self, fixtures):
+        """Picks the patched names out of rows over fixtures, recompiled when
+        the table grows"""
+        if self.fixtures is not fixtures:
+            self.rowFrames.clear()
+        if self.fixtures is not fixtures or self.fixtureCount != len(fixtures):
+            self.fixtures = fixtures
+            self.fixtureCount = len(fixtures)
+            self.fromRow = fixtures.getter(self.names)
+        return self.fromRow
+    def frame(self, lights):
+        """Builds the 0-255 output frame from a name to level mapping. The
+        frames of a page's levels.Levels rows are kept, a row is a short
+        string to look up and the same few are sent over and over"""
+        if not hasattr(lights, 'padded'):
+            return self._frame(self.gather(lights))
+        getter = self.rowGetter(lights.fixtures)
+        key = str(lights.row)
+        try:
+            return bytearray(self.rowFrames[key])
+        except KeyError:
+            pass
+        frame = self._frame(getter(lights.padded()))
+        if len(self.rowFrames) >= MAX_ROW_FRAMES:
+            self.rowFrames.clear()
+        self.rowFrames[key] = str(frame)
+        return frame
+    def _frame(self, levels):
+        levels += (0,)
+        frame = bytearray(self.first(levels))
+        if self.merged:
+            for slot, level in zip(self.merged,
+                                   map(max, *[layer(levels)
+                                              for layer in self.layers])):
+                frame[slot] = level
+        return self.scale(frame)
+
+def load(fileName, size=None):
+    """Reads a patch file, see above"""
+    channelList = []
+    curves = {}
+    with open(fileName) as fil:
+        for number, row in enumerate(csv.reader(fil), 1):
+            if not row or not ''.join(row).strip() or row[0].startswith('#'):
+                continue
+            try:
+                name, channel = row[0].strip(), int(row[1])
+            except (IndexError, ValueError):
+                raise ValueError('%s line %d: expected name,channel[,curve]'
+                                 % (fileName, number))
+            curve = (row[2].strip() if len(row) > 2 else '') or 'linear'
+            if curve not in CURVES:
+                raise ValueError('%s line %d: unknown curve %s, use one of %s'
+                                 % (fileName, number, curve,
+                                    ', '.join(sorted(CURVES))))
+            if curves.get(channel, curve) != curve:
+                raise ValueError('%s line %d: channel %d already has the %s '
+                                 'curve' % (fileName, number, channel,
+                                            curves[channel]))
+            curves[channel] = curve
+            channelList.append((name, channel))
+    return Patch(channelList, size, curves)
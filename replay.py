@@ -0,0 +1,235 @@
+"""Records the keyboard and mouse input of a session and plays it back, for
+load tests that can be run again and give the same output every time.
+
+A recording is every input event that reaches EventWrapper.sortEvents with
+the time it arrived. The replay hands them back to the wrapper at those
+times, so they go through the same dispatch as live input. It runs either
+in real time or as fast as possible on a virtual clock that skips ahead
+instead of sleeping. On the virtual clock the fades, effects and playback
+see the same times on every replay, so two replays of the same show send
+the same frames. The replay edits the show as the session did, so record
+and replay on copies of it. The console's --capture keeps the frames sent
+to the output for comparing two replays.
+
+Layout, all integers little endian:
+    MAGIC
+    events, one after another                (double seconds since the start,
+                                              uint8 kind, then
+        key                                   uint32 key, uint16 mod,
+                                              uint16 length, utf-8 unicode
+        click                                 uint8 button, uint16 x, uint16 y
+        quit                                  nothing)
+
+    python replay.py first.out second.out --size 512
+
+Comparing captures needs neither pygame nor stackless, so they are only
+imported to record or replay.
+"""
+
+import operator
+import os
+import struct
+import time
+
+MAGIC = 'LCINPUT2\n'
+HEAD = '<dB'
+KEY, CLICK, QUIT = range(3)
+
+def addOptions(parser):
+    """Adds the record and replay options to an optparse parser"""
+    parser.add_option('--record-input', default=None, dest='recordInput',
+                      metavar='FILE', help='record the keyboard and mouse to '
+                      'FILE')
+    parser.add_option('--replay-input', default=None, dest='replayInput',
+                      metavar='FILE', help='play the input recorded in FILE '
+                      'with no window, and stop at its end')
+    parser.add_option('--fast', action='store_true', default=False,
+                      help='replay as fast as possible on a virtual clock')
+
+def setUp(options):
+    """Points SDL at its dummy video driver for a replay, and returns the
+    clock the console should run on"""
+    if not options.replayInput:
+        return time.time
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    return VirtualClock() if options.fast else time.time
+
+def makeScheduler(options, wrapper, clock=time.time):
+    """The scheduler for a window, recording its input if asked, or one that
+    replays a recording instead"""
+    if options.recordInput:
+        Recorder(options.recordInput).wrap(wrapper)
+    if options.replayInput:
+        return ReplayScheduler(wrapper, load(options.replayInput),
+                               options.fps, options.outputRate, clock)
+    import scheduler
+    return scheduler.Scheduler(wrapper, options.fps, options.outputRate, clock)
+
+def _pack(event):
+    import pygame
+    if event.type == pygame.KEYDOWN:
+        #SDL2 key codes do not fit in 16 bits
+        text = event.unicode.encode('utf-8')
+        return (struct.pack('<BIHH', KEY, event.key, event.mod, len(text)) +
+                text)
+    elif event.type == pygame.MOUSEBUTTONDOWN:
+        return struct.pack('<BBHH', CLICK, event.button, *event.pos)
+    elif event.type == pygame.QUIT:
+        return struct.pack('<B', QUIT)
+    return None
+
+class Recorder(object):
+    """Writes the input events to fileName as they arrive. Every batch is
+    flushed, so a session that crashes keeps its recording"""
+    def __init__(self, fileName, clock=time.time):
+        self.clock = clock
+        self.fil = open(fileName, 'wb')
+        self.fil.write(MAGIC)
+        self.start = clock()
+    def wrap(self, wrapper):
+        """Records the events wrapper sorts from now on"""
+        sortEvents = wrapper.sortEvents
+        def record(events, *args):
+            self.write(events)
+            return sortEvents(events, *args)
+        wrapper.sortEvents = record
+    def write(self, events):
+        now = struct.pack('<d', self.clock() - self.start)
+        data = [now + packed for packed in map(_pack, events) if packed]
+        if data:
+            self.fil.write(''.join(data))
+            self.fil.flush()
+    def close(self):
+        self.fil.close()
+
+def load(fileName):
+    """The events of a recording, as (seconds, event) in order"""
+    import pygame
+    with open(fileName, 'rb') as fil:
+        data = fil.read()
+    if not data.startswith(MAGIC):
+        raise ValueError('%s is not an input recording' % fileName)
+    events = []
+    offset = len(MAGIC)
+    size = struct.calcsize(HEAD)
+    while offset + size <= len(data):
+        seconds, kind = struct.unpack_from(HEAD, data, offset)
+        offset += size
+        if kind == KEY:
+            key, mod, length = struct.unpack_from('<IHH', data, offset)
+            offset += 8
+            text = data[offset:offset + length].decode('utf-8')
+            offset += length
+            event = pygame.event.Event(pygame.KEYDOWN, key=key, mod=mod,
+                                       unicode=text)
+        elif kind == CLICK:
+            button, x, y = struct.unpack_from('<BHH', data, offset)
+            offset += 5
+            event = pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                       button=button, pos=(x, y))
+        elif kind == QUIT:
+            event = pygame.event.Event(pygame.QUIT)
+        else:
+            raise ValueError('%s: unknown event kind %d' % (fileName, kind))
+        events.append((seconds, event))
+    return events
+
+class VirtualClock(object):
+    """A clock that only moves when it is slept on, and then moves at once"""
+    def __init__(self, now=0.0):
+        self.now = now
+    def __call__(self):
+        return self.now
+    def sleep(self, seconds):
+        self.now += max(0, seconds)
+
+class ReplayScheduler(object):
+    """Runs a window's loops like scheduler.Scheduler, but takes the input
+    from a recording. The timed functions run like scheduler.Ticker's. The
+    events recorded together are sorted together, in between them, and the
+    replay stops after the last one"""
+    def __init__(self, wrapper, events, fps=30, outputRate=0,
+                 clock=time.time):
+        self.wrapper = wrapper
+        self.events = events
+        self.fps = fps
+        self.outputRate = outputRate
+        self.clock = clock
+        self.sleep = getattr(clock, 'sleep', time.sleep)
+        #[interval, next due, function]
+        self.timers = []
+        self.input = None
+        self.keepRunning = True
+    def every(self, rate, function):
+        """Runs function rate times a second, a rate of 0 never runs it"""
+        if rate > 0:
+            self.timers.append([1.0 / rate, 0, function])
+    def onInput(self, function):
+        self.input = function
+    def onRender(self, function):
+        self.every(self.fps, function)
+    def onOutput(self, function):
+        self.every(self.outputRate, function)
+    def stop(self):
+        self.keepRunning = False
+    def _waitUntil(self, when):
+        delay = when - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+    def run(self):
+        start = self.clock()
+        for timer in self.timers:
+            timer[1] = start
+        i = 0
+        while (i < len(self.events) and self.wrapper.keepRunning and
+               self.keepRunning):
+            due = start + self.events[i][0]
+            timer = (min(self.timers, key=operator.itemgetter(1))
+                     if self.timers else None)
+            if timer is not None and timer[1] < due:
+                self._waitUntil(timer[1])
+                timer[2]()
+                timer[1] = max(timer[1] + timer[0], self.clock())
+                continue
+            self._waitUntil(due)
+            batch = []
+            while i < len(self.events) and start + self.events[i][0] == due:
+                batch.append(self.events[i][1])
+                i += 1
+            self.wrapper.sortEvents(batch)
+            if self.input and self.wrapper.getEvents():
+                self.input()
+
+def compare(firstName, secondName, size):
+    """The first frame two captures differ at, None when they are the same"""
+    with open(firstName, 'rb') as first:
+        with open(secondName, 'rb') as second:
+            frame = 0
+            while True:
+                a = first.read(size * 1024)
+                b = second.read(size * 1024)
+                if a != b:
+                    for offset in xrange(min(len(a), len(b)) + 1):
+                        if a[offset:offset + 1] != b[offset:offset + 1]:
+                            return frame + offset // size
+                if not a:
+                    return None
+                frame += 1024
+
+def main():
+    import optparse
+    parser = optparse.OptionParser(usage='%prog [options] capture capture')
+    parser.add_option('--size', type='int', default=24,
+                      help='channels in a frame [default: %default]')
+    options, argv = parser.parse_args()
+    if len(argv) != 2:
+        parser.error('give two captures')
+    frame = compare(argv[0], argv[1], options.size)
+    if frame is None:
+        print('the output is the same')
+    else:
+        print('the output differs from frame %d' % frame)
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1 +1 @@
-c:/Python26/python.exe controller.py %1 %2 %3
\ No newline at end of file
+c:/Python27/python.exe controller.py %1 %2 %3
\ No newline at end of file
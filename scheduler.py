@@ -0,0 +1,133 @@
+"""Runs the input, render and output loops as tasklets. The process blocks in
+pygame.event.wait between events, and timer events pace rendering and output,
+so an idle console sleeps instead of spinning. There is one timer event, set
+for whichever loop is due next, as SDL only has a few user events to give."""
+
+import stackless
+import pygame
+import operator
+import time
+
+def addOptions(parser):
+    """Adds the frame rate options to an optparse parser"""
+    parser.add_option('--fps', type='float', default=30,
+                      help='maximum frames drawn per second [default: %default]')
+    parser.add_option('--output-rate', type='float', default=0,
+                      dest='outputRate',
+                      help='times per second the output is resent, '
+                      '0 only sends on change [default: %default]')
+
+#The timer event of the scheduler
+TICK = pygame.USEREVENT
+
+def setTimer(event, rate):
+    """Fires event rate times a second, a rate of 0 stops the timer"""
+    if rate > 0:
+        pygame.time.set_timer(event, max(1, int(1000.0 / rate)))
+    else:
+        pygame.time.set_timer(event, 0)
+
+class Loop(object):
+    """A tasklet that runs its function every time it is woken up"""
+    def __init__(self, function):
+        self.function = function
+        self.channel = stackless.channel()
+        stackless.tasklet(self.run)()
+    def run(self):
+        while True:
+            self.channel.receive()
+            self.function()
+    def wake(self):
+        #Only wake it if it is waiting, a busy loop will catch up by itself
+        if self.channel.balance < 0:
+            self.channel.send(None)
+
+class Scheduler(object):
+    """Sends input to the input loop as soon as it arrives, and wakes the
+    timed loops at their own rates"""
+    def __init__(self, wrapper, fps=30, outputRate=0, clock=time.time):
+        self.wrapper = wrapper
+        self.fps = fps
+        self.outputRate = outputRate
+        self.clock = clock
+        self.input = None
+        self.loops = []
+        #[interval, next due, loop]
+        self.timers = []
+    def onInput(self, function):
+        self.input = Loop(function)
+    def every(self, rate, function):
+        """Runs function rate times a second, a rate of 0 only runs it as
+        the scheduler starts"""
+        loop = Loop(function)
+        self.loops.append(loop)
+        if rate > 0:
+            self.timers.append([1.0 / rate, 0, loop])
+    def onRender(self, function):
+        self.every(self.fps, function)
+    def onOutput(self, function):
+        self.every(self.outputRate, function)
+    def run(self):
+        #Let every loop run up to its channel, or nothing is waiting there
+        #when it is woken and the wake is lost
+        stackless.schedule()
+        now = self.clock()
+        for loop in self.loops:
+            loop.wake()
+        for timer in self.timers:
+            timer[1] = now + timer[0]
+        self._setTimer(now)
+        try:
+            while self.wrapper.keepRunning:
+                ticks = self.wrapper.waitEvents((TICK,))
+                if self.input and self.wrapper.getEvents():
+                    self.input.wake()
+                if ticks:
+                    self._tick()
+        finally:
+            setTimer(TICK, 0)
+    def _tick(self):
+        """Wakes the loops that are due"""
+        now = self.clock()
+        for timer in self.timers:
+            if timer[1] <= now:
+                timer[2].wake()
+                #A late loop skips the ticks it missed rather than catching up
+                timer[1] = max(timer[1] + timer[0], now)
+        self._setTimer(now)
+    def _setTimer(self, now):
+        """Sets the timer event for the loop that is due next"""
+        if self.timers:
+            delay = min(timer[1] for timer in self.timers) - now
+            setTimer(TICK, 1.0 / max(delay, 0.001))
+
+class Ticker(object):
+    """Runs the timed functions of a console started headless, without
+    pygame events or a window. Sleeps until the next one is due"""
+    def __init__(self, outputRate=0, clock=time.time, sleep=time.sleep):
+        self.outputRate = outputRate
+        self.clock = clock
+        self.sleep = sleep
+        #[interval, next due, function]
+        self.timers = []
+        self.keepRunning = True
+    def every(self, rate, function):
+        """Runs function rate times a second, a rate of 0 never runs it"""
+        if rate > 0:
+            self.timers.append([1.0 / rate, 0, function])
+    def onOutput(self, function):
+        self.every(self.outputRate, function)
+    def stop(self):
+        self.keepRunning = False
+    def run(self):
+        now = self.clock()
+        for timer in self.timers:
+            timer[1] = now
+        while self.keepRunning and self.timers:
+            timer = min(self.timers, key=operator.itemgetter(1))
+            delay = timer[1] - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            timer[2]()
+            #A late timer skips the ticks it missed rather than catching up
+            timer[1] = max(timer[1] + timer[0], self.clock())
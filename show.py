@@ -0,0 +1,448 @@
+"""The show itself: its pages, the links between them and the edits made to
+them. Nothing in here needs pygame, so tools that only read or write shows
+can import it without starting SDL"""
+
+import collections
+import copy
+import json
+import os
+
+from patch import Patch
+from levels import Fixtures, Levels
+import journal
+import showfile
+import cuelist
+import columns
+import history
+from history import edit
+import macro
+
+def stringifyDict(dic):
+    stringified = {}
+    for key, value in dic.iteritems():
+        stringified[str(key)] = value
+    return stringified
+
+class Page(object):
+    """The class for a page of the show. The levels are a row of bytes over
+    the show's fixture table, lights gives a dictionary view of them"""
+    __slots__ = ('idno', 'links', 'row', 'fixtures', 'time', 'fullTime',
+                 'transition', 'notes')
+    def __init__(self, idno=None, lights={}, links=None, time=-1, transition=None, notes='', fixtures=None):
+        self.idno = idno
+        self.links = links if links is not None else {'next': -1}
+        self.fixtures = fixtures if fixtures is not None else Fixtures()
+        self.row = bytearray()
+        self.lights.update(lights)
+        self.time = time
+        self.fullTime = time
+        self.transition = transition
+        self.notes = notes
+    lights = property(lambda self: Levels(self.row, self.fixtures))
+    def __getitem__(self, key):
+        """Lets code written for page dictionaries, like cleanupShow, work on
+        a page"""
+        if key == 'lights':
+            return self.lights
+        return self.toDict()[key]
+    def updateTime(self, time):
+        if self.time < 0:
+            return self.idno
+        else:
+            self.time -= time
+            if self.time < 0:
+                return self.links.get('timeout')
+    def resetTime(self):
+        self.time = self.fullTime
+    def toDict(self):
+        """The page as it is saved in the show file"""
+        return {'idno': self.idno, 'lights': self.lights.copy(),
+                'links': dict(self.links), 'time': self.fullTime,
+                'transition': self.transition, 'notes': self.notes}
+
+class Show(object):
+    """The model for the show. channelList may be a compiled Patch"""
+    def __init__(self, fileName, channelList, autosave=False, undoDepth=100):
+        self.loadFile(fileName)
+        self.patch = (channelList if isinstance(channelList, Patch)
+                      else Patch(channelList))
+        self.channelList = self.patch.channelList
+        self.currentPage = self.pages['0']
+        self.version = 0
+        self.transition = 0
+        self.fadeTarget = None
+        self._cues = None
+        self._columns = None
+        #The next number to try for each page id prefix
+        self._freeIds = {}
+        self.history = history.History(undoDepth)
+        self.journal = None
+        if autosave:
+            #A binary show saves its own dirty pages, no copy is needed
+            self.journal = journal.Journal(fileName,
+                                           None if self.binary
+                                           else self._pageDicts())
+    def _touch(self):
+        """Marks the show as changed so the views know to redraw"""
+        self.version += 1
+    def _record(self, *records):
+        """Passes the records of an edit on to the autosave journal"""
+        if self.journal:
+            self.journal.append(*records)
+    def _recordLinks(self, *pages):
+        self._record(*[('k', page.idno, dict(page.links)) for page in pages])
+    def makePage(self, idno=None, **fields):
+        """A page over the show's fixture table"""
+        return Page(idno, fixtures=self.fixtures, **fields)
+    def _pageDicts(self):
+        return dict((idno, page.toDict())
+                    for idno, page in self.pages.iteritems())
+    def setPatch(self, patch):
+        self.patch = patch
+        self.channelList = patch.channelList
+        self._touch()
+    def makeList(self, page=None):
+        return self.patch.frame((page or self.currentPage).lights)
+    def updateTime(self, time):
+        idno = self.currentPage.updateTime(time)
+        if idno is not None and idno != self.currentPage.idno:
+            self.currentPage = self.pages[idno]
+            self.currentPage.resetTime()
+            self._touch()
+    def startFade(self, idno):
+        """Starts a transition from the current page to the page idno"""
+        self.fadeTarget = idno
+        self.transition = 0
+        self._touch()
+    def setTransition(self, transition):
+        self.transition = transition
+        self._touch()
+    def jump(self, idno):
+        """Puts the page idno on stage at once, as played back from a
+        rendered timeline"""
+        self.currentPage = self.pages[idno]
+        self.currentPage.resetTime()
+        self.fadeTarget = None
+        self.transition = 0
+        self._touch()
+    def finishFade(self):
+        self.currentPage = self.pages[self.fadeTarget]
+        self.currentPage.resetTime()
+        self.fadeTarget = None
+        self.transition = 0
+        self._touch()
+    def cues(self):
+        """The ordered index of the linked pages, built on first use"""
+        if self._cues is None:
+            self._cues = cuelist.CueList(self.pages)
+        return self._cues
+    def columns(self):
+        """The levels of every page as a columns.Columns matrix, built on
+        first use"""
+        if self._columns is None:
+            self._columns = columns.Columns(self)
+        return self._columns
+    def cueOffset(self, idno, steps):
+        """The page steps pages along the cue list from idno, or None when
+        idno is not in the cue list"""
+        cues = self.cues()
+        if idno not in cues:
+            return None
+        return cues.offset(idno, steps)
+    def check(self):
+        """Lists the dangling links, loops and orphan pages of the show"""
+        return cuelist.check(self.pages)
+    def _createPage(self, prefix=''):
+        i = self._freeIds.get(prefix, 0)
+        while prefix + str(i) in self.pages:
+            i += 1
+        self._freeIds[prefix] = i + 1
+        i = prefix + str(i)
+        self.pages[i] = self.makePage(i)
+        self.history.added(i)
+        nextPage = self._interrupt(i)
+        self.history.links(self.currentPage)
+        self.currentPage.links['next'] = i
+        if self._cues is not None:
+            if self.currentPage.idno in self._cues:
+                self._cues.insertAfter(self.currentPage.idno, i)
+            else:
+                self._cues = None
+        self._record(('p', nextPage.toDict()))
+        self._recordLinks(self.currentPage)
+        return nextPage
+    @edit
+    def moveForward(self):
+        try:
+            self.currentPage = self.pages[self.currentPage.links['next']]
+        except KeyError:
+            self.currentPage = self._createPage()
+        if self.currentPage.links['next'] == -1:
+            self._createPage()
+        self._touch()
+    def moveBack(self):
+        try:
+            self.currentPage = self.pages[self.currentPage.links['previous']]
+        except KeyError:
+            pass
+        self._touch()
+    def _interrupt(self, page):
+        self.history.links(self.pages[page])
+        self.pages[page].links['previous'] = self.currentPage.idno
+        self.pages[page].links['next'] = self.currentPage.links['next']
+        return self.pages[page]
+    @edit
+    def blackout(self):
+        self.currentPage = self._interrupt('blackout')
+        self._recordLinks(self.currentPage)
+        self._touch()
+    @edit
+    def hals(self):
+        self.currentPage = self._interrupt('hals')
+        self._recordLinks(self.currentPage)
+        self._touch()
+    @edit
+    def interrupt(self):
+        previousPage = self.currentPage
+        nextLink = self.currentPage.links['next']
+        nextPage = self._createPage('i')
+        for key, value in self.pages['interrupt'].lights.iteritems():
+            nextPage.lights[key] = value
+            self.history.level(self.pages['interrupt'], key)
+            self.pages['interrupt'].lights[key] = 0
+        self.currentPage = self._interrupt(nextPage.idno)
+        nextPage.links['next'] = nextLink
+        self.history.links(self.pages[nextLink])
+        self.pages[nextLink].links['previous'] = nextPage.idno
+        self._record(('p', nextPage.toDict()),
+                     ('p', self.pages['interrupt'].toDict()))
+        self._recordLinks(previousPage, self.pages[nextLink])
+        self._touch()
+    def save(self):
+        if self.binary:
+            self.pages.save()
+        elif not self.journal:
+            fil = open(self.fileName, 'w')
+            fil.write(json.dumps(self._pageDicts().values(), indent=1))
+            fil.close()
+        if self.journal:
+            #The journal's writer thread does the rest
+            self.journal.checkpoint()
+        elif os.path.exists(self.fileName + '.journal'):
+            #Whatever was left in the journal is in the file now
+            os.remove(self.fileName + '.journal')
+    def close(self):
+        if self.journal:
+            if self.binary:
+                self.pages.save()
+            self.journal.close()
+    def _applyRecord(self, pages, record):
+        """Replays a journal record on the pages of a binary show"""
+        kind = record[0]
+        if kind == 'l':
+            lights = pages[record[1]].lights
+            if record[3] is not None:
+                lights[str(record[2])] = record[3]
+            elif str(record[2]) in lights:
+                del lights[str(record[2])]
+        elif kind == 'k':
+            pages[record[1]].links = record[2]
+        elif kind == 'd':
+            del pages[record[1]]
+        elif kind == 'n':
+            pages[record[1]].notes = record[2]
+        elif kind == 'p':
+            pages[record[1]['idno']] = self.makePage(**stringifyDict(record[1]))
+        else:
+            journal.applyRecord(pages, record)
+    def loadFile(self, fileName):
+        """Loads the show file, then replays any journal left next to it.
+        Binary shows are memory mapped and their pages built when needed"""
+        self.fileName = fileName
+        self.fixtures = Fixtures()
+        self.binary = showfile.isBinary(fileName)
+        if self.binary:
+            self.pages = showfile.BinaryPages(fileName, self.makePage)
+            journal.replay(self.pages, fileName + '.journal',
+                           self._applyRecord)
+            return
+        try:
+            fil = open(self.fileName)
+            pages = dict((page['idno'], page)
+                         for page in json.loads(fil.read()))
+            fil.close()
+        except IOError:
+            pages = dict((page.idno, page.toDict()) for page in
+                         (Page('0'),
+                          Page('blackout'),
+                          Page('hals', {'ONHALS': 100, 'OFFHALS': 100}),
+                          Page('interrupt')))
+        journal.replay(pages, fileName + '.journal')
+        self.pages = dict((idno, self.makePage(**stringifyDict(page)))
+                          for idno, page in pages.iteritems())
+    def getLights(self, transition=0, target=None):
+        """Blends the current page into the page target, by default the next
+        page"""
+        currentLights = self.currentPage.lights
+        if not transition:
+            return currentLights
+        if target is None:
+            target = self.currentPage.links['next']
+        try:
+            nextLights = self.pages[target].lights
+        except KeyError:
+            nextLights = {}
+        following = (nextLights.padded() if nextLights
+                     else bytearray(len(self.fixtures) + 1))
+        keep = 1 - transition
+        return collections.defaultdict(lambda : 0, zip(
+            self.fixtures.names,
+            [current * keep + level * transition for current, level
+             in zip(currentLights.padded(), following)]))
+    @edit
+    def toggleIntensity(self, name, idno=None):
+        page = self._getPage(idno)
+        self.history.level(page, name)
+        page.lights[name] = macro.toggleLevel(page.lights[name])
+        self._record(('l', page.idno, name, page.lights[name]))
+        self._touch()
+    @edit
+    def turnOff(self, name, idno=None):
+        page = self._getPage(idno)
+        self.history.level(page, name)
+        page.lights[name] = 0
+        self._record(('l', page.idno, name, 0))
+        self._touch()
+    @edit
+    def applyLevels(self, ops, idno=None):
+        """Applies the level ops of a compiled macro to a page in one go"""
+        page = self._getPage(idno)
+        lights = page.lights
+        records = []
+        for name, op in ops.iteritems():
+            self.history.level(page, name)
+            lights[name] = macro.applyOp(op, lights[name])
+            records.append(('l', page.idno, name, lights[name]))
+        self._record(*records)
+        self._touch()
+    @edit
+    def setLevels(self, changes):
+        """Sets levels across many pages in one edit. changes holds (page id,
+        name, level) and a level of None unsets the light"""
+        records = []
+        for idno, name, level in changes:
+            page = self.pages[idno]
+            self.history.level(page, name)
+            if level is None:
+                if name in page.lights:
+                    del page.lights[name]
+            else:
+                page.lights[name] = level
+            records.append(('l', idno, name, level))
+        self._record(*records)
+        self._touch()
+    def _getPage(self, idno):
+        if idno is None:
+            page = self.currentPage
+        else:
+            try:
+                page = self.pages[idno]
+            except KeyError:
+                assert(idno == -1)
+                page = self._createPage()
+        return page
+    def getPreview(self, idno):
+        return self._getPage(idno).lights
+    @edit
+    def delete(self):
+         previousPage = self._getPage(self.currentPage.links['previous'])
+         nextPage = self._getPage(self.currentPage.links['next'])
+         if self._cues is not None:
+             self._uncue(previousPage.idno, self.currentPage.idno,
+                         nextPage.idno)
+         self.history.links(previousPage)
+         self.history.links(nextPage)
+         previousPage.links['next'] = nextPage.idno
+         nextPage.links['previous'] = previousPage.idno
+         self.currentPage = nextPage
+         self._recordLinks(previousPage, nextPage)
+         self._touch()
+    def _uncue(self, previous, idno, following):
+        """Takes idno out of the cue list, if it sits between previous and
+        following there. Otherwise the index is rebuilt when next needed"""
+        cues = self._cues
+        try:
+            position = cues.index(idno)
+            last = self.pages[cues.at(len(cues) - 1)]
+            #A chain that loops back onto idno would carry on past it
+            if (position > 0 and cues.at(position - 1) == previous and
+                position + 1 < len(cues) and
+                cues.at(position + 1) == following and
+                last.links.get('next') != idno):
+                cues.remove(idno)
+                return
+        except KeyError:
+            pass
+        self._cues = None
+    @edit
+    def setNext(self, nextId):
+        self.history.links(self.currentPage)
+        self.currentPage.links['next'] = nextId
+        #Skipping ahead can orphan pages, so the order is worked out again
+        self._cues = None
+        self._recordLinks(self.currentPage)
+        self._touch()
+    @edit
+    def setNotes(self, notes):
+        self.history.notes(self.currentPage)
+        self.history.runTogether(('n', self.currentPage.idno))
+        self.currentPage.notes = notes
+        self._record(('n', self.currentPage.idno, notes))
+        self._touch()
+    def undo(self):
+        """Takes back the last edit, False if there is none"""
+        if not self.history.canUndo():
+            return False
+        step = self.history.undoSteps.pop()
+        self.history.redoSteps.append(self._restore(step))
+        return True
+    def redo(self):
+        """Makes the last edit undone again, False if there is none"""
+        if not self.history.canRedo():
+            return False
+        step = self.history.redoSteps.pop()
+        self.history.undoSteps.append(self._restore(step))
+        return True
+    def _restore(self, step):
+        """Applies the records of step, newest first, and returns the step
+        that reverses that"""
+        self.history.seal()
+        reverse = history.Step(step.after)
+        reverse.after = step.before
+        for record in reversed(step.records):
+            kind, idno = record[0], record[1]
+            if kind == 'l':
+                reverse.records.append(('l', idno, record[2],
+                                        self.pages[idno].lights.get(record[2])))
+            elif kind == 'k':
+                reverse.records.append(('k', idno,
+                                        dict(self.pages[idno].links)))
+            elif kind == 'n':
+                reverse.records.append(('n', idno, self.pages[idno].notes))
+            elif kind == 'd':
+                reverse.records.append(('p', self.pages[idno].toDict()))
+            elif kind == 'p':
+                reverse.records.append(('d', record[1]['idno']))
+            #The step keeps its records, the pages get copies
+            self._applyRecord(self.pages, copy.deepcopy(record))
+        reverse.records.reverse()
+        self._record(*step.records[::-1])
+        #Relinking can change the cue order anywhere
+        self._cues = None
+        if self.fadeTarget is not None and self.fadeTarget not in self.pages:
+            self.fadeTarget = None
+            self.transition = 0
+        self.currentPage = self.pages[step.before if step.before in self.pages
+                                      else '0']
+        self._touch()
+        return reverse
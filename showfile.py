@@ -0,0 +1,310 @@
+"""A compact binary show format. The file is memory mapped and pages are only
+built when they are looked at. The page index is sorted and its entries are
+all the same width, so a page is found by a binary search in the mapping.
+Loading a show reads the header and the fixture names, whatever its length.
+
+Layout, all integers little endian:
+    MAGIC
+    name count, page count, id width                (uint32 x 3)
+    names                                           (uint16 length, utf-8)
+    index, one entry per page, sorted by id         (id width bytes of utf-8
+                                                     id padded with NULs,
+                                                     uint32 row,
+                                                     uint32 info offset,
+                                                     uint32 info length)
+    levels, one row of name count bytes per page    (0-254, 255 for unset)
+    info, the rest of each page as JSON
+
+Files written before the index was sorted, with MAGIC_V1, are still read,
+by loading their whole index.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+
+MAGIC = 'LCSHOW2\n'
+MAGIC_V1 = 'LCSHOW1\n'
+UNSET = 255
+ENTRY = '<III'
+
+def isBinary(fileName):
+    try:
+        with open(fileName, 'rb') as fil:
+            return fil.read(len(MAGIC)) in (MAGIC, MAGIC_V1)
+    except IOError:
+        return False
+
+def _packString(text):
+    data = unicode(text).encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+def _encodeLevels(lights, nameIndex):
+    row = bytearray([UNSET]) * len(nameIndex)
+    for name, value in lights.iteritems():
+        if value != int(value) or not 0 <= value < UNSET:
+            raise ValueError('Level %r of %s does not fit the binary format'
+                             % (value, name))
+        row[nameIndex[name]] = int(value)
+    return row
+
+def _info(page):
+    """The parts of a page dictionary stored as JSON"""
+    return json.dumps(dict((key, value) for key, value in page.iteritems()
+                           if key not in ('idno', 'lights')))
+
+#What a page has when its dictionary leaves a key out
+DEFAULTS = {'links': {'next': -1}, 'time': -1, 'transition': None, 'notes': ''}
+
+def _sameInfo(stored, current):
+    return all(stored.get(key, DEFAULTS.get(key)) == value
+               for key, value in current.iteritems()
+               if key not in ('idno', 'lights'))
+
+def writePages(fileName, pages):
+    """Writes an iterable of page dictionaries to fileName. The pages are
+    gone through twice, so it has to be a list or something like it"""
+    names = []
+    nameIndex = {}
+    for page in pages:
+        for name in page['lights']:
+            if name not in nameIndex:
+                nameIndex[name] = len(names)
+                names.append(name)
+    ids = [unicode(page['idno']).encode('utf-8') for page in pages]
+    width = max([1] + [len(idno) for idno in ids])
+    tempName = fileName + '.tmp'
+    with open(tempName, 'wb') as fil:
+        count = len(pages)
+        fil.write(MAGIC + struct.pack('<III', len(names), count, width))
+        fil.write(''.join(_packString(name) for name in names))
+        infos = [_info(page) for page in pages]
+        offsets = [0]
+        for info in infos:
+            offsets.append(offsets[-1] + len(info))
+        for row in sorted(xrange(count), key=ids.__getitem__):
+            fil.write(ids[row].ljust(width, '\0') +
+                      struct.pack(ENTRY, row, offsets[row], len(infos[row])))
+        for page in pages:
+            fil.write(_encodeLevels(page['lights'], nameIndex))
+        for info in infos:
+            fil.write(info)
+    if os.name == 'nt' and os.path.exists(fileName):
+        os.remove(fileName)
+    os.rename(tempName, fileName)
+
+class IndexIds(object):
+    """The ids of a sorted index in the mapping, as a sequence for bisect"""
+    def __init__(self, pages):
+        self.pages = pages
+    def __len__(self):
+        return self.pages.pageCount
+    def __getitem__(self, i):
+        return self.pages._entryId(i)
+
+class BinaryPages(object):
+    """The pages of a binary show, looked up like the dictionary Show uses.
+    makePage builds a page from the keyword arguments of a page dictionary,
+    and every page built stays cached so edits to it are kept"""
+    def __init__(self, fileName, makePage):
+        self.fileName = fileName
+        self.makePage = makePage
+        self._open()
+    def _open(self):
+        self.fil = open(self.fileName, 'r+b')
+        self.map = mmap.mmap(self.fil.fileno(), 0)
+        offset = len(MAGIC)
+        if self.map[:len(MAGIC_V1)] == MAGIC_V1:
+            nameCount, self.pageCount = struct.unpack_from('<II', self.map,
+                                                           offset)
+            self.width = None
+            offset += 8
+        else:
+            nameCount, self.pageCount, self.width = struct.unpack_from(
+                '<III', self.map, offset)
+            offset += 12
+        self.names = []
+        for _ in xrange(nameCount):
+            name, offset = self._readString(offset)
+            self.names.append(name)
+        self.nameIndex = dict((name, i) for i, name in enumerate(self.names))
+        self.indexStart = offset
+        #Only files without a sorted index have it loaded
+        self.legacy = None
+        if self.width is None:
+            self.legacy = {}
+            for row in xrange(self.pageCount):
+                idno, offset = self._readString(offset)
+                self.legacy[idno] = (row,) + struct.unpack_from(
+                    '<II', self.map, offset)
+                offset += 8
+            self.legacyOrder = sorted(self.legacy)
+        else:
+            self.entrySize = self.width + struct.calcsize(ENTRY)
+            offset += self.pageCount * self.entrySize
+        self.ids = IndexIds(self)
+        self.levelsStart = offset
+        self.infoStart = offset + nameCount * self.pageCount
+        self.loaded = {}
+        #Pages added since the file was written, and file pages deleted
+        self.added = []
+        self.deleted = set()
+    removed = property(lambda self: bool(self.deleted))
+    def _readString(self, offset):
+        length, = struct.unpack_from('<H', self.map, offset)
+        offset += 2
+        return str(self.map[offset:offset + length]), offset + length
+    def _entryId(self, i):
+        if self.legacy is not None:
+            return self.legacyOrder[i]
+        start = self.indexStart + i * self.entrySize
+        return self.map[start:start + self.width].rstrip('\0')
+    def _find(self, idno):
+        """The row, info offset and info length of the page idno in the
+        file, None if it is not there"""
+        if idno in self.deleted:
+            return None
+        if self.legacy is not None:
+            return self.legacy.get(idno)
+        key = unicode(idno).encode('utf-8')
+        i = bisect.bisect_left(self.ids, key)
+        if i == self.pageCount or self._entryId(i) != key:
+            return None
+        return struct.unpack_from(ENTRY, self.map, self.indexStart +
+                                  i * self.entrySize + self.width)
+    def _row(self, row):
+        start = self.levelsStart + row * len(self.names)
+        return bytearray(self.map[start:start + len(self.names)])
+    def _pageDict(self, idno):
+        """The page as it is stored in the file"""
+        row, infoOffset, infoLength = self._find(idno)
+        start = self.infoStart + infoOffset
+        page = json.loads(self.map[start:start + infoLength])
+        page['idno'] = idno
+        page['lights'] = dict((name, level) for name, level
+                              in zip(self.names, self._row(row))
+                              if level != UNSET)
+        return page
+    def __getitem__(self, idno):
+        try:
+            return self.loaded[idno]
+        except KeyError:
+            if self._find(idno) is None:
+                raise
+        page = self.makePage(**dict((str(key), value) for key, value
+                                    in self._pageDict(idno).iteritems()))
+        self.loaded[idno] = page
+        return page
+    def __setitem__(self, idno, page):
+        if idno not in self:
+            self.added.append(idno)
+        self.loaded[idno] = page
+    def __delitem__(self, idno):
+        if idno not in self:
+            raise KeyError(idno)
+        self.loaded.pop(idno, None)
+        if idno in self.added:
+            self.added.remove(idno)
+        else:
+            #Only a rewrite takes a page out of the file
+            self.deleted.add(idno)
+    def pop(self, idno, default=None):
+        try:
+            page = self[idno]
+        except KeyError:
+            return default
+        del self[idno]
+        return page
+    def __contains__(self, idno):
+        return idno in self.loaded or self._find(idno) is not None
+    def _fileIds(self):
+        for i in xrange(self.pageCount):
+            idno = self._entryId(i)
+            if self.legacy is None:
+                idno = idno.decode('utf-8')
+                try:
+                    idno = str(idno)
+                except UnicodeEncodeError:
+                    pass
+            if idno not in self.deleted:
+                yield idno
+    def __iter__(self):
+        return iter(list(self._fileIds()) + self.added)
+    iterkeys = __iter__
+    def keys(self):
+        return list(self)
+    def __len__(self):
+        return self.pageCount - len(self.deleted) + len(self.added)
+    def itervalues(self):
+        return (self[idno] for idno in self)
+    def iteritems(self):
+        return ((idno, self[idno]) for idno in self)
+    def pageDicts(self):
+        """Yields every page as a dictionary, without building the pages that
+        were never looked at"""
+        for idno in self:
+            if idno in self.loaded:
+                yield self.loaded[idno].toDict()
+            else:
+                yield self._pageDict(idno)
+    def save(self):
+        """Writes back the pages that changed. Level edits are written into
+        the mapped file in place, anything else rewrites the file"""
+        if self.removed:
+            return self._rewrite()
+        rows = []
+        for idno, page in self.loaded.iteritems():
+            found = self._find(idno)
+            if found is None:
+                return self._rewrite()
+            stored = self._pageDict(idno)
+            current = page.toDict()
+            if not _sameInfo(stored, current):
+                return self._rewrite()
+            if stored['lights'] != dict((name, level) for name, level
+                                        in current['lights'].iteritems()):
+                try:
+                    rows.append((found[0],
+                                 _encodeLevels(current['lights'],
+                                               self.nameIndex)))
+                except (KeyError, ValueError):
+                    return self._rewrite()
+        for row, levels in rows:
+            start = self.levelsStart + row * len(self.names)
+            self.map[start:start + len(self.names)] = str(levels)
+        self.map.flush()
+    def _rewrite(self):
+        pages = list(self.pageDicts())
+        loaded = self.loaded
+        self.close()
+        writePages(self.fileName, pages)
+        self._open()
+        #Keep the pages the show is holding on to
+        self.loaded = loaded
+    def close(self):
+        self.map.close()
+        self.fil.close()
+
+def toBinary(jsonName, binaryName):
+    with open(jsonName) as fil:
+        pages = json.loads(fil.read())
+    writePages(binaryName, pages)
+
+def toJSON(binaryName, jsonName):
+    pages = BinaryPages(binaryName, None)
+    with open(jsonName, 'w') as fil:
+        fil.write(json.dumps(list(pages.pageDicts()), indent=1))
+    pages.close()
+
+def main(inName, outName):
+    """Converts a show between the JSON and binary formats"""
+    if isBinary(inName):
+        toJSON(inName, outName)
+    else:
+        toBinary(inName, outName)
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,5 @@
+"""The tests, run from the top of the repository with
+
+    python -m unittest discover -s tests -t .
+
+Tests of code that needs pygame or stackless are skipped without them."""
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import columns
+from levels import UNSET
+from show import Show
+
+class ColumnsTest(unittest.TestCase):
+    """Pages 0 to 5 in the cue list, FC at 0, 20, 40... and RS on the odd
+    pages only"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.show = Show(os.path.join(self.directory, 'show'),
+                         [('FC', 0), ('RS', 1)])
+        for i in xrange(6):
+            page = self.show.currentPage
+            page.lights['FC'] = 20 * i
+            if i % 2:
+                page.lights['RS'] = 10 * i
+            page.notes = ['open the house', 'Blue wash', 'blue special',
+                          '', 'house to half', 'ramp up'][i]
+            self.show.moveForward()
+        self.show.jump('0')
+        self.columns = self.show.columns()
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def testQueries(self):
+        self.columns.refresh()
+        self.assertEqual(self.columns.ids[:7], ['0', '1', '2', '3', '4', '5',
+                                                '6'])
+        self.assertEqual(list(self.columns.column('FC'))[:6],
+                         [0, 20, 40, 60, 80, 100])
+        self.assertEqual(list(self.columns.column('RS'))[:3], [UNSET, 10,
+                                                              UNSET])
+        self.assertEqual(self.columns.above('FC', 50), ['3', '4', '5'])
+        self.assertEqual(self.columns.above('RS', 0), ['1', '3', '5'])
+        ids = self.columns.between('4', '2')
+        self.assertEqual(ids, ['2', '3', '4'])
+        self.assertEqual(self.columns.above('FC', 50, ids), ['3', '4'])
+        self.assertEqual(list(self.columns.column('NOTHING', ids)),
+                         [UNSET] * 3)
+    def testScaleIsOneEdit(self):
+        ids = self.columns.between('1', '4')
+        self.assertEqual(self.columns.scale('RS', 50, ids), 2)
+        self.assertEqual([self.show.pages[idno].lights.get('RS')
+                          for idno in ('1', '2', '3', '5')], [5, None, 15, 50])
+        #The matrix was edited in place and agrees with the pages
+        self.assertEqual(self.columns.above('RS', 10), ['3', '5'])
+        self.assertEqual(self.columns.setLevel('FC', 30, ['0', '6']), 2)
+        self.assertEqual(self.show.pages['6'].lights['FC'], 30)
+        self.show.undo()
+        self.assertEqual(self.show.pages['6'].lights.get('FC'), None)
+        self.show.undo()
+        self.assertEqual(self.show.pages['1'].lights['RS'], 10)
+        self.assertEqual(self.columns.above('RS', 0), ['1', '3', '5'])
+        self.assertEqual(self.columns.scale('NOTHING', 50), 0)
+    def testRefreshFollowsTheShow(self):
+        self.assertEqual(self.columns.above('FC', 90), ['5'])
+        self.show.toggleIntensity('FC', '0')
+        self.assertEqual(self.columns.above('FC', 90), ['0', '5'])
+    def testFindNotes(self):
+        self.assertEqual(self.columns.find('blue'), ['1', '2'])
+        self.assertEqual(self.columns.find('hou'), ['0', '4'])
+        self.assertEqual(self.columns.find('house half'), ['4'])
+        self.assertEqual(self.columns.find('green'), [])
+        self.show.jump('3')
+        self.show.setNotes('blue again')
+        self.assertEqual(self.columns.find('blue'), ['1', '2', '3'])
+
+class TablesTest(unittest.TestCase):
+    def testTables(self):
+        above = columns.testTable(lambda level: level > 50)
+        self.assertEqual(bytearray([0, 51, 50, UNSET]).translate(above),
+                         bytearray([0, 1, 0, 0]))
+        double = columns.changeTable(lambda level: level * 2)
+        self.assertEqual(bytearray([10, 200, UNSET]).translate(double),
+                         bytearray([20, UNSET - 1, UNSET]))
+        setUnset = columns.changeTable(lambda level: 40, unset=True)
+        self.assertEqual(bytearray([UNSET]).translate(setUnset),
+                         bytearray([40]))
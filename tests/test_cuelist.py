@@ -0,0 +1,127 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import cuelist
+from show import Show
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+def chain(*ids, **extra):
+    """Page dictionaries linked one after another in the order given"""
+    pages = {}
+    for i, idno in enumerate(ids):
+        links = {'next': ids[i + 1] if i + 1 < len(ids) else -1}
+        if i:
+            links['previous'] = ids[i - 1]
+        pages[idno] = {'idno': idno, 'links': links}
+    pages.update(extra)
+    return pages
+
+class CueListTest(unittest.TestCase):
+    def testMatchesAList(self):
+        rand = random.Random(7)
+        cues = cuelist.CueList()
+        expected = []
+        for n in xrange(2000):
+            if expected and rand.random() < 0.4:
+                idno = rand.choice(expected)
+                expected.remove(idno)
+                cues.remove(idno)
+            else:
+                position = rand.randint(0, len(expected))
+                expected.insert(position, str(n))
+                cues.insert(position, str(n))
+            if n % 50 == 0:
+                self.assertEqual(list(cues), expected)
+        self.assertEqual(len(cues), len(expected))
+        for position, idno in enumerate(expected):
+            self.assertEqual(cues.index(idno), position)
+            self.assertEqual(cues.at(position), idno)
+        self.assertRaises(IndexError, cues.at, len(expected))
+        first, last = expected[0], expected[-1]
+        self.assertEqual(cues.offset(first, -3), first)
+        self.assertEqual(cues.offset(last, 3), last)
+        self.assertEqual(cues.offset(first, 2), expected[2])
+    def testInsertAfter(self):
+        cues = cuelist.CueList(chain('0', '1', '2'))
+        cues.insertAfter('1', 'i0')
+        self.assertEqual(list(cues), ['0', '1', 'i0', '2'])
+        self.assertTrue('i0' in cues)
+        self.assertFalse('3' in cues)
+
+class WalkTest(unittest.TestCase):
+    def testStopsAtALoop(self):
+        pages = chain('0', '1', '2')
+        pages['2']['links']['next'] = '1'
+        self.assertEqual(list(cuelist.walk(pages)), ['0', '1', '2'])
+    def testStopsAtAMissingPage(self):
+        pages = chain('0', '1')
+        pages['1']['links']['next'] = '7'
+        self.assertEqual(list(cuelist.walk(pages)), ['0', '1'])
+    def testCheck(self):
+        self.assertEqual(cuelist.check(chain('0', '1', 'hals')), [])
+        pages = chain('0', '1', '2',
+                      lost={'idno': 'lost', 'links': {'next': -1}},
+                      blackout={'idno': 'blackout', 'links': {}})
+        pages['1']['links']['timeout'] = 'gone'
+        pages['2']['links']['next'] = '0'
+        self.assertEqual(sorted(cuelist.check(pages)),
+                         ['1: timeout link to missing page gone',
+                          '2: next link loops back to 0',
+                          'lost: orphan page'])
+
+class ShowCuesTest(unittest.TestCase):
+    def testIndexFollowsTheEdits(self):
+        directory = tempfile.mkdtemp()
+        try:
+            show = Show(os.path.join(directory, 'show'), [])
+            rand = random.Random(3)
+            edits = [show.moveForward, show.moveForward, show.moveBack,
+                     show.interrupt, show.delete]
+            for _ in xrange(300):
+                edit = rand.choice(edits)
+                #Interrupting the last page has no next page to link up
+                if (edit == show.interrupt and
+                    show.currentPage.links['next'] == -1):
+                    continue
+                edit()
+                self.assertEqual(list(show.cues()),
+                                 list(cuelist.walk(show.pages)))
+        finally:
+            shutil.rmtree(directory)
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class PreviewOffsetTest(unittest.TestCase):
+    def testPreviewStepsAlongTheCues(self):
+        import controller
+        directory = tempfile.mkdtemp()
+        try:
+            show = Show(os.path.join(directory, 'show'), [])
+            for _ in xrange(8):
+                show.moveForward()
+            show.jump('3')
+            order = list(cuelist.walk(show.pages))
+            preview = controller.PreviewModel(
+                show, lambda currentPage: currentPage.links['next'])
+            for depth in xrange(-6, 10):
+                preview.depth = depth
+                expected = order[max(0, min(len(order) - 1, 4 + depth))]
+                self.assertEqual(preview.getID(), expected)
+            #A page off the cue list walks its own links
+            show.pages['interrupt'].links['next'] = '7'
+            interrupt = controller.PreviewModel(show, lambda _: 'interrupt')
+            interrupt.adjustDepth(1)
+            self.assertEqual(interrupt.getID(), '7')
+            interrupt.adjustDepth(1)
+            self.assertEqual(interrupt.getID(), '8')
+            interrupt.resetDepth()
+            self.assertEqual(interrupt.getID(), 'interrupt')
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,67 @@
+import unittest
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+class Event(object):
+    def __init__(self, type, **attributes):
+        self.type = type
+        self.__dict__.update(attributes)
+
+class FakeController(object):
+    """Notes the clicks, key presses and releases it is given"""
+    def __init__(self, keys=()):
+        self.calls = []
+        self.keys = keys
+    def click(self, event):
+        self.calls.append(('click', event.pos))
+        return True
+    def press(self, event):
+        self.calls.append(('press', event.key))
+    def release(self):
+        self.calls.append(('release',))
+    def refreshOutput(self):
+        pass
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        import controller
+        self.stage = FakeController(keys=(pygame.K_b,))
+        self.notes = FakeController()
+        self.dispatcher = controller.Dispatcher()
+        self.dispatcher.addRegion((0, 0, 480, 480), self.stage)
+        self.dispatcher.addRegion((480, 320, 160, 160), self.notes,
+                                  capture=True)
+        self.dispatcher.addKeys(self.stage)
+    def send(self, *events):
+        self.dispatcher.updateEvents(lambda: events)
+    def click(self, pos):
+        return Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1)
+    def key(self, key):
+        return Event(pygame.KEYDOWN, key=key, unicode=u'')
+    def testClicksGoToTheirRegion(self):
+        self.send(self.click((10, 10)), self.click((600, 400)),
+                  self.click((600, 10)))
+        self.assertEqual(self.stage.calls, [('click', (10, 10))])
+        self.assertEqual(self.notes.calls, [('click', (600, 400)),
+                                            ('release',)])
+    def testCaptureTakesTheKeyboard(self):
+        self.send(self.click((600, 400)), self.key(pygame.K_b))
+        self.assertEqual(self.notes.calls, [('click', (600, 400)),
+                                            ('press', pygame.K_b)])
+        self.assertEqual(self.stage.calls, [])
+    def testClickAwayOnlyEndsTheCapture(self):
+        self.send(self.click((600, 400)), self.click((10, 10)))
+        self.assertEqual(self.notes.calls, [('click', (600, 400)),
+                                            ('release',)])
+        self.assertEqual(self.stage.calls, [])
+        self.send(self.click((10, 10)), self.key(pygame.K_b))
+        self.assertEqual(self.stage.calls, [('click', (10, 10)),
+                                            ('press', pygame.K_b)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import unittest
+
+import dmx
+
+def frame(size, start=0):
+    return bytearray((start + i) % 256 for i in xrange(size))
+
+class PortsTest(unittest.TestCase):
+    def testParsePorts(self):
+        self.assertEqual(dmx.parsePorts('COM26,artnet'),
+                         [(0, 'COM26'), (1, 'artnet')])
+        self.assertEqual(dmx.parsePorts('2=sacn:10.0.0.1:5569,0=file:out'),
+                         [(2, 'sacn:10.0.0.1:5569'), (0, 'file:out')])
+    def testMulticastGroup(self):
+        self.assertEqual(dmx.multicastGroup(0), '239.255.0.1')
+        self.assertEqual(dmx.multicastGroup(511), '239.255.2.0')
+    def testUniversePastTheFrame(self):
+        self.assertRaises(ValueError, dmx.Sender, '0=,1=', 512)
+
+class EnttecTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'out')
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def read(self):
+        with open(self.fileName, 'rb') as fil:
+            return bytearray(fil.read())
+    def testFraming(self):
+        sender = dmx.Sender('file:' + self.fileName, 24)
+        self.assertEqual(sender.send(frame(24), 0.0), 1)
+        sender.close()
+        data = self.read()
+        self.assertEqual(data[:4], bytearray([126, 6]) + struct.pack('<H', 25))
+        self.assertEqual(data[4], 0)
+        self.assertEqual(data[5:29], frame(24))
+        self.assertEqual(data[29:], bytearray([231]))
+    def testOnlyChangesAndKeepAlivesAreSent(self):
+        sender = dmx.Sender('file:' + self.fileName, 24, keepAlive=1.0)
+        self.assertEqual(sender.send(frame(24), 0.0), 1)
+        self.assertEqual(sender.send(frame(24), 0.5), 0)
+        self.assertEqual(sender.send(frame(24, 1), 0.6), 1)
+        self.assertEqual(sender.send(frame(24, 1), 1.6), 1)
+        sender.close()
+        self.assertEqual(len(self.read()), 3 * 30)
+    def testShortFrameIsPaddedDark(self):
+        sender = dmx.Sender('file:' + self.fileName, 24)
+        sender.send(frame(10, 1), 0.0)
+        sender.close()
+        self.assertEqual(self.read()[5:29], frame(10, 1) + bytearray(14))
+
+class UDPCase(object):
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.receiver.settimeout(5)
+        self.port = self.receiver.getsockname()[1]
+    def tearDown(self):
+        self.receiver.close()
+    def receive(self, ports, frames, size=1024):
+        sender = dmx.Sender(ports % self.port, size)
+        packets = []
+        try:
+            for i, each in enumerate(frames):
+                count = sender.send(each, float(i))
+                packets.extend(bytearray(self.receiver.recv(2048))
+                               for _ in xrange(count))
+        finally:
+            sender.close()
+        return packets
+
+class ArtNetTest(UDPCase, unittest.TestCase):
+    def testFraming(self):
+        first, second = self.receive('1=artnet:127.0.0.1:%d',
+                                     [frame(1024), frame(1024, 5)])
+        self.assertEqual(len(first), 18 + 512)
+        self.assertEqual(str(first[:8]), 'Art-Net\0')
+        self.assertEqual(struct.unpack('<H', str(first[8:10]))[0], 0x5000)
+        self.assertEqual(struct.unpack('>H', str(first[10:12]))[0], 14)
+        self.assertEqual((first[12], second[12]), (1, 2))
+        self.assertEqual(struct.unpack('<H', str(first[14:16]))[0], 1)
+        self.assertEqual(struct.unpack('>H', str(first[16:18]))[0], 512)
+        self.assertEqual(first[18:], frame(1024)[512:])
+        self.assertEqual(second[18:], frame(1024, 5)[512:])
+    def testSequenceSkipsZero(self):
+        packet = dmx.ArtNetPacket(0, 512, None, None)
+        for _ in xrange(255):
+            packet.prepare()
+        self.assertEqual(packet.buffer[12], 255)
+        packet.prepare()
+        self.assertEqual(packet.buffer[12], 1)
+
+class SACNTest(UDPCase, unittest.TestCase):
+    def testFraming(self):
+        first, second = self.receive('0=sacn:127.0.0.1:%d',
+                                     [frame(1024), frame(1024, 9)])
+        self.assertEqual(len(first), 126 + 512)
+        self.assertEqual(str(first[4:16]), 'ASC-E1.17\0\0\0')
+        #The flags and length of the root, framing and DMP layers
+        self.assertEqual(struct.unpack('>H', str(first[16:18]))[0],
+                         0x7000 | (len(first) - 16))
+        self.assertEqual(struct.unpack('>H', str(first[38:40]))[0],
+                         0x7000 | (len(first) - 38))
+        self.assertEqual(struct.unpack('>H', str(first[115:117]))[0],
+                         0x7000 | (len(first) - 115))
+        self.assertEqual(first[108], 100)
+        self.assertEqual((first[111], second[111]), (1, 2))
+        self.assertEqual(struct.unpack('>H', str(first[113:115]))[0], 1)
+        self.assertEqual(struct.unpack('>H', str(first[123:125]))[0], 513)
+        self.assertEqual(first[125], 0)
+        self.assertEqual(first[126:], frame(1024)[:512])
+        self.assertEqual(second[126:], frame(1024, 9)[:512])
@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import effects
+from patch import Patch
+
+EFFECTS = [{'name': 'chase', 'kind': 'chase', 'fixtures': ['FC', 'FIL', 'FIR'],
+            'period': 1.5, 'width': 1},
+           {'name': 'sweep', 'kind': 'ramp', 'fixtures': ['FIL', 'FIR'],
+            'period': 1}]
+
+class EffectsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        fileName = os.path.join(self.directory, 'show.effects')
+        with open(fileName, 'w') as fil:
+            fil.write(json.dumps(EFFECTS))
+        self.now = 0.0
+        self.refreshes = []
+        self.engine = effects.EffectEngine(
+            Patch([('FC', 0), ('FIL', 1), ('FIR', 2)]),
+            lambda: self.refreshes.append(True), rate=10,
+            effects=effects.load(fileName), clock=lambda: self.now)
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def testLoadKeepsTheNames(self):
+        self.assertEqual([effect.name for effect in self.engine.effects],
+                         ['chase', 'sweep'])
+        self.assertEqual(self.engine.effects[0].fixtures, ['FC', 'FIL', 'FIR'])
+        self.assertEqual(sorted(self.engine.tables), ['chase', 'sweep'])
+    def testToggleIndexRunsThatEffect(self):
+        self.assertEqual(self.engine.frame(), None)
+        self.engine.toggleIndex(0)
+        self.assertEqual(self.engine.running.keys(), ['chase'])
+        #One fixture at a time steps along the group
+        self.assertEqual(list(self.engine.frame(0.0)[:3]), [255, 0, 0])
+        self.assertEqual(list(self.engine.frame(0.5)[:3]), [0, 255, 0])
+        self.assertEqual(list(self.engine.frame(1.0)[:3]), [0, 0, 255])
+        self.engine.toggleIndex(1)
+        self.assertEqual(sorted(self.engine.running), ['chase', 'sweep'])
+        self.assertEqual(list(self.engine.frame(0.2)[:3]), [255, 51, 178])
+        self.engine.toggleIndex(0)
+        self.assertEqual(self.engine.running.keys(), ['sweep'])
+        self.assertEqual(self.refreshes, [True])
+        self.engine.toggleIndex(5)
+        self.assertEqual(self.engine.running.keys(), ['sweep'])
+    def testApplyMergesHighest(self):
+        self.engine.toggle('chase')
+        frame = bytearray(24)
+        frame[1] = 100
+        self.assertEqual(list(self.engine.apply(frame, 0.0)[:3]),
+                         [255, 100, 0])
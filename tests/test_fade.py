@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import fade
+from show import Show
+
+class FadeEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.show = Show(os.path.join(self.directory, 'show'),
+                         [('CC', 0), ('FC', 1)])
+        self.show.currentPage.lights['CC'] = 100
+        self.show.moveForward()
+        self.show.currentPage.lights['CC'] = 0
+        self.show.currentPage.transition = 2.0
+        self.show.moveBack()
+        self.writes = []
+        self.fades = fade.FadeEngine(self.show,
+                                     lambda: self.writes.append(True))
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def level(self):
+        return self.fades.frameNow()[0]
+    def testFadeRunsToTheNextCue(self):
+        self.fades.go()
+        self.fades.tick(10.0)
+        self.fades.tick(11.0)
+        self.assertAlmostEqual(self.level(), 127.5)
+        self.assertEqual(self.show.transition, 0.5)
+        self.fades.tick(12.0)
+        self.assertEqual(self.level(), 0)
+        self.assertEqual(self.show.currentPage.idno, '1')
+        self.assertEqual(self.show.fadeTarget, None)
+    def testJumpDropsTheFade(self):
+        self.fades.go()
+        self.fades.tick(10.0)
+        self.fades.tick(10.5)
+        self.show.jump('0')
+        self.assertEqual(self.level(), 255)
+        self.fades.tick(11.0)
+        self.assertEqual(self.fades.fades, [])
+        self.assertEqual(self.level(), 255)
+    def testUndoDropsTheFade(self):
+        self.show.jump('1')
+        #Goes on to 2 and adds 3 after it, which undo takes away again
+        self.show.moveForward()
+        self.show.pages['3'].transition = 2.0
+        self.show.pages['3'].lights['CC'] = 100
+        self.fades.go('3')
+        self.fades.tick(10.0)
+        self.fades.tick(10.5)
+        self.show.undo()
+        self.assertEqual(self.show.fadeTarget, None)
+        self.fades.tick(11.0)
+        self.assertEqual(list(self.fades.frameNow()),
+                         list(self.show.makeList()))
+    def testGoDuringAFadeStartsFromTheStage(self):
+        self.show.pages['1'].transition = 2.5
+        self.show.pages['1'].lights['FC'] = 100
+        following = self.show.pages['2']
+        following.transition = 1.0
+        following.lights['CC'] = 100
+        #Where the first fade has got FC to when the second one starts
+        following.lights['FC'] = 40
+        self.fades.go()
+        self.fades.tick(10.0)
+        self.fades.tick(11.0)
+        self.assertEqual(list(self.fades.frameNow()[:2]), [153, 102])
+        self.fades.go()
+        self.assertEqual(self.show.fadeTarget, '2')
+        self.assertEqual(list(self.fades.frameNow()[:2]), [153, 102])
+        self.fades.tick(11.0)
+        self.fades.tick(11.5)
+        self.assertEqual(list(self.fades.frameNow()[:2]), [204, 102])
+        self.fades.tick(12.0)
+        self.assertEqual(self.show.currentPage.idno, '2')
+        self.assertEqual(list(self.fades.frameNow()[:2]), [255, 102])
+    def testTimedPageFollowsItsTimeout(self):
+        page = self.show.currentPage
+        page.fullTime = page.time = 1.0
+        page.links['timeout'] = '1'
+        self.fades.tick(10.0)
+        self.fades.tick(10.5)
+        self.assertEqual(self.show.fadeTarget, None)
+        self.fades.tick(11.5)
+        self.assertEqual(self.show.fadeTarget, '1')
+
+if __name__ == '__main__':
+    unittest.main()
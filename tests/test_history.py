@@ -0,0 +1,75 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from show import Show
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.show = Show(os.path.join(self.directory, 'show'),
+                         [('CC', 0), ('FC', 1)], undoDepth=1000)
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def snapshot(self):
+        return self.show._pageDicts()
+    def randomEdit(self, rand):
+        show = self.show
+        edit = rand.randrange(7)
+        if edit == 0:
+            show.moveForward()
+        elif edit == 1:
+            show.toggleIntensity(rand.choice(('CC', 'FC')))
+        elif edit == 2:
+            show.turnOff('FC')
+        elif edit == 3:
+            show.setNotes(show.currentPage.notes + rand.choice('ab '))
+        elif edit == 4 and show.currentPage.links['next'] != -1:
+            show.interrupt()
+        elif edit == 5 and show.currentPage.idno != '0':
+            show.delete()
+        elif edit == 6:
+            show.setLevels([(idno, 'CC', rand.choice((None, 10, 200)))
+                            for idno in rand.sample(sorted(show.pages), 3)])
+    def testUndoAndRedoGoThroughEveryEdit(self):
+        rand = random.Random(5)
+        show = self.show
+        snapshots = [self.snapshot()]
+        for _ in xrange(200):
+            steps = len(show.history.undoSteps)
+            self.randomEdit(rand)
+            if len(show.history.undoSteps) > steps:
+                snapshots.append(self.snapshot())
+            else:
+                #Nothing changed, or the notes ran into the last edit
+                snapshots[-1] = self.snapshot()
+        self.assertEqual(len(snapshots), len(show.history.undoSteps) + 1)
+        for expected in reversed(snapshots[:-1]):
+            self.assertTrue(show.undo())
+            self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(show.undo())
+        for expected in snapshots[1:]:
+            self.assertTrue(show.redo())
+            self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(show.redo())
+    def testEditClearsRedo(self):
+        self.show.toggleIntensity('CC')
+        self.show.undo()
+        self.assertTrue(self.show.history.canRedo())
+        self.show.toggleIntensity('FC')
+        self.assertFalse(self.show.history.canRedo())
+    def testNotesRunTogether(self):
+        before = self.snapshot()
+        for letter in 'cue':
+            self.show.setNotes(self.show.currentPage.notes + letter)
+        self.assertEqual(len(self.show.history.undoSteps), 1)
+        self.show.undo()
+        self.assertEqual(self.snapshot(), before)
+    def testDepth(self):
+        show = Show(os.path.join(self.directory, 'short'), [('CC', 0)],
+                    undoDepth=3)
+        for _ in xrange(5):
+            show.toggleIntensity('CC')
+        self.assertEqual(sum(show.undo() for _ in xrange(5)), 3)
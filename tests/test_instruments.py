@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import instruments
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+class FakePort(object):
+    """An output process that says which frame it sent last, and when"""
+    class Sequence(object):
+        value = 0
+    def __init__(self, clock):
+        self.clock = clock
+        self.sequence = self.Sequence()
+        self.sent = (0, 0.0)
+    def write(self, data):
+        self.clock.now += 0.002
+        self.sequence.value += 1
+    def lastSent(self):
+        return self.sent
+    def stats(self):
+        return {'sent': 3, 'dropped': 1, 'late': 0}
+    def report(self):
+        return '3 sent 1 coalesced 0 late'
+
+class InstrumentsTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.timings = instruments.Instruments(size=4, clock=self.clock)
+    def testStagesAreTimed(self):
+        def slow(seconds):
+            self.clock.now += seconds
+            return seconds
+        timed = self.timings.timed('draw', slow)
+        for milliseconds in (1, 2, 3, 4, 30):
+            self.assertEqual(timed(milliseconds / 1000.0),
+                             milliseconds / 1000.0)
+        summary = self.timings.summary()['draw']
+        self.assertEqual(summary['count'], 5)
+        #The ring only keeps the last four, the worst and mean are of all
+        self.assertAlmostEqual(summary['p50'], 4)
+        self.assertAlmostEqual(summary['max'], 30)
+        self.assertAlmostEqual(summary['mean'], 8)
+        self.assertEqual(summary['histogram']['<1'], 1)
+        self.assertEqual(summary['histogram']['<50'], 1)
+        self.assertEqual(sum(summary['histogram'].values()), 5)
+    def testInputToWireLatency(self):
+        port = FakePort(self.clock)
+        self.timings.wrapOutput(port)
+        self.timings.inputTime = 1.0
+        self.clock.now = 1.01
+        port.write('frame')
+        self.assertEqual(list(self.timings.pending), [(1, 1.0)])
+        #A frame written with no input waiting is not timed
+        port.write('frame')
+        port.sent = (2, 1.05)
+        self.timings.poll()
+        self.assertEqual(list(self.timings.pending), [])
+        wire = self.timings.summary()['input to wire']
+        self.assertAlmostEqual(wire['max'], 50)
+        self.assertEqual(self.timings.summary()['input to write']['count'], 1)
+        self.assertEqual(self.timings.summary()['write']['count'], 2)
+        lines = self.timings.lines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('write'))
+        self.assertEqual(lines[-1], 'output 3 sent 1 coalesced 0 late')
+    def testDump(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'timings.jsonl')
+            self.timings.wrapOutput(FakePort(self.clock))
+            dump = instruments.Dump(self.timings, fileName)
+            dump()
+            dump()
+            dump.close()
+            with open(fileName) as fil:
+                records = [json.loads(line) for line in fil]
+            self.assertEqual(len(records), 2)
+            self.assertEqual(sorted(records[0]['stages']),
+                             ['input to write', 'write'])
+            self.assertEqual(records[0]['output']['dropped'], 1)
+        finally:
+            shutil.rmtree(directory)
+
+class Ticks(object):
+    """Stands in for pygame.time"""
+    def __init__(self):
+        self.ticks = 0
+    def get_ticks(self):
+        return self.ticks
+
+class Stage(object):
+    drawnState = 'stage'
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class InstrumentViewTest(unittest.TestCase):
+    def testOverlayRefreshesAtItsInterval(self):
+        import controller
+        clock = Clock()
+        timings = instruments.Instruments(clock=clock)
+        stage = Stage()
+        view = controller.InstrumentView(timings, stage)
+        ticks = Ticks()
+        time = getattr(pygame, 'time', None)
+        pygame.time = ticks
+        try:
+            self.assertFalse(view.isDirty())
+            view.toggle()
+            self.assertTrue(view.isDirty())
+            view.drawnState = view.state()
+            self.assertEqual(view.lines, ())
+            timings.stage('draw').add(0.004)
+            ticks.ticks = 200
+            self.assertFalse(view.isDirty())
+            ticks.ticks = 600
+            self.assertTrue(view.isDirty())
+            self.assertTrue(view.lines[0].startswith('draw'))
+            view.drawnState = view.state()
+            #A redrawn stage covers the overlay, so it is drawn again
+            stage.drawnState = 'redrawn'
+            self.assertTrue(view.isDirty())
+            view.toggle()
+            self.assertEqual(stage.drawnState, None)
+            self.assertEqual(view.state(), None)
+        finally:
+            if time is None:
+                del pygame.time
+            else:
+                pygame.time = time
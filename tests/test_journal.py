@@ -0,0 +1,85 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import journal
+import showfile
+from show import Show
+
+FOLK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'folk.lst')
+
+def crash(show):
+    """Stops the journal's writer the way a crash would, with no checkpoint"""
+    show.journal.queue.put(None)
+    show.journal.thread.join()
+
+class ApplyRecordTest(unittest.TestCase):
+    def testRecordsSetState(self):
+        pages = {'0': {'idno': '0', 'lights': {'FC': 10}, 'links': {}}}
+        records = [('l', '0', 'FC', 50),
+                   ('l', '0', 'FC', None),
+                   ('n', '0', 'hello'),
+                   ('p', {'idno': '1', 'lights': {}, 'links': {}}),
+                   ('k', '0', {'next': '1'}),
+                   ('d', '1')]
+        for record in records + records:
+            journal.applyRecord(pages, record)
+        self.assertEqual(pages, {'0': {'idno': '0', 'lights': {},
+                                       'links': {'next': '1'},
+                                       'notes': 'hello'}})
+    def testUnknownRecord(self):
+        self.assertRaises(ValueError, journal.applyRecord, {}, ('x', '0'))
+
+class RecoveryCase(object):
+    """Edits a show with autosave on, crashes, and loads it again"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'folk')
+        self.write()
+        self.show = Show(self.fileName, [], autosave=True)
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def edit(self):
+        show = self.show
+        show.toggleIntensity('FC')
+        show.setNotes('after the crash')
+        show.moveForward()
+        show.turnOff('FC')
+        show.setNext('0')
+    def reload(self):
+        self.show = Show(self.fileName, [])
+        return self.show._pageDicts()
+    def testEditsAreRecovered(self):
+        self.edit()
+        expected = self.show._pageDicts()
+        crash(self.show)
+        self.assertTrue(os.path.getsize(self.fileName + '.journal'))
+        self.assertEqual(self.reload(), expected)
+        self.show.close()
+    def testRecordCutShortEndsTheReplay(self):
+        self.show.toggleIntensity('FC')
+        expected = self.show._pageDicts()
+        crash(self.show)
+        with open(self.fileName + '.journal', 'a') as fil:
+            fil.write(json.dumps(('n', '0', 'half written'))[:-4])
+        self.assertEqual(self.reload(), expected)
+        self.show.close()
+    def testCheckpointEmptiesTheJournal(self):
+        self.edit()
+        expected = self.show._pageDicts()
+        self.show.save()
+        self.show.close()
+        self.assertEqual(os.path.getsize(self.fileName + '.journal'), 0)
+        self.assertEqual(self.reload(), expected)
+        self.show.close()
+
+class JSONRecoveryTest(RecoveryCase, unittest.TestCase):
+    def write(self):
+        shutil.copy(FOLK, self.fileName)
+
+class BinaryRecoveryTest(RecoveryCase, unittest.TestCase):
+    def write(self):
+        showfile.toBinary(FOLK, self.fileName)
@@ -0,0 +1,127 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import layers
+from show import Show
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+def naiveMerge(base, stacked, master, size):
+    """What the stack should give, merged from scratch channel by channel"""
+    merged = list(base) + [0] * (size - len(base))
+    for name, priority, mode, frame, channels in sorted(
+            stacked, key=lambda layer: layer[1]):
+        if frame is None:
+            continue
+        frame = list(frame) + [0] * (size - len(frame))
+        for i in xrange(size):
+            if mode == layers.HTP:
+                merged[i] = max(merged[i], frame[i])
+            elif channels is None or i in channels:
+                merged[i] = frame[i]
+    return bytearray(value * master / 100 for value in merged)
+
+class StackTest(unittest.TestCase):
+    def testMatchesANaiveMerge(self):
+        rand = random.Random(11)
+        size = 16
+        stack = layers.Stack(size, layers.CONSOLE)
+        state = dict((name, [name, priority, mode, None, None])
+                     for name, priority, mode in layers.CONSOLE)
+        master = 100
+        base = bytearray(size)
+        def randomFrame():
+            return bytearray(rand.randrange(256)
+                             for _ in xrange(rand.choice((size, size - 3))))
+        for _ in xrange(500):
+            action = rand.randrange(5)
+            name = rand.choice(state.keys())
+            if action == 0:
+                frame = randomFrame()
+                channels = (set(rand.sample(xrange(size), 5))
+                            if rand.random() < 0.7 else None)
+                stack.set(name, frame, channels)
+                state[name][3:] = [frame, channels]
+            elif action == 1:
+                stack.clear(name)
+                state[name][3:] = [None, None]
+            elif action == 2:
+                master = rand.choice((0, 40, 100, 100))
+                stack.setMaster(master)
+            elif action == 3:
+                base = randomFrame()
+            self.assertEqual(stack.frame(base),
+                             naiveMerge(base, state.values(), master, size))
+            self.assertEqual(sorted(stack.state()[0]),
+                             sorted(name for name, layer in state.iteritems()
+                                    if layer[3] is not None))
+    def testOrderOfPriority(self):
+        stack = layers.Stack(2)
+        stack.add('top', 20, layers.LTP)
+        stack.add('bottom', 10, layers.HTP)
+        stack.set('bottom', bytearray([200, 200]))
+        stack.set('top', bytearray([5, 5]), [1])
+        self.assertEqual(stack.frame(bytearray([100, 100])),
+                         bytearray([200, 5]))
+    def testUnchangedFrameIsNotMergedAgain(self):
+        stack = layers.Stack(8, layers.CONSOLE)
+        stack.set('hals', bytearray([9] * 8))
+        short = bytearray([1, 2, 3])
+        merged = stack.frame(short)
+        self.assertTrue(stack.frame(bytearray(short)) is merged)
+        short[0] = 50
+        self.assertEqual(list(stack.frame(short)), [50] + [9] * 7)
+    def testBadMode(self):
+        self.assertRaises(ValueError, layers.Stack(1).add, 'x', 1, 'mix')
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class ConsoleLayersTest(unittest.TestCase):
+    def setUp(self):
+        import controller
+        self.directory = tempfile.mkdtemp()
+        self.show = Show(os.path.join(self.directory, 'show'),
+                         [('CC', 0), ('FC', 1), ('ONHALS', 2)])
+        self.show.currentPage.lights['CC'] = 100
+        self.show.currentPage.lights['FC'] = 50
+        self.show.pages['interrupt'].lights['CC'] = 20
+        self.main = controller.MainController(None, self.show,
+                                              controller.MacroRecorder(),
+                                              None)
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def frame(self, page=None):
+        return str(self.show.makeList(page))
+    def testInterruptTakesOnlyItsFixtures(self):
+        cue = bytearray(self.frame())
+        self.main.interrupt()
+        merged = bytearray(self.main.makeList())
+        interrupt = self.show.makeList(self.show.pages['interrupt'])
+        self.assertEqual(merged[0], interrupt[0])
+        self.assertEqual(merged[1:], cue[1:])
+        self.main.interrupt()
+        self.assertEqual(self.main.makeList(), self.frame())
+    def testHalsFollowEdits(self):
+        self.main.hals()
+        self.assertEqual(bytearray(self.main.makeList())[2], 255)
+        self.show.pages['hals'].lights['ONHALS'] = 0
+        self.show._touch()
+        self.assertEqual(self.main.makeList(), self.frame())
+    def testBlackoutKeepsTheMaster(self):
+        self.main.setMaster(50)
+        half = self.main.makeList()
+        self.main.blackout()
+        self.assertEqual(self.main.makeList(), '\0' * len(half))
+        self.main.blackout()
+        self.assertEqual(self.main.makeList(), half)
+    def testHoldAndRelease(self):
+        self.main.hold('FC', 100)
+        self.assertEqual(bytearray(self.main.makeList())[1], 255)
+        self.main.release('FC')
+        self.assertEqual(self.main.makeList(), self.frame())
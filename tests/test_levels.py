@@ -0,0 +1,66 @@
+import collections
+import unittest
+
+import patch
+from levels import UNSET, Fixtures, Levels
+from show import Page
+
+class LevelsTest(unittest.TestCase):
+    def setUp(self):
+        self.fixtures = Fixtures()
+        self.levels = Levels(bytearray(), self.fixtures)
+    def testActsLikeADictionary(self):
+        levels = self.levels
+        levels['FC'] = 40
+        levels.update({'RS': 100, 'BC': 0})
+        self.assertEqual(levels['FC'], 40)
+        self.assertEqual(levels['NOTHING'], 0)
+        self.assertFalse('NOTHING' in levels)
+        self.assertEqual(levels.get('NOTHING', 7), 7)
+        self.assertEqual(levels.copy(), {'FC': 40, 'RS': 100, 'BC': 0})
+        self.assertEqual(len(levels), 3)
+        del levels['RS']
+        self.assertRaises(KeyError, levels.__delitem__, 'RS')
+        self.assertEqual(sorted(levels), ['BC', 'FC'])
+        self.assertEqual(levels, {'FC': 40, 'BC': 0})
+    def testLevelsMustFitAByte(self):
+        self.assertRaises(ValueError, self.levels.__setitem__, 'FC', UNSET)
+        self.assertRaises(ValueError, self.levels.__setitem__, 'FC', 2.5)
+        self.assertRaises(ValueError, self.levels.update, {'FC': -1})
+        self.assertEqual(len(self.levels), 0)
+    def testPagesShareTheFixtureTable(self):
+        first = Page('0', {'FC': 10}, fixtures=self.fixtures)
+        second = Page('1', {'RS': 20, 'FC': 30}, fixtures=self.fixtures)
+        self.assertEqual(self.fixtures.names, ['FC', 'RS'])
+        #The first page's row is not grown until it sets a new fixture
+        self.assertEqual(first.row, bytearray([10]))
+        self.assertEqual(list(first.lights.padded()), [10, 0, 0])
+        self.assertEqual(second.toDict()['lights'], {'RS': 20, 'FC': 30})
+
+class RowFramesTest(unittest.TestCase):
+    def testFramesFollowTheRowsAndTheTable(self):
+        compiled = patch.Patch([('FC', 0), ('RS', 1), ('BC', 2)])
+        fixtures = Fixtures()
+        page = Page('0', {'FC': 100}, fixtures=fixtures)
+        self.assertEqual(list(compiled.frame(page.lights)[:3]), [255, 0, 0])
+        self.assertEqual(len(compiled.rowFrames), 1)
+        #The same row again comes from the cache, as a copy
+        frame = compiled.frame(page.lights)
+        frame[0] = 1
+        self.assertEqual(compiled.frame(page.lights)[0], 255)
+        self.assertEqual(len(compiled.rowFrames), 1)
+        #A fixture added to the table moves where the names are read from
+        other = Page('1', {'BC': 100, 'RS': 50}, fixtures=fixtures)
+        self.assertEqual(list(compiled.frame(other.lights)[:3]),
+                         [0, 127, 255])
+        page.lights['RS'] = 50
+        self.assertEqual(list(compiled.frame(page.lights)[:3]),
+                         [255, 127, 0])
+        self.assertEqual(compiled.frame(page.lights),
+                         compiled.frame(collections.defaultdict(
+                             int, page.lights.copy())))
+        #The same row over another show's table is another frame
+        elsewhere = Page('0', {'BC': 100}, fixtures=Fixtures())
+        self.assertEqual(elsewhere.row, bytearray([100]))
+        self.assertEqual(list(compiled.frame(elsewhere.lights)[:3]),
+                         [0, 0, 255])
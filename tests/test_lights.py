@@ -0,0 +1,63 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import lights
+
+def bruteForce(structure, point):
+    return [i for i, (pos, radius, _) in enumerate(structure)
+            if lights.chkCircle(pos, radius, point)]
+
+class LightStructureTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'rig.lst')
+        rand = random.Random(2)
+        with open(self.fileName, 'w') as fil:
+            for i in xrange(300):
+                fil.write('%d,%d,%d,L%d\n' % (rand.randint(0, 480),
+                                              rand.randint(0, 480),
+                                              rand.randint(5, 80), i))
+        self.structure = lights.LightStructure(self.fileName)
+        self.rand = rand
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def assertMatchesBruteForce(self):
+        for _ in xrange(300):
+            point = (self.rand.randint(-20, 500), self.rand.randint(-20, 500))
+            self.assertEqual(list(self.structure.getPointIndices(point)),
+                             bruteForce(self.structure, point))
+    def testLookUp(self):
+        self.assertEqual(len(self.structure.names), 300)
+        self.assertMatchesBruteForce()
+    def testIndexFollowsEdits(self):
+        for _ in xrange(50):
+            self.structure.append((self.rand.randint(0, 480),
+                                   self.rand.randint(0, 480)))
+        self.structure.deleteIndices(self.rand.sample(xrange(350), 120))
+        self.assertEqual(len(self.structure.pos), 230)
+        self.assertMatchesBruteForce()
+        self.structure.save()
+        self.structure = lights.LightStructure(self.fileName)
+        self.assertMatchesBruteForce()
+    def testGetNameStopsAtTheFirstHit(self):
+        structure = self.structure
+        point = next(structure.pos[i] for i in xrange(300)
+                     if len(bruteForce(structure, structure.pos[i])) > 2)
+        first = bruteForce(structure, point)[0]
+        tested = []
+        chkCircle = lights.chkCircle
+        def counted(*args):
+            tested.append(args)
+            return chkCircle(*args)
+        lights.chkCircle = counted
+        try:
+            self.assertEqual(structure.getName(point), structure.names[first])
+        finally:
+            lights.chkCircle = chkCircle
+        cell = structure.cells[(point[0] // lights.CELL,
+                                point[1] // lights.CELL)]
+        self.assertEqual(len(tested), cell.index(first) + 1)
+        self.assertEqual(structure.getName((-500, -500)), False)
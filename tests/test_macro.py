@@ -0,0 +1,111 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import macro
+from show import Show
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+NAMES = ('FC', 'RS', 'BC')
+
+class MacroTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def makeShow(self, name):
+        show = Show(os.path.join(self.directory, name),
+                    [(fixture, i) for i, fixture in enumerate(NAMES)])
+        show.currentPage.lights['RS'] = 60
+        return show
+    def testCompiledLevelsMatchTheRecordedCalls(self):
+        rand = random.Random(8)
+        for _ in xrange(50):
+            calls = [('show', rand.choice(macro.LEVEL_METHODS),
+                      (rand.choice(NAMES),))
+                     for _ in xrange(rand.randint(1, 12))]
+            steps = macro.compile(calls)
+            self.assertEqual(len(steps), 1)
+            live, compiled = self.makeShow('live'), self.makeShow('compiled')
+            for _, method, args in calls:
+                getattr(live, method)(*args)
+            compiled.applyLevels(steps[0][2])
+            self.assertEqual(compiled.currentPage.lights,
+                             live.currentPage.lights)
+            #A replay is one edit, undone in one go
+            self.assertEqual(len(compiled.history.undoSteps), 1)
+    def testToggles(self):
+        self.assertEqual([macro.applyOp(('toggle', n), 0) for n in (1, 2, 3)],
+                         [100, 75, 50])
+        self.assertEqual(macro.compose(('toggle', 2), ('toggle', 2)),
+                         ('toggle', 1))
+        self.assertEqual(macro.compose(('set', 0), ('toggle', 1)),
+                         ('set', 100))
+        self.assertEqual(macro.compose(('toggle', 1), ('set', 0)), ('set', 0))
+    def testCallsKeepTheirOrder(self):
+        steps = macro.compile([('show', 'toggleIntensity', ('FC',)),
+                               ('show', 'moveForward', ()),
+                               ('show', 'turnOff', ('FC',)),
+                               ('next', 'toggleIntensity', ('FC',)),
+                               ('next', 'toggleIntensity', ('RS',))])
+        self.assertEqual(steps,
+                         [('levels', 'show', {'FC': ('toggle', 1)}),
+                          ('call', 'show', 'moveForward', ()),
+                          ('levels', 'show', {'FC': ('set', 0)}),
+                          ('levels', 'next', {'FC': ('toggle', 1),
+                                              'RS': ('toggle', 1)})])
+        played = []
+        macro.extend(played, steps)
+        macro.extend(played, steps[-1:])
+        self.assertEqual(played[-1][2], {'FC': ('toggle', 2),
+                                         'RS': ('toggle', 2)})
+    def testSaveAndLoad(self):
+        fileName = os.path.join(self.directory, 'show.macros')
+        self.assertEqual(macro.load(fileName), {})
+        macros = {'!': macro.compile([('show', 'turnOff', ('FC',)),
+                                      ('show', 'jump', ('4',))]),
+                  '@': []}
+        macro.save(fileName, macros)
+        self.assertEqual(macro.load(fileName), macros)
+        self.assertFalse(os.path.exists(fileName + '.tmp'))
+
+class Key(object):
+    def __init__(self, key, unicode=u''):
+        self.type = pygame.KEYDOWN
+        self.key = key
+        self.unicode = unicode
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class RecorderTest(unittest.TestCase):
+    def testRecordedMacroIsKeptAndPlayedBack(self):
+        import controller
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'show.macros')
+            show = Show(os.path.join(directory, 'show'), [('FC', 0)])
+            recorder = controller.MacroRecorder(fileName)
+            recorder.addTarget('show', show)
+            recorder.press(Key(pygame.K_1, u'!'))
+            for _ in xrange(2):
+                recorder.record(show.toggleIntensity, 'FC')
+            recorder.press(Key(pygame.K_RETURN, u'\r'))
+            self.assertFalse(recorder.recording)
+            #A console started again has the macro
+            recorder = controller.MacroRecorder(fileName)
+            self.assertEqual(recorder.macros['!'],
+                             [('levels', 'show', {'FC': ('toggle', 2)})])
+            refreshes = []
+            recorder.setRefreshOutput(lambda: refreshes.append(True))
+            recorder.addTarget('show', show)
+            recorder.press(Key(pygame.K_1))
+            self.assertEqual(show.currentPage.lights['FC'], 75)
+            self.assertEqual(refreshes, [True])
+        finally:
+            shutil.rmtree(directory)
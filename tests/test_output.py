@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import output
+
+#An Enttec packet is 5 bytes of header, the levels and an end byte
+SIZE = 24
+PACKET = SIZE + 6
+
+def frame(level):
+    return str(bytearray([level]) * SIZE)
+
+class PseudoTerminalTest(unittest.TestCase):
+    def testBytesGoThroughUnchanged(self):
+        master, slave = output.openPseudoTerminal()
+        port = output.openPort('file:' + slave)
+        try:
+            data = ''.join(chr(value) for value in xrange(256))
+            port.write(data)
+            received = ''
+            while len(received) < len(data):
+                received += os.read(master, 1024)
+            self.assertEqual(received, data)
+        finally:
+            port.close()
+            os.close(master)
+
+class OutputProcessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'out')
+        self.port = None
+    def tearDown(self):
+        if self.port:
+            self.port.close()
+        shutil.rmtree(self.directory)
+    def start(self, rate, keepAlive):
+        self.port = output.OutputProcess('file:' + self.fileName, SIZE,
+                                         rate=rate, keepAlive=keepAlive)
+    def waitFor(self, sequence):
+        deadline = time.time() + 10
+        while self.port.lastSent()[0] < sequence:
+            self.assertTrue(time.time() < deadline, 'the frame never went out')
+            time.sleep(0.01)
+    def packets(self):
+        with open(self.fileName, 'rb') as fil:
+            data = fil.read()
+        self.assertEqual(len(data) % PACKET, 0)
+        return [data[i + 5:i + 5 + SIZE] for i in xrange(0, len(data), PACKET)]
+    def testBurstIsCoalesced(self):
+        self.start(rate=5, keepAlive=60)
+        for level in xrange(1, 51):
+            self.port.write(frame(level))
+        self.waitFor(50)
+        self.port.close()
+        sent = self.packets()
+        self.assertEqual(sent[-1], frame(50))
+        self.assertTrue(len(sent) < 50)
+        stats = self.port.stats()
+        self.assertEqual(stats['sent'], len(sent))
+        self.assertTrue(stats['dropped'] >= 50 - len(sent))
+        self.port = None
+    def testUnchangedFramesWaitForTheKeepAlive(self):
+        self.start(rate=50, keepAlive=0.25)
+        self.port.write(frame(10))
+        self.waitFor(1)
+        time.sleep(1.0)
+        self.port.close()
+        sent = self.packets()
+        #50 ticks a second, but only the keep alives go out again
+        self.assertTrue(3 <= len(sent) <= 7, len(sent))
+        self.assertEqual(set(sent), set([frame(10)]))
+        self.assertEqual(self.port.stats()['sent'], len(sent))
+        self.assertEqual(self.port.stats()['dropped'], 0)
+        self.assertTrue(self.port.report().startswith('%d sent 0 coalesced'
+                                                      % len(sent)))
+        self.port = None
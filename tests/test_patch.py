@@ -0,0 +1,131 @@
+import collections
+import os
+import random
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import patch
+from show import Show
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+CHANNELS = [('FC', 4), ('FC', 22), ('BSR', 9), ('BSL', 9), ('RS', 14),
+            ('TRACKS', 11), ('ONHALS', 3)]
+
+def naiveFrame(channelList, lights, size):
+    """The frame the patch should give, worked out channel by channel"""
+    frame = [0] * size
+    for name, channel in channelList:
+        frame[channel] = max(frame[channel], lights.get(name, 0) * 255 / 100)
+    return bytearray(frame)
+
+class PatchTest(unittest.TestCase):
+    def testFrameMatchesTheChannelList(self):
+        compiled = patch.Patch(CHANNELS)
+        self.assertEqual(compiled.size, 24)
+        rand = random.Random(4)
+        for _ in xrange(200):
+            lights = collections.defaultdict(int, (
+                (name, rand.randint(0, 100))
+                for name, _ in CHANNELS if rand.random() < 0.8))
+            lights['UNPATCHED'] = 100
+            self.assertEqual(compiled.frame(lights),
+                             naiveFrame(CHANNELS, lights, 24))
+    def testMergedChannelTakesTheHighest(self):
+        compiled = patch.Patch(CHANNELS)
+        frame = compiled.frame(collections.defaultdict(
+            int, {'BSR': 20, 'BSL': 60, 'FC': 100}))
+        self.assertEqual(frame[9], 60 * 255 / 100)
+        self.assertEqual((frame[4], frame[22]), (255, 255))
+    def testChannels(self):
+        channels = patch.Patch(CHANNELS).channels()
+        self.assertEqual(sorted(channels['FC']), [4, 22])
+        self.assertEqual(channels['BSL'], [9])
+    def testSize(self):
+        self.assertEqual(patch.Patch([('FC', 40)]).size, 41)
+        self.assertEqual(patch.Patch([('FC', 4)], size=512).size, 512)
+        self.assertRaises(ValueError, patch.Patch, [('FC', 40)], 24)
+        self.assertEqual(patch.Patch([]).frame({}), bytearray(24))
+
+class PatchFileCase(object):
+    """A patch file in a directory of its own"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'show.patch')
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def load(self, text, size=None):
+        with open(self.fileName, 'w') as fil:
+            fil.write(text)
+        return patch.load(self.fileName, size)
+
+class PatchFileTest(PatchFileCase, unittest.TestCase):
+    def testCurvesAreApplied(self):
+        compiled = self.load('#name,channel,curve\n'
+                             'FC,4,square\n'
+                             'FC,22,square\n'
+                             '\n'
+                             'RS,14,gamma\n'
+                             'TRACKS,11,switch\n'
+                             'BC,2\n')
+        self.assertFalse(compiled.isLinear())
+        levels = {'FC': 50, 'RS': 50, 'TRACKS': 49, 'BC': 50}
+        frame = compiled.frame(collections.defaultdict(int, levels))
+        self.assertEqual((frame[4], frame[22]), (64, 64))
+        self.assertEqual(frame[14], int(round(255 * 0.5 ** 2.2)))
+        self.assertEqual(frame[11], 0)
+        self.assertEqual(frame[2], 127)
+        tables = compiled.channelTables()
+        self.assertEqual(tables[4][50], 64)
+        self.assertEqual(tables[2][100], 255)
+        #Levels over 100 are taken as 100
+        self.assertEqual(tables[4][200], 255)
+    def testLinearPatch(self):
+        compiled = self.load('FC,4\nRS,5,linear\n', size=512)
+        self.assertTrue(compiled.isLinear())
+        self.assertEqual(compiled.size, 512)
+    def testMistakesNameTheLine(self):
+        for text, message in (('FC\n', 'line 1'),
+                              ('FC,4\nRS,x\n', 'line 2'),
+                              ('FC,4,wobbly\n', 'unknown curve wobbly'),
+                              ('FC,4,square\nRS,4,gamma\n',
+                               'channel 4 already has the square curve')):
+            try:
+                self.load(text)
+            except ValueError as error:
+                self.assertTrue(message in str(error), str(error))
+            else:
+                self.fail('%r was loaded' % text)
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class ReloadTest(PatchFileCase, unittest.TestCase):
+    def testReloadKeepsTheFrameSize(self):
+        import controller
+        show = Show(os.path.join(self.directory, 'show'), [('FC', 0)])
+        show.currentPage.lights['FC'] = 50
+        main = controller.MainController(None, show,
+                                         controller.MacroRecorder(), None)
+        main.setPatchFile(self.fileName)
+        with open(self.fileName, 'w') as fil:
+            fil.write('FC,0,square\nFC,3\n')
+        main.reloadPatch()
+        self.assertEqual(list(bytearray(main.makeList())[:4]),
+                         [64, 0, 0, 127])
+        self.assertEqual(show.patch.size, 24)
+        #A patch with a mistake in it is not taken
+        with open(self.fileName, 'w') as fil:
+            fil.write('FC,0,wobbly\n')
+        stderr, sys.stderr = sys.stderr, StringIO.StringIO()
+        try:
+            main.reloadPatch()
+            self.assertTrue('unknown curve wobbly' in sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(show.patch.channels(), {'FC': [0, 3]})
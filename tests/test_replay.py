@@ -0,0 +1,101 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import replay
+
+try:
+    import pygame
+except ImportError:
+    pygame = None
+
+class FakeWrapper(object):
+    def __init__(self):
+        self.keepRunning = True
+        self.events = []
+    def getEvents(self):
+        return self.events
+    def sortEvents(self, events, ticks=()):
+        self.events = [event for event in events if event != 'quit']
+        if len(self.events) < len(events):
+            self.keepRunning = False
+
+class FileCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+class ReplayTest(FileCase):
+    def testCompareNeedsNoPygame(self):
+        check = ('import sys, replay; sys.exit(any(name in sys.modules for '
+                 'name in ("pygame", "stackless", "scheduler")))')
+        directory = os.path.dirname(os.path.abspath(replay.__file__))
+        self.assertEqual(subprocess.call([sys.executable, '-c', check],
+                                         cwd=directory), 0)
+    def testCompareFindsTheFirstFrameThatDiffers(self):
+        frames = bytearray(range(24)) * 3000
+        with open(self.path('a'), 'wb') as fil:
+            fil.write(frames)
+        frames[24 * 2500 + 5] = 99
+        with open(self.path('b'), 'wb') as fil:
+            fil.write(frames)
+        with open(self.path('c'), 'wb') as fil:
+            fil.write(frames[:24 * 10])
+        self.assertEqual(replay.compare(self.path('a'), self.path('a'), 24),
+                         None)
+        self.assertEqual(replay.compare(self.path('a'), self.path('b'), 24),
+                         2500)
+        self.assertEqual(replay.compare(self.path('a'), self.path('c'), 24),
+                         10)
+    def testReplayOnTheVirtualClock(self):
+        clock = replay.VirtualClock(50.0)
+        seen = []
+        wrapper = FakeWrapper()
+        tasks = replay.ReplayScheduler(
+            wrapper, [(0.25, 'go'), (0.5, 'back'), (0.5, 'hals'),
+                      (1.0, 'quit'), (2.0, 'never')], fps=4, clock=clock)
+        tasks.onInput(lambda: seen.append((clock() - 50.0,
+                                           list(wrapper.getEvents()))))
+        tasks.onRender(lambda: seen.append((clock() - 50.0, 'render')))
+        tasks.run()
+        #Input comes before a timer due at the same time
+        self.assertEqual(seen, [(0.0, 'render'), (0.25, ['go']),
+                                (0.25, 'render'), (0.5, ['back', 'hals']),
+                                (0.5, 'render'), (0.75, 'render')])
+        self.assertEqual(clock(), 51.0)
+
+@unittest.skipIf(pygame is None, 'needs pygame')
+class RecordingTest(FileCase):
+    def testRecordingRoundTrip(self):
+        clock = replay.VirtualClock()
+        recorder = replay.Recorder(self.path('input'), clock)
+        wrapper = FakeWrapper()
+        recorder.wrap(wrapper)
+        Event = pygame.event.Event
+        batches = [
+            (0.5, [Event(pygame.KEYDOWN, key=1073741902, mod=0,
+                         unicode=u'')]),
+            (1.25, [Event(pygame.KEYDOWN, key=26, mod=64, unicode=u'\x1a'),
+                    Event(pygame.MOUSEBUTTONDOWN, button=3, pos=(470, 12))]),
+            (2.0, [Event(pygame.QUIT)])]
+        for now, events in batches:
+            clock.now = now
+            wrapper.sortEvents(events)
+        recorder.close()
+        loaded = replay.load(self.path('input'))
+        self.assertEqual([seconds for seconds, _ in loaded],
+                         [0.5, 1.25, 1.25, 2.0])
+        key, undo, click, quit = [event for _, event in loaded]
+        self.assertEqual(key.key, 1073741902)
+        self.assertEqual((undo.key, undo.mod, undo.unicode), (26, 64, u'\x1a'))
+        self.assertEqual((click.button, click.pos), (3, (470, 12)))
+        self.assertEqual(quit.type, pygame.QUIT)
+
+if __name__ == '__main__':
+    unittest.main()
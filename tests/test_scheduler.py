@@ -0,0 +1,94 @@
+import itertools
+import unittest
+
+try:
+    import stackless
+    import pygame
+except ImportError:
+    stackless = None
+
+class FakeWrapper(object):
+    """Hands out one batch of events per wait, then stops"""
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.keepRunning = True
+        self.events = []
+    def getEvents(self):
+        return self.events
+    def waitEvents(self, ticks=()):
+        self.events, fired = self.batches.pop(0)
+        if not self.batches:
+            self.keepRunning = False
+        return fired
+
+@unittest.skipIf(stackless is None, 'needs stackless and pygame')
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        import scheduler
+        self.scheduler = scheduler
+        self.setTimer = scheduler.setTimer
+        scheduler.setTimer = lambda event, rate: None
+    def tearDown(self):
+        self.scheduler.setTimer = self.setTimer
+    def runTasks(self, build):
+        """Sets the loops up and runs them from one tasklet, as main does"""
+        stackless.tasklet(lambda: build().run())()
+        stackless.run()
+    def testInputWakesTheInputLoop(self):
+        handled = []
+        wrapper = FakeWrapper([(['PageDown'], set()), ([], set())])
+        def build():
+            tasks = self.scheduler.Scheduler(wrapper)
+            tasks.onInput(lambda: handled.append(list(wrapper.getEvents())))
+            return tasks
+        self.runTasks(build)
+        self.assertEqual(handled, [['PageDown']])
+    def testTimersWakeTheirLoops(self):
+        rendered = []
+        def build():
+            tick = set([self.scheduler.TICK])
+            tasks = self.scheduler.Scheduler(
+                FakeWrapper([([], tick), ([], tick)]), fps=30,
+                clock=itertools.count().next)
+            tasks.onRender(lambda: rendered.append(True))
+            return tasks
+        self.runTasks(build)
+        #Once as the scheduler starts and once for each tick
+        self.assertEqual(len(rendered), 3)
+    def testOneTimerEventWakesTheLoopsThatAreDue(self):
+        now = [0.0]
+        rendered = []
+        sent = []
+        timers = []
+        self.scheduler.setTimer = lambda event, rate: timers.append(
+            (event, rate))
+        tick = set([self.scheduler.TICK])
+        def advance(seconds):
+            def wait():
+                now[0] += seconds
+                return ([], tick)
+            return wait
+        class ClockWrapper(FakeWrapper):
+            def waitEvents(self, ticks=()):
+                self.events, fired = self.batches.pop(0)()
+                if not self.batches:
+                    self.keepRunning = False
+                return fired
+        wrapper = ClockWrapper([advance(0.1), advance(0.1), advance(0.3)])
+        def build():
+            tasks = self.scheduler.Scheduler(wrapper, clock=lambda: now[0])
+            tasks.every(10, lambda: rendered.append(now[0]))
+            tasks.every(4, lambda: sent.append(now[0]))
+            return tasks
+        self.runTasks(build)
+        self.assertEqual(set(event for event, _ in timers),
+                         set([self.scheduler.TICK]))
+        #Both run as it starts, the 10 a second loop at 0.1 and 0.2, then
+        #both are late at 0.5 and run once each
+        self.assertEqual([round(t, 2) for t in rendered], [0, 0.1, 0.2, 0.5])
+        self.assertEqual([round(t, 2) for t in sent], [0, 0.5])
+        self.assertEqual(timers[0], (self.scheduler.TICK, 10))
+        self.assertEqual(timers[-1], (self.scheduler.TICK, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import showfile
+from show import Show
+
+FOLK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'folk.lst')
+
+def loadJSON(fileName):
+    with open(fileName) as fil:
+        return dict((page['idno'], page) for page in json.loads(fil.read()))
+
+def writeV1(fileName, pages):
+    """Writes pages the way files were written before the index was sorted"""
+    names = sorted(set(name for page in pages for name in page['lights']))
+    nameIndex = dict((name, i) for i, name in enumerate(names))
+    infos = [showfile._info(page) for page in pages]
+    with open(fileName, 'wb') as fil:
+        fil.write(showfile.MAGIC_V1 + struct.pack('<II', len(names),
+                                                  len(pages)))
+        fil.write(''.join(showfile._packString(name) for name in names))
+        offset = 0
+        for page, info in zip(pages, infos):
+            fil.write(showfile._packString(page['idno']) +
+                      struct.pack('<II', offset, len(info)))
+            offset += len(info)
+        for page in pages:
+            fil.write(str(showfile._encodeLevels(page['lights'], nameIndex)))
+        fil.write(''.join(infos))
+
+class BinaryShowTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'folk.show')
+        showfile.toBinary(FOLK, self.fileName)
+        self.expected = loadJSON(FOLK)
+        self.pages = showfile.BinaryPages(self.fileName, None)
+    def tearDown(self):
+        self.pages.close()
+        shutil.rmtree(self.directory)
+    def assertPages(self, expected):
+        found = dict((page['idno'], page) for page in self.pages.pageDicts())
+        self.assertEqual(sorted(found), sorted(expected))
+        for idno, page in expected.iteritems():
+            self.assertEqual(found[idno]['lights'], page['lights'])
+            self.assertTrue(showfile._sameInfo(found[idno], page))
+    def testRoundTrip(self):
+        self.assertTrue(showfile.isBinary(self.fileName))
+        self.assertFalse(showfile.isBinary(FOLK))
+        self.assertPages(self.expected)
+        jsonName = os.path.join(self.directory, 'folk.lst')
+        showfile.toJSON(self.fileName, jsonName)
+        self.assertEqual(loadJSON(jsonName), self.expected)
+    def testLookUp(self):
+        self.assertEqual(len(self.pages), len(self.expected))
+        for idno in self.expected:
+            self.assertTrue(idno in self.pages)
+            self.assertEqual(self.pages._pageDict(idno)['lights'],
+                             self.expected[idno]['lights'])
+        for idno in ('', 'nothing', '00', u'\xe9'):
+            self.assertFalse(idno in self.pages)
+
+class ShowEditTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'folk.show')
+        showfile.toBinary(FOLK, self.fileName)
+        self.expected = loadJSON(FOLK)
+        self.show = Show(self.fileName, [])
+    def tearDown(self):
+        self.show.close()
+        shutil.rmtree(self.directory)
+    def reload(self):
+        self.show.close()
+        self.show = Show(self.fileName, [])
+    def testLevelsSaveInPlace(self):
+        idno = '0'
+        name = sorted(self.expected[idno]['lights'])[0]
+        size = os.path.getsize(self.fileName)
+        self.show.pages[idno].lights[name] = 7
+        self.show.save()
+        self.assertEqual(os.path.getsize(self.fileName), size)
+        self.reload()
+        self.assertEqual(self.show.pages[idno].lights[name], 7)
+    def testAddAndDeleteRewrite(self):
+        self.show.pages['new'] = self.show.makePage(idno='new',
+                                                    lights={'FC': 20})
+        del self.show.pages['29']
+        self.assertEqual(len(self.show.pages), len(self.expected))
+        self.show.save()
+        self.reload()
+        self.assertFalse('29' in self.show.pages)
+        self.assertEqual(self.show.pages['new'].lights['FC'], 20)
+        self.assertEqual(sorted(self.show.pages),
+                         sorted(set(self.expected) - set(['29'])
+                                | set(['new'])))
+
+class LegacyFileTest(unittest.TestCase):
+    def testOldIndexIsRead(self):
+        directory = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(directory, 'folk.show')
+            expected = loadJSON(FOLK)
+            writeV1(fileName, expected.values())
+            self.assertTrue(showfile.isBinary(fileName))
+            pages = showfile.BinaryPages(fileName, None)
+            found = dict((page['idno'], page) for page in pages.pageDicts())
+            self.assertEqual(sorted(found), sorted(expected))
+            for idno, page in expected.iteritems():
+                self.assertEqual(found[idno]['lights'], page['lights'])
+            pages.close()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import timeline
+from show import Show
+
+try:
+    import pygame
+    import stackless
+except ImportError:
+    pygame = None
+
+class TimedShowCase(unittest.TestCase):
+    """A page held a second that times out to a second page"""
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.directory, 'show.timeline')
+        self.show = Show(os.path.join(self.directory, 'show'), [('CC', 0)])
+        self.show.currentPage.lights['CC'] = 100
+        self.show.currentPage.fullTime = 1.0
+        self.show.currentPage.links['timeout'] = '1'
+        self.show.moveForward()
+        self.show.currentPage.lights['CC'] = 40
+        self.show.moveBack()
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+class TimelineTest(TimedShowCase):
+    def testRenderAndPlayBack(self):
+        count, cues = timeline.render(self.show, self.fileName, rate=10,
+                                      hold=0.5)
+        self.assertEqual(cues, [('0', 0), ('1', 10), ('2', 15)])
+        self.assertEqual(count, 20)
+        frames = timeline.Timeline(self.fileName)
+        try:
+            self.assertEqual((len(frames), frames.size), (20, 24))
+            self.assertEqual(ord(frames.frame(9)[0]), 255)
+            self.assertEqual(ord(frames.frame(10)[0]), 102)
+            self.assertEqual(frames.cueAt(12), 1)
+            now = [0.0]
+            followed = []
+            player = timeline.Player(frames, lambda: None, followed.append,
+                                     lambda: now[0])
+            player.play('1')
+            now[0] = 0.6
+            player.tick()
+            self.assertEqual(player.position, 16)
+            self.assertEqual(followed, ['1', '2'])
+            now[0] = 10
+            player.tick()
+            self.assertFalse(player.playing)
+            self.assertEqual(player.position, 19)
+        finally:
+            frames.close()
+    def testRenderWarnsWhenCutShort(self):
+        stderr, sys.stderr = sys.stderr, StringIO.StringIO()
+        try:
+            count, _ = timeline.render(self.show, self.fileName, rate=10,
+                                       hold=0.5, maxLength=1)
+            warning = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(count, 10)
+        self.assertIn('cut short', warning)
+
+@unittest.skipIf(pygame is None, 'needs pygame and stackless')
+class PlaybackOutputTest(TimedShowCase):
+    def testPlayingSendsTheTimelineFrames(self):
+        import controller
+        timeline.render(self.show, self.fileName, rate=10, hold=0.5)
+        frames = timeline.Timeline(self.fileName)
+        try:
+            main = controller.MainController(None, self.show,
+                                             controller.MacroRecorder(),
+                                             None)
+            main.setPlayer(timeline.Player(frames, lambda: None))
+            main.player.play('1')
+            self.assertEqual(main.makeList(), frames.frame(10))
+        finally:
+            frames.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""Renders a timed show ahead of time into a file of output frames, and plays
+it back. The file is memory mapped, so playing it is only moving a position
+along it and handing that frame to the output.
+
+Layout, all integers little endian:
+    MAGIC
+    rate, frame size, frame count, cue index offset     (double, uint32 x 3)
+    frames, frame size bytes each
+    cue index, one entry per cue                        (uint16 length,
+                                                         utf-8 id,
+                                                         uint32 first frame)
+"""
+
+import bisect
+import mmap
+import os
+import struct
+import sys
+import time
+
+import fade
+
+MAGIC = 'LCTIME1\n'
+HEADER = '<dIII'
+
+def _toBytes(frame):
+    if isinstance(frame, bytearray):
+        return frame
+    return bytearray(int(val + 0.5) for val in frame)
+
+def render(show, fileName, rate=44, hold=5.0, defaultTime=0, maxLength=None):
+    """Plays show from page '0' at rate frames a second and writes every
+    frame to fileName. Timed pages follow their timeout link as they would
+    live, a timed page without one and an untimed page go on to their next
+    page after their time, or hold seconds. Rendering stops at the end of
+    the links, or on coming back to a page already rendered. maxLength, in
+    seconds, cuts a longer show short with a warning. The show is played on,
+    so it should not be saved afterwards. Returns the number of frames and
+    the cues"""
+    show.currentPage = show.pages['0']
+    show.currentPage.resetTime()
+    fades = fade.FadeEngine(show, lambda: None, defaultTime)
+    step = 1.0 / rate
+    now = 0.0
+    cues = []
+    seen = set()
+    count = 0
+    #Frames the page has been on stage, counted so they do not drift
+    dwell = 0
+    tempName = fileName + '.tmp'
+    with open(tempName, 'wb') as fil:
+        fil.write(MAGIC + struct.pack(HEADER, rate, show.patch.size, 0, 0))
+        while maxLength is None or count < maxLength * rate:
+            target = (show.fadeTarget if show.fadeTarget is not None
+                      else show.currentPage.idno)
+            if target not in seen:
+                seen.add(target)
+                cues.append((target, count))
+            frame = _toBytes(fades.frameNow())
+            frame.extend(bytearray(show.patch.size - len(frame)))
+            fil.write(frame)
+            count += 1
+            now += step
+            if show.fadeTarget is not None:
+                fades.tick(now)
+                continue
+            #The page is on stage, the links are followed here rather than
+            #by the fade engine so a missing page is never created
+            page = show.currentPage
+            timed = page.fullTime >= 0
+            dwell += 1
+            if dwell < round((page.fullTime if timed else hold) * rate):
+                continue
+            if timed and 'timeout' in page.links:
+                following = page.links['timeout']
+            else:
+                following = page.links.get('next', -1)
+            if following not in show.pages or following in seen:
+                break
+            dwell = 0
+            fades.go(following)
+            fades.tick(now)
+        else:
+            sys.stderr.write('The render was cut short at %g seconds, the '
+                             'show goes on past that\n' % maxLength)
+        indexOffset = fil.tell()
+        for idno, first in cues:
+            data = unicode(idno).encode('utf-8')
+            fil.write(struct.pack('<H', len(data)) + data +
+                      struct.pack('<I', first))
+        fil.seek(len(MAGIC))
+        fil.write(struct.pack(HEADER, rate, show.patch.size, count,
+                              indexOffset))
+    if os.name == 'nt' and os.path.exists(fileName):
+        os.remove(fileName)
+    os.rename(tempName, fileName)
+    return count, cues
+
+class Timeline(object):
+    """A rendered show, frames and cues looked up in the mapped file"""
+    def __init__(self, fileName):
+        self.fil = open(fileName, 'rb')
+        self.map = mmap.mmap(self.fil.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a rendered show' % fileName)
+        self.rate, self.size, self.count, indexOffset = struct.unpack_from(
+            HEADER, self.map, len(MAGIC))
+        self.start = len(MAGIC) + struct.calcsize(HEADER)
+        self.cues = []
+        self.cueFrames = []
+        offset = indexOffset
+        while offset < len(self.map):
+            length, = struct.unpack_from('<H', self.map, offset)
+            offset += 2
+            idno = str(self.map[offset:offset + length])
+            first, = struct.unpack_from('<I', self.map, offset + length)
+            offset += length + 4
+            self.cues.append(idno)
+            self.cueFrames.append(first)
+        self.cueIndex = dict((idno, i) for i, idno in enumerate(self.cues))
+    def __len__(self):
+        return self.count
+    def frame(self, i):
+        start = self.start + i * self.size
+        return self.map[start:start + self.size]
+    def cueAt(self, i):
+        """The position in the cue list of the cue frame i belongs to"""
+        return max(0, bisect.bisect_right(self.cueFrames, i) - 1)
+    def close(self):
+        self.map.close()
+        self.fil.close()
+
+class Player(object):
+    """Plays a timeline to the output in real time. onCue is called with the
+    id of every cue the playback reaches, so the console can follow it"""
+    def __init__(self, timeline, refreshOutput, onCue=None, clock=time.time):
+        self.timeline = timeline
+        self.refreshOutput = refreshOutput
+        self.onCue = onCue
+        self.clock = clock
+        self.playing = False
+        self.startTime = 0
+        self.startFrame = 0
+        self.position = 0
+        self.cue = None
+    def play(self, idno=None):
+        """Plays from the cue idno, or from the start when it is not in the
+        timeline"""
+        self.playing = True
+        self.seek(idno)
+    def stop(self):
+        self.playing = False
+    def seek(self, idno):
+        i = self.timeline.cueIndex.get(idno, 0)
+        self._jump(self.timeline.cueFrames[i] if self.timeline.cueFrames
+                   else 0)
+    def seekOffset(self, steps):
+        """Jumps steps cues along from the cue being played"""
+        cues = self.timeline.cueFrames
+        i = max(0, min(len(cues) - 1, self.timeline.cueAt(self.position) +
+                       steps))
+        self._jump(cues[i])
+    def _jump(self, frame):
+        self.startTime = self.clock()
+        self.startFrame = frame
+        self.position = frame
+        self.cue = None
+        self._follow()
+        self.refreshOutput()
+    def _follow(self):
+        if not self.timeline.cues:
+            return
+        cue = self.timeline.cues[self.timeline.cueAt(self.position)]
+        if cue != self.cue:
+            self.cue = cue
+            if self.onCue:
+                self.onCue(cue)
+    def frame(self):
+        return self.timeline.frame(self.position)
+    def tick(self):
+        """Moves the position on to the current time, and writes the frame
+        if it changed. Playback stops on the last frame"""
+        if not self.playing:
+            return
+        position = self.startFrame + int((self.clock() - self.startTime) *
+                                         self.timeline.rate)
+        if position >= len(self.timeline):
+            position = len(self.timeline) - 1
+            self.playing = False
+        if position != self.position:
+            self.position = position
+            self._follow()
+            self.refreshOutput()